@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+# make the synthetic data generator and the ptac sources of this checkout importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic  # noqa: E402
+
+import ptac.accessibility as accessibility  # noqa: E402
+import ptac.population as population  # noqa: E402
+import ptac.profiling as profiling  # noqa: E402
+
+"""Benchmarks the PtAC pipeline on synthetic grid cities of growing size"""
+
+"""
+@name : run_benchmarks.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 100000 --output results.jsonl
+    python benchmarks/run_benchmarks.py --baseline results.jsonl --tolerance 0.25
+"""
+
+default_sizes = [10**3, 10**4, 10**5]
+
+
+def run_size(size, seed=0):
+    """
+    Benchmark all stages for one synthetic city.
+
+    Runs offline with the native routing engine, so neither an internet connection nor java is needed.
+
+    :param size: number of network edges and raster cells
+    :type size: int
+    :param seed: seed of the synthetic data
+    :type seed: int
+    :return: one result per benchmark
+    :rtype: list of dict
+    """
+    results = []
+
+    def measure(name, function, unit, count):
+        start = timeit.default_timer()
+        value = function()
+        wall_time = timeit.default_timer() - start
+        results.append(
+            {
+                "size": size,
+                "benchmark": name,
+                "wall_time": wall_time,
+                "count": count,
+                "unit": unit,
+                "throughput": count / wall_time if wall_time > 0 else None,
+            }
+        )
+        return value
+
+    with tempfile.TemporaryDirectory() as folder:
+        accessibility.home_directory = Path(folder)
+        os.makedirs(f"{folder}/.ptac")
+
+        network_gdf = synthetic.grid_network(size)
+        stops_gdf = synthetic.stops(network_gdf, max(1, size // 100), seed=seed)
+        raster = synthetic.population_raster(f"{folder}/population.tif", size, seed=seed)
+
+        measure(
+            "prepare_network",
+            lambda: accessibility.prepare_network(network_gdf=network_gdf.copy()),
+            "edges/s",
+            len(network_gdf),
+        )
+        population_gdf = measure(
+            "raster_to_points",
+            lambda: population.raster_to_points(raster, epsg=synthetic.epsg),
+            "cells/s",
+            size,
+        )
+
+        profiler = profiling.Profiler()
+        accessibility_output = measure(
+            "distance_to_closest",
+            lambda: accessibility.distance_to_closest(
+                population_gdf, stops_gdf, network_gdf=network_gdf, engine="native", profiler=profiler
+            ),
+            "origins/s",
+            len(population_gdf),
+        )
+        for record in profiler.records:
+            results.append(
+                {
+                    "size": size,
+                    "benchmark": f"distance_to_closest.{record['stage']}",
+                    "wall_time": record["wall_time"],
+                    "count": record["rows"],
+                    "unit": "rows/s",
+                    "throughput": (
+                        record["rows"] / record["wall_time"] if record["rows"] and record["wall_time"] > 0 else None
+                    ),
+                }
+            )
+
+        accessible = measure(
+            "subset_result",
+            lambda: accessibility.subset_result(accessibility_output, transport_system="low-capacity"),
+            "origins/s",
+            len(accessibility_output),
+        )
+        measure(
+            "calculate_sdg",
+            lambda: accessibility.calculate_sdg(population_gdf, accessible, population_column="pop"),
+            "origins/s",
+            len(population_gdf),
+        )
+
+    peak_rss = profiling.peak_rss()
+    for result in results:
+        result["peak_rss"] = peak_rss
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare throughputs with a baseline run.
+
+    :param results: results of this run
+    :type results: list of dict
+    :param baseline: results of the baseline run
+    :type baseline: list of dict
+    :param tolerance: accepted relative loss of throughput
+    :type tolerance: float
+    :return: benchmarks that got slower than the tolerance allows
+    :rtype: list of str
+    """
+    reference = {(r["size"], r["benchmark"]): r["throughput"] for r in baseline if r["throughput"]}
+    regressions = []
+    for result in results:
+        expected = reference.get((result["size"], result["benchmark"]))
+        if expected and result["throughput"] and result["throughput"] < expected * (1 - tolerance):
+            regressions.append(
+                f"{result['benchmark']} (size {result['size']}): "
+                f"{result['throughput']:.0f} {result['unit']} < {expected:.0f} {result['unit']}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PtAC on synthetic grid cities.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes, help="numbers of edges/cells")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    parser.add_argument("--baseline", help="JSON lines file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="accepted relative loss of throughput")
+    args = parser.parse_args()
+
+    results = []
+    # every size runs in a fresh process, so that the peak memory belongs to that size only
+    context = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        with context.Pool(1) as pool:
+            size_results = pool.apply(run_size, (size, args.seed))
+        for result in size_results:
+            throughput = "" if result["throughput"] is None else f"{result['throughput']:14.0f} {result['unit']}"
+            print(
+                f"{result['size']:>10} {result['benchmark']:<45} {result['wall_time']:10.3f} s "
+                f"{result['peak_rss'] / 1024**2 if result['peak_rss'] else float('nan'):10.1f} MB {throughput}"
+            )
+        results.extend(size_results)
+
+    if args.output:
+        with open(args.output, "a") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = [json.loads(line) for line in f if line.strip()]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
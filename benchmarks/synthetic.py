@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import math
+
+import geopandas as gpd
+import numpy as np
+import rasterio
+import shapely
+from rasterio.transform import from_origin
+
+"""Generates synthetic grid cities for benchmarks"""
+
+"""
+@name : synthetic.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# all synthetic cities are placed in UTM zone 33N (Berlin)
+epsg = 32633
+origin_x, origin_y = 390000.0, 5810000.0
+
+
+def grid_network(number_of_edges, spacing=100.0, highway="residential"):
+    """
+    Generate a square street grid in the format of osm.get_network.
+
+    :param number_of_edges: approximate number of edges of the grid
+    :type number_of_edges: int
+    :param spacing: distance between two crossings in meters
+    :type spacing: float
+    :param highway: street type of all edges (see settings.streettypes)
+    :type highway: str
+    :return network_gdf: street grid
+    :rtype network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    """
+    side = max(2, int(math.sqrt(number_of_edges / 2)) + 1)
+    node = np.arange(side * side).reshape(side, side)
+    u = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel()])
+    v = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel()])
+    x = origin_x + (np.arange(side * side) % side) * spacing
+    y = origin_y + (np.arange(side * side) // side) * spacing
+    coordinates = np.stack([np.stack([x[u], y[u]], axis=1), np.stack([x[v], y[v]], axis=1)], axis=1)
+    return gpd.GeoDataFrame(
+        {
+            "u": u,
+            "v": v,
+            "key": 0,
+            "highway": highway,
+            "maxspeed": None,
+            "lanes": None,
+            "length": spacing,
+        },
+        geometry=shapely.linestrings(coordinates),
+        crs=f"EPSG:{epsg}",
+    )
+
+
+def population_raster(path, number_of_cells, cell_size=100.0, seed=0):
+    """
+    Write a square population raster covering the street grid of the same size.
+
+    :param path: path of the GeoTIFF to write
+    :type path: str
+    :param number_of_cells: approximate number of raster cells
+    :type number_of_cells: int
+    :param cell_size: size of a raster cell in meters
+    :type cell_size: float
+    :param seed: seed of the random population values
+    :type seed: int
+    :return: path of the written raster
+    :rtype: str
+    """
+    side = max(1, int(math.sqrt(number_of_cells)))
+    rng = np.random.default_rng(seed)
+    population = rng.gamma(2.0, 5.0, size=(side, side)).astype(np.float32)
+    # a quarter of the cells is unpopulated
+    population[rng.random((side, side)) < 0.25] = 0
+    transform = from_origin(origin_x, origin_y + side * cell_size, cell_size, cell_size)
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=side,
+        height=side,
+        count=1,
+        dtype="float32",
+        crs=f"EPSG:{epsg}",
+        transform=transform,
+        nodata=0,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+    ) as dst:
+        dst.write(population, 1)
+    return path
+
+
+def stops(network_gdf, number_of_stops, seed=0):
+    """
+    Place stops at random positions on the street grid.
+
+    :param network_gdf: street grid (see grid_network)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param number_of_stops: number of stops
+    :type number_of_stops: int
+    :param seed: seed of the random positions
+    :type seed: int
+    :return: stops
+    :rtype: Geopandas.GeoDataFrame::POINT
+    """
+    rng = np.random.default_rng(seed)
+    edge = rng.integers(0, len(network_gdf), size=max(1, number_of_stops))
+    points = shapely.line_interpolate_point(
+        network_gdf.geometry.to_numpy()[edge], rng.random(len(edge)), normalized=True
+    )
+    return gpd.GeoDataFrame(geometry=points, crs=network_gdf.crs)
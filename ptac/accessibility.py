@@ -2,17 +2,31 @@
 # coding:utf-8
 
 import glob
+import hashlib
 import os
+import shlex
 import sys
 import time
 import timeit
+import uuid
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import pyproj
+import rasterio
+import shapely
 
+import ptac.cache as cache
+import ptac.gtfs as gtfs
+import ptac.network as network
 import ptac.osm as osm
+import ptac.population as population
+import ptac.profiling as profiling
+import ptac.routing as routing
 import ptac.settings as settings
+import ptac.urmoac as urmoac
 import ptac.util as util
 
 """Prepares dataset for accessibility computation and computes walking accessibilities
@@ -29,43 +43,65 @@ import ptac.util as util
 home_directory = Path.home()  # os.path.abspath('../../')  # Path.home()
 
 
-def clear_directory(folder=f"{home_directory}/.ptac", timestamp=None):
+def clear_directory(folder=None, timestamp=None):
+    if folder is None:
+        folder = f"{home_directory}/.ptac"
     files = glob.glob(f"{folder}//*.csv")
     for f in files:
-        if f.startswith(folder+f"\\{str(timestamp)}"):
+        if os.path.basename(f).startswith(f"{timestamp}_"):
             try:
                 os.remove(f)
             except os.error as e:
                 print("Error: %s : %s" % (f, e.strerror))
 
 
-def prepare_origins_and_destinations(dest_gdf, od, timestamp):
+def prepare_origins_and_destinations(dest_gdf, od, timestamp=None):
     """
     Prepare origin or destination dataset for usage in UrMoAC.
 
+    The file is named after its content, so it is written only once for runs sharing the same points.
+
     :param dest_gdf: origin or destination point data set (must be projected in UTM Projection)
     :type dest_gdf: Geopandas.GeoDataFrame:POINT
     :param od: indicate if "origin" or "destination"
     :type od: str
+    :return: path of the written file
+    :rtype: str
     """
     dest_gdf["x"] = dest_gdf.geometry.centroid.x
     dest_gdf["y"] = dest_gdf.geometry.centroid.y
     dest_gdf = dest_gdf[["x", "y"]]
+    dest_gdf = dest_gdf.dropna()
     if od == "origin":
-        dest_gdf = dest_gdf.dropna()
-        dest_gdf.to_csv(f"{home_directory}/.ptac/{timestamp}_origins.csv", sep=";", header=False)
+        return _write_scratch_file(dest_gdf, "origins")
     if od == "destination":
-        dest_gdf = dest_gdf.dropna()
-        dest_gdf.to_csv(
-            f"{home_directory}/.ptac/{timestamp}_destinations.csv", sep=";", header=False
-        )
+        return _write_scratch_file(dest_gdf, "destinations")
+
 
+def _write_scratch_file(df, name, index=True):
+    # name scratch files after their content, so that they can be reused by later runs
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=index).to_numpy().tobytes())
+    digest.update(";".join(map(str, df.columns)).encode("utf-8"))
+    path = f"{home_directory}/.ptac/{name}_{digest.hexdigest()[:32]}.csv"
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    # parallel runs must never see half written files
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.to_csv(temporary_path, sep=";", header=False, index=index)
+    os.replace(temporary_path, path)
+    return path
 
-def prepare_network(timestamp, network_gdf=None, boundary=None, verbose=0):
+
+def prepare_network(timestamp=None, network_gdf=None, boundary=None, verbose=0):
     """
     Load road network from OpenStreetMap and prepares network for usage in UrMoAC.
 
+    The network file is named after its content and written only once for runs sharing the same network.
+    Its path is stored in the attrs of the returned network under "scratch_file".
+
     :param network_gdf: network dataset to use (optional, if None: dataset will be downloaded from osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
     :param boundary: boundary of area where to download network (must be projected in WGS84)
     :type boundary: Geopandas.GeoDataFrame:POLYGON
     :param epsg: EPSG code of UTM projection for the area of interest
@@ -77,26 +113,89 @@ def prepare_network(timestamp, network_gdf=None, boundary=None, verbose=0):
     :rtype GeoDataFrame
 
     """
-    if network_gdf is None:
+    if isinstance(network_gdf, network.PtacNetwork):
+        network_gdf = network_gdf.to_frame()
+    elif network_gdf is None:
         if verbose > 0:
             print("No street network was specified. Loading osm network..\n")
-        network_gdf = osm.get_network(boundary)
-        network_gdf = util.project_gdf(network_gdf, to_latlong=True)
-        network_gdf = util.project_gdf(network_gdf, to_latlong=False)
+        network_gdf = get_prepared_network(boundary, verbose=verbose)
 
     else:
         if verbose > 0:
             print("Street network provided\n")
         # todo: check if dataset has the right format
 
+        if verbose > 0:
+            print("Preparing street network for routing")
+        network_gdf = _prepare_edges(network_gdf)
+
+    # UrMoAC reads one edge per direction of travel, the oneway flags are not part of its format
+    network_gdf = network_gdf.drop(columns="oneway", errors="ignore")
+    if "geometry" in network_gdf.columns:
+        network_gdf = pd.concat([network_gdf, network_gdf.geometry.bounds], axis=1)
+        del network_gdf["geometry"]
+    if not os.path.exists(f"{home_directory}/.ptac"):
+        os.makedirs(f"{home_directory}/.ptac")
+    network_gdf.attrs["scratch_file"] = _write_scratch_file(network_gdf, "network", index=False)
+    return network_gdf
+
+
+def get_prepared_network(boundary, network_type="walk", custom_filter=None, simplify=False, verbose=0, pbf_file=None):
+    """
+    Load a prepared street network from the cache or download and prepare it.
+
+    Prepared networks are cached in settings.cache_folder, keyed by the boundary bounds, the download
+    options and settings.streettypes (see ptac.cache). Set settings.use_cache to False to always download.
+
+    :param boundary: boundary of area where to download network (must be projected in WGS84)
+    :type boundary: Geopandas.GeoDataFrame:POLYGON
+    :param network_type: network type passed to osm.get_network
+    :type network_type: str
+    :param custom_filter: custom filter passed to osm.get_network
+    :type custom_filter: str
+    :param simplify: simplify flag passed to osm.get_network
+    :type simplify: bool
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :param pbf_file: local osm extract to read the network from (optional, defaults to settings.pbf_file)
+    :type pbf_file: str
+    :return network_gdf: prepared street network including geometries, projected in UTM
+    :rtype network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    """
+    if pbf_file is None:
+        pbf_file = settings.pbf_file
+    key = cache.network_key(boundary, network_type, custom_filter, simplify, pbf_file=pbf_file)
+    if settings.use_cache:
+        network_gdf = cache.load_network(key)
+        if network_gdf is not None:
+            if verbose > 0:
+                print("Prepared street network loaded from cache\n")
+            return network_gdf
+
+    network_gdf = osm.get_network(
+        boundary,
+        network_type=network_type,
+        custom_filter=custom_filter,
+        simplify=simplify,
+        verbose=verbose,
+        pbf_file=pbf_file,
+    )
+    network_gdf = util.project_gdf(network_gdf, to_crs=util.utm_crs(network_gdf))
     if verbose > 0:
         print("Preparing street network for routing")
+    network_gdf = _prepare_edges(network_gdf)
+    if settings.use_cache:
+        cache.store_network(key, network_gdf)
+    return network_gdf
+
 
+def _prepare_edges(network_gdf):
+    # rename osm columns and attach the mode permissions of settings.streettypes
     network_characteristics = settings.streettypes
     if "street_type" not in network_characteristics.columns:
         network_characteristics.reset_index(inplace=True)
         network_characteristics.rename(columns={"index": "street_type"}, inplace=True)
-    network_gdf.reset_index(inplace=True)
+    network_gdf = network_gdf.reset_index()
     network_gdf = network_gdf.rename(
         columns={
             "u": "fromnode",
@@ -107,32 +206,33 @@ def prepare_network(timestamp, network_gdf=None, boundary=None, verbose=0):
             "index": "oid",
         }
     )
-    network_gdf = network_gdf.merge(
-        network_characteristics, on="street_type", how="left"
-    )
+    # mode columns of the network, e.g. the directions of travel of osm.get_network_from_pbf, restrict the
+    # modes of the street type
+    modes = [mode for mode in ["mode_walk", "mode_bike", "mode_mit"] if mode in network_gdf.columns]
+    restrictions = network_gdf[modes].eq(True).to_numpy()
+    network_gdf = network_gdf.drop(columns=modes).merge(network_characteristics, on="street_type", how="left")
+    for position, mode in enumerate(modes):
+        network_gdf[mode] = network_gdf[mode].eq(True).to_numpy() & restrictions[:, position]
     network_gdf = network_gdf.reset_index()
-    network_gdf = network_gdf[
-        [
-            "index",
-            "fromnode",
-            "tonode",
-            "mode_walk",
-            "mode_bike",
-            "mode_mit",
-            "vmax",
-            "length",
-            "geometry",
-        ]
-    ]
-    network_gdf = pd.concat([network_gdf, network_gdf.geometry.bounds], axis=1)
-    del network_gdf["geometry"]
-    network_gdf.to_csv(
-        f"{home_directory}/.ptac/{timestamp}_network.csv", sep=";", header=False, index=False
-    )
-    return network_gdf
+    columns = ["index", "fromnode", "tonode", "mode_walk", "mode_bike", "mode_mit", "vmax", "length", "geometry"]
+    # networks with a oneway column, like the osm networks, hold one edge per direction of travel
+    if "oneway" in network_gdf.columns:
+        columns.append("oneway")
+    return network_gdf[columns]
 
 
-def build_request(epsg, number_of_threads, date, start_time, timestamp):
+def build_request(
+    epsg,
+    number_of_threads,
+    date,
+    start_time,
+    timestamp,
+    origins_file=None,
+    destinations_file=None,
+    network_file=None,
+    heap_size=None,
+    mode="mode_walk",
+):
     """
     Build request for the UrMoAC.
 
@@ -144,36 +244,50 @@ def build_request(epsg, number_of_threads, date, start_time, timestamp):
     :type date: int
     :param start_time: Time to start the routing (in seconds of the day)
     :type start_time: int
+    :param origins_file: origins written by prepare_origins_and_destinations (optional)
+    :type origins_file: str
+    :param destinations_file: destinations written by prepare_origins_and_destinations (optional)
+    :type destinations_file: str
+    :param network_file: network written by prepare_network (optional)
+    :type network_file: str
+    :param heap_size: java heap size in bytes (optional, settings.urmoac_maximum_heap_size if None)
+    :type heap_size: int
+    :param mode: Mode column of settings.streettypes to route (see settings.urmoac_modes)
+    :type mode: str
 
     :return UrmoAC request
     :type str
     """
-    current_path = os.path.dirname(os.path.abspath(__file__))
-    urmo_ac_request = (
-        "java -jar -Xmx12g {current_path}/urmoacjar/UrMoAC.jar "
-        '--from "file;{home_directory}/.ptac/{timestamp}_origins.csv" '
-        "--shortest "
-        '--to "file;{home_directory}/.ptac/{timestamp}_destinations.csv" '
-        "--mode foot "
-        "--time {start_time} "
-        "--epsg {epsg} "
-        '--nm-output "file;{home_directory}/.ptac/{timestamp}_sdg_output.csv" '
-        "--verbose "
-        "--threads {number_of_threads} "
-        "--dropprevious "
-        "--date {date} "
-        '--net "file;{home_directory}/.ptac/{timestamp}_network.csv"'.format(
-            home_directory=home_directory,
-            timestamp=timestamp,
-            current_path=current_path,
-            epsg=epsg,
-            number_of_threads=number_of_threads,
-            date=date,
-            start_time=int(start_time),
-        )
+    arguments = _request_arguments(
+        epsg, number_of_threads, date, start_time, timestamp, origins_file, destinations_file, network_file, mode
     )
+    return shlex.join(urmoac.command(arguments, heap=heap_size))
 
-    return urmo_ac_request
+
+def _request_arguments(
+    epsg,
+    number_of_threads,
+    date,
+    start_time,
+    timestamp,
+    origins_file=None,
+    destinations_file=None,
+    network_file=None,
+    mode="mode_walk",
+):
+    # arguments of a UrMoAC run, see build_request
+    if origins_file is None:
+        origins_file = f"{home_directory}/.ptac/{timestamp}_origins.csv"
+    if destinations_file is None:
+        destinations_file = f"{home_directory}/.ptac/{timestamp}_destinations.csv"
+    if network_file is None:
+        network_file = f"{home_directory}/.ptac/{timestamp}_network.csv"
+    arguments = ["--from", f"file;{origins_file}", "--shortest", "--to", f"file;{destinations_file}"]
+    arguments += ["--mode", settings.urmoac_modes[mode], "--time", str(int(start_time)), "--epsg", str(epsg)]
+    arguments += ["--nm-output", f"file;{home_directory}/.ptac/{timestamp}_sdg_output.csv", "--verbose"]
+    arguments += ["--threads", str(number_of_threads), "--dropprevious", "--date", str(date)]
+    arguments += ["--net", f"file;{network_file}"]
+    return arguments
 
 
 def distance_to_closest(
@@ -187,13 +301,20 @@ def distance_to_closest(
     number_of_threads=1,
     date=20200915,
     verbose=0,
+    engine="urmoac",
+    profiler=None,
+    geodataframe=True,
 ):
     """
     Python wrapper for UrMoAC Accessibility Calculator.
 
+    With engine="native" the distances are computed in-process by a multi-source Dijkstra search on the
+    prepared network instead of calling UrMoAC, so neither java nor the csv files in ~/.ptac are needed.
+
     :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
-        osm automatically)
-    :type network_gdf: Geopandas.GeoDataFrame::POLYGON
+        osm automatically). A compact network (see ptac.network) is used as it is, all layers are projected into
+        its crs.
+    :type network_gdf: Geopandas.GeoDataFrame::POLYGON or ptac.network.PtacNetwork
     :param start_geometries: Starting points for accessibility calculation
     :type start_geometries: Geopandas.GeoDataFrame::POLYGON
     :param destination_geometries: Starting point for accessibility calculation
@@ -212,92 +333,885 @@ def distance_to_closest(
     :type date: int
     :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
     :type verbose: int
+    :param engine: Routing engine to use, either "urmoac" or "native"
+    :type engine: str
+    :param profiler: Records wall time, memory and row counts of every stage (optional)
+    :type profiler: ptac.profiling.Profiler
+    :param geodataframe: If False, only the distances are returned as array aligned with the starting points
+        (see origin_distances and ptac.aggregation), so no GeoDataFrame is merged
+    :type geodataframe: bool
     :return accessibility_output: A GeoDataFrame consists of accessibility calculation outputs
-    :rtype: Geopandas.GeoDataFrame::POINT
+    :rtype: Geopandas.GeoDataFrame::POINT or numpy.ndarray
     """
     start = timeit.default_timer()
-    timestamp = int(round(time.time()))
-    start_geometries = util.project_gdf(start_geometries, to_latlong=True)
-    destination_geometries = util.project_gdf(destination_geometries, to_latlong=True)
+    if profiler is None:
+        profiler = profiling.Profiler()
+    # nanoseconds, so that consecutive runs never share scratch files
+    timestamp = time.time_ns()
+    with profiler.stage("project_gdf", rows=len(start_geometries) + len(destination_geometries)):
+        # all layers are projected at most once into the UTM zone of the starting points or compact network
+        crs = _crs(start_geometries, network_gdf)
+        start_geometries = util.project_gdf(start_geometries, to_crs=crs)
+        destination_geometries = util.project_gdf(destination_geometries, to_crs=crs)
 
-    start_geometries = util.project_gdf(start_geometries, to_latlong=False)
-    destination_geometries = util.project_gdf(destination_geometries, to_latlong=False)
-
-    if not os.path.exists(f"{home_directory}/.ptac"):
-        os.makedirs(f"{home_directory}/.ptac")
+    if engine not in ["urmoac", "native"]:
+        print("there is no such engine. Please indicate either 'urmoac' or 'native'")
+        sys.exit()
 
     if boundary_geometries is None:
-        boundary_geometries = gpd.GeoDataFrame(
-            index=[0], crs="epsg:4326", geometry=[start_geometries.unary_union]
-        )
+        boundary_geometries = _bounding_box(start_geometries)
 
     if not boundary_geometries.crs == settings.default_crs:
         boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
 
-    if network_gdf is None:
-        prepare_network(timestamp=timestamp, network_gdf=None, boundary=boundary_geometries, verbose=verbose)
-
-    else:
-        network_gdf = util.project_gdf(network_gdf, to_latlong=True)
-        network_gdf = util.project_gdf(network_gdf, to_latlong=False)
-        prepare_network(
-            network_gdf=network_gdf, boundary=boundary_geometries, verbose=verbose, timestamp=timestamp
-        )
-
     if "index" in start_geometries.columns:
-        del start_geometries["index"]
+        start_geometries = start_geometries.drop(columns="index")
     if "index" in destination_geometries.columns:
-        del destination_geometries["index"]
+        destination_geometries = destination_geometries.drop(columns="index")
 
     # generate unique ids for origins and destinations
     start_geometries = start_geometries.reset_index()
     destination_geometries = destination_geometries.reset_index()
 
-    # write origins and destinations to disk
-    prepare_origins_and_destinations(destination_geometries, od="destination", timestamp=timestamp)
-    prepare_origins_and_destinations(start_geometries, od="origin", timestamp=timestamp)
+    # the native engine stops searching at the distance subset_result keeps
+    limit = maximum_distance
+    if limit is None and transport_system is not None:
+        limit = _maximum_distance(transport_system)
 
-    epsg = destination_geometries.crs.to_epsg()
-    # build UrMoAC request
-    urmo_ac_request = build_request(
-        epsg=epsg, number_of_threads=number_of_threads, date=date, start_time=start_time, timestamp=timestamp
-    )
-    if verbose > 0:
-        print("Starting UrMoAC to calculate accessibilities\n")
-    if verbose > 1:
-        print(f"UrMoAC request: {urmo_ac_request}\n")
+    if engine == "native" and isinstance(network_gdf, network.PtacNetwork):
+        with profiler.stage("network_index", rows=network_gdf.number_of_edges):
+            network_index = NetworkIndex(network_gdf)
+        output = route_native(
+            start_geometries,
+            destination_geometries,
+            network_index=network_index,
+            profiler=profiler,
+            maximum_distance=limit,
+        )
+
+    elif engine == "native":
+        with profiler.stage("prepare_network") as record:
+            if network_gdf is None:
+                if verbose > 0:
+                    print("No street network was specified. Loading osm network..\n")
+                network_gdf = get_prepared_network(boundary_geometries, verbose=verbose)
+            else:
+                network_gdf = _prepare_edges(network_gdf)
+            network_gdf = util.project_gdf(network_gdf, to_crs=crs)
+            record["rows"] = len(network_gdf)
+        if verbose > 0:
+            print("Calculating accessibilities in-process\n")
+        output = route_native(
+            start_geometries,
+            destination_geometries,
+            network_gdf,
+            profiler=profiler,
+            maximum_distance=limit,
+            prune=limit is not None,
+        )
 
-    # Use UrMoAc to calculate SDG indicator
-    os.system(urmo_ac_request)
+    else:
+        if not os.path.exists(f"{home_directory}/.ptac"):
+            os.makedirs(f"{home_directory}/.ptac")
 
-    # read UrMoAC output
-    header_list = ["o_id", "d_id", "avg_distance", "avg_tt", "avg_num", "avg_value"]
-    output = pd.read_csv(
-        f"{home_directory}/.ptac/{timestamp}_sdg_output.csv", sep=";", header=0, names=header_list
-    )
+        with profiler.stage("prepare_network") as record:
+            if network_gdf is None:
+                network_gdf = prepare_network(network_gdf=None, boundary=boundary_geometries, verbose=verbose)
 
-    # only use distance on road network
-    output["distance_pt"] = output["avg_distance"]
-    output = output[["o_id", "d_id", "distance_pt"]]
+            else:
+                if not isinstance(network_gdf, network.PtacNetwork):
+                    network_gdf = util.project_gdf(network_gdf, to_crs=crs)
+                network_gdf = prepare_network(network_gdf=network_gdf, boundary=boundary_geometries, verbose=verbose)
+            record["rows"] = len(network_gdf)
+
+        # write origins and destinations to disk
+        with profiler.stage(
+            "prepare_origins_and_destinations", rows=len(start_geometries) + len(destination_geometries)
+        ):
+            destinations_file = prepare_origins_and_destinations(destination_geometries, od="destination")
+            origins_file = prepare_origins_and_destinations(start_geometries, od="origin")
+
+        epsg = destination_geometries.crs.to_epsg()
+        # build UrMoAC request, the heap is sized from the network and the number of origins and destinations
+        arguments = _request_arguments(
+            epsg=epsg,
+            number_of_threads=number_of_threads,
+            date=date,
+            start_time=start_time,
+            timestamp=timestamp,
+            origins_file=origins_file,
+            destinations_file=destinations_file,
+            network_file=network_gdf.attrs["scratch_file"],
+        )
+        heap_size = urmoac.heap_size(len(network_gdf), len(start_geometries) + len(destination_geometries))
+        if verbose > 0:
+            print("Starting UrMoAC to calculate accessibilities\n")
+        if verbose > 1:
+            print(f"UrMoAC request: {shlex.join(urmoac.command(arguments, heap=heap_size))}\n")
+
+        # Use UrMoAc to calculate SDG indicator, its output is streamed while it runs
+        with profiler.stage("router", rows=len(start_geometries)) as record:
+            record["heap_size"] = heap_size
+            urmoac.run(arguments, heap=heap_size, callback=print if verbose > 1 else None)
+
+        # read UrMoAC output with the multithreaded arrow parser, skipping unused columns
+        with profiler.stage("parse_result") as record:
+            header_list = ["o_id", "d_id", "avg_distance", "avg_tt", "avg_num", "avg_value"]
+            output = pd.read_csv(
+                f"{home_directory}/.ptac/{timestamp}_sdg_output.csv",
+                sep=";",
+                header=0,
+                names=header_list,
+                usecols=["o_id", "d_id", "avg_distance"],
+                engine="pyarrow",
+            )
+
+            # only use distance on road network
+            output["distance_pt"] = output["avg_distance"]
+            output = output[["o_id", "d_id", "distance_pt"]]
+            record["rows"] = len(output)
+
+    if not geodataframe:
+        # distances aligned with the starting points, nothing is merged
+        with profiler.stage("subset_result", rows=len(start_geometries)):
+            accessibility_output = origin_distances(output, len(start_geometries), limit)
+        print(f"calculation finished in {timeit.default_timer() - start} seconds")
+        if engine == "urmoac":
+            clear_directory(timestamp=timestamp)
+            cache.evict(folder=f"{home_directory}/.ptac", size_limit=settings.scratch_size_limit, suffix=".csv")
+        return accessibility_output
 
     # Merge output to starting geometries
-    accessibility_output = start_geometries.merge(
-        output, how="left", left_on="index", right_on="o_id"
-    )
+    with profiler.stage("merge", rows=len(start_geometries)):
+        accessibility_output = start_geometries.merge(output, how="left", left_on="index", right_on="o_id")
 
     # Subset accessibility results based on transport system type or maximum distance
-    accessibility_output = subset_result(
-        accessibility_output,
-        transport_system=transport_system,
-        maximum_distance=maximum_distance,
-    )
+    with profiler.stage("subset_result") as record:
+        accessibility_output = subset_result(
+            accessibility_output,
+            transport_system=transport_system,
+            maximum_distance=maximum_distance,
+        )
+        record["rows"] = len(accessibility_output)
     stop = timeit.default_timer()
 
     print(f"calculation finished in {stop - start} seconds")
-    clear_directory(timestamp=timestamp)
+    if engine == "urmoac":
+        clear_directory(timestamp=timestamp)
+        cache.evict(folder=f"{home_directory}/.ptac", size_limit=settings.scratch_size_limit, suffix=".csv")
     return accessibility_output
 
 
+class NetworkIndex:
+    """
+    Spatial index over the walkable edges of a prepared street network.
+
+    The index is built once and can be used to snap any number of point layers (origins, destinations,
+    population layers) onto the same network. Edges are numbered densely from 0 in the order of the
+    network, the original edge ids are kept in edge_id. Nodes are remapped to a dense range as well.
+    If several modes are indexed together, edge_modes tells which edges every mode may use and edge_vmax holds
+    the maximum speed of every edge, so all modes share one index and one snapping (see distance_to_closest_modes).
+    The index is directed if the network holds one edge per direction of travel, i.e. a directed compact network
+    or a network with a oneway column like the osm networks.
+
+    :param network_gdf: Street network including geometries (see _prepare_edges) or compact network, must be
+        projected in UTM
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param mode: Mode column of settings.streettypes that marks usable edges, or several modes whose edges are
+        indexed together (see edge_modes)
+    :type mode: str or list of str
+    """
+
+    def __init__(self, network_gdf, mode="mode_walk"):
+        """Renumber the usable edges and nodes and build the spatial index of the edges."""
+        modes = [mode] if isinstance(mode, str) else list(mode)
+        if isinstance(network_gdf, network.PtacNetwork):
+            # nodes are already numbered densely, geometries are only built for the usable edges
+            masks = {m: network_gdf.mode_mask(m) for m in modes}
+            usable = np.flatnonzero(np.logical_or.reduce(list(masks.values())))
+            self.crs = network_gdf.crs
+            self.edge_id = network_gdf.edge_id[usable]
+            self.node_id = network_gdf.node_id
+            self.edge_from = network_gdf.edge_from[usable].astype(np.int64)
+            self.edge_to = network_gdf.edge_to[usable].astype(np.int64)
+            self.edge_length = network_gdf.length[usable].astype(np.float64)
+            self.edge_vmax = network_gdf.vmax[usable].astype(np.float64)
+            self.edge_modes = {m: mask[usable] for m, mask in masks.items()}
+            self.directed = network_gdf.directed
+            self.geometries = network_gdf.geometries(usable)
+            self.tree = shapely.STRtree(self.geometries)
+            return
+        masks = {m: network_gdf[m].eq(True).to_numpy() for m in modes}
+        usable = np.logical_or.reduce(list(masks.values()))
+        network_gdf = network_gdf[usable]
+        self.crs = network_gdf.crs
+        self.edge_id = network_gdf["index"].to_numpy()
+        self.node_id, node_index = np.unique(
+            np.concatenate([network_gdf["fromnode"].to_numpy(), network_gdf["tonode"].to_numpy()]),
+            return_inverse=True,
+        )
+        self.edge_from, self.edge_to = np.split(node_index, 2)
+        self.edge_length = network_gdf["length"].to_numpy(dtype=np.float64)
+        if "vmax" in network_gdf.columns:
+            self.edge_vmax = pd.to_numeric(network_gdf["vmax"], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            self.edge_vmax = np.full(len(network_gdf), np.nan)
+        self.edge_modes = {m: mask[usable] for m, mask in masks.items()}
+        self.directed = "oneway" in network_gdf.columns
+        self.geometries = network_gdf.geometry.to_numpy()
+        self.tree = shapely.STRtree(self.geometries)
+
+    def snap(self, geometries):
+        """
+        Snap the centroids of a GeoDataFrame onto the closest edge.
+
+        :param geometries: Point or polygon dataset in the crs of the network
+        :type geometries: Geopandas.GeoDataFrame
+        :return edge, offset, access_distance: see snap_xy
+        :rtype edge, offset, access_distance: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        centroids = geometries.geometry.centroid
+        return self.snap_xy(centroids.x.to_numpy(), centroids.y.to_numpy())
+
+    def snap_xy(self, x, y, max_distance=None, mode=None):
+        """
+        Snap coordinates onto the closest edge in one batched query.
+
+        :param x: x coordinates in the crs of the network
+        :type x: numpy.ndarray
+        :param y: y coordinates in the crs of the network
+        :type y: numpy.ndarray
+        :param max_distance: only snap onto edges within this distance (optional)
+        :type max_distance: float
+        :param mode: only snap onto edges usable by this mode (optional, one of the modes of the index)
+        :type mode: str
+        :return edge, offset, access_distance: dense edge id (-1 for missing coordinates or without an edge
+            within max_distance), offset along the edge measured from its start node and straight line
+            distance from the point to the edge
+        :rtype edge, offset, access_distance: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        edge = np.full(len(x), -1, dtype=np.int64)
+        offset = np.full(len(x), np.nan)
+        access_distance = np.full(len(x), np.nan)
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if mode is None:
+            usable, tree = None, self.tree
+        else:
+            usable = np.flatnonzero(self.edge_modes[mode])
+            tree = shapely.STRtree(self.geometries[usable])
+        if len(valid) == 0 or len(tree) == 0:
+            return edge, offset, access_distance
+
+        points = shapely.points(x[valid], y[valid])
+        (point_index, edge_index), distance = tree.query_nearest(
+            points, all_matches=False, return_distance=True, max_distance=max_distance
+        )
+        if usable is not None:
+            edge_index = usable[edge_index]
+        edge[valid[point_index]] = edge_index
+        access_distance[valid[point_index]] = distance
+        # offsets are scaled to the network length of the edge
+        fraction = shapely.line_locate_point(self.geometries[edge_index], points[point_index], normalized=True)
+        offset[valid[point_index]] = fraction * self.edge_length[edge_index]
+        return edge, offset, access_distance
+
+    def travel_time(self, mode):
+        """
+        Return the travel time of a mode on every edge.
+
+        The speed of the mode is taken from settings.mode_speeds, a speed of None stands for the maximum speed of
+        the street type (vmax of settings.streettypes). Every speed is limited by the maximum speed of the edge.
+
+        :param mode: Mode column of settings.streettypes
+        :type mode: str
+        :return: travel time in seconds of every edge (inf if the edge may not be used by the mode)
+        :rtype: numpy.ndarray
+        """
+        if mode not in settings.mode_speeds:
+            raise ValueError(f"there is no speed of {mode}. Please indicate one of {list(settings.mode_speeds)}")
+        speed = settings.mode_speeds[mode]
+        vmax = self.edge_vmax
+        if speed is None:
+            if np.isnan(vmax[self.edge_modes[mode]]).any():
+                raise ValueError(f"the network has no maximum speed for every edge usable by {mode}")
+            speed = vmax
+        else:
+            # edges without maximum speed are passed at the speed of the mode
+            speed = np.fmin(speed, vmax)
+        with np.errstate(divide="ignore"):
+            return np.where(self.edge_modes[mode], self.edge_length / (speed / 3.6), np.inf)
+
+
+def route_native(
+    start_geometries,
+    destination_geometries,
+    network_gdf=None,
+    network_index=None,
+    profiler=None,
+    maximum_distance=None,
+    prune=False,
+):
+    """
+    Calculate the network distance from every origin to the closest destination without UrMoAC.
+
+    Origins and destinations are snapped to the closest walkable edge and one multi-source Dijkstra
+    search is run from all destinations. Origins and destinations are identified by their position
+    in the input, just like in the csv files written for UrMoAC.
+
+    With a maximum distance the search stops expanding at that distance and origins further away are not
+    returned. If prune is set as well, only the edges within twice the maximum distance of a destination are
+    indexed and searched (see _snap_pruned). The results equal those of the whole network. If a destination lies
+    more than half the maximum distance off the streets, the whole network is searched.
+
+    :param start_geometries: Starting points for accessibility calculation (must be projected in UTM Projection)
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_geometries: Destination points (must be projected in UTM Projection)
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Street network including geometries (see _prepare_edges)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param network_index: Prebuilt index of the network (optional, built from network_gdf if None)
+    :type network_index: NetworkIndex
+    :param profiler: Records wall time, memory and row counts of every stage (optional)
+    :type profiler: ptac.profiling.Profiler
+    :param maximum_distance: Maximum distance to search (optional)
+    :type maximum_distance: float
+    :param prune: If True, prune the network to the surroundings of the destinations (needs a maximum distance
+        and is ignored if a network index is given)
+    :type prune: bool
+    :return output: Closest destination and network distance for every reachable origin
+    :rtype output: pandas.DataFrame
+    """
+    if profiler is None:
+        profiler = profiling.Profiler()
+    limit = np.inf if maximum_distance is None else float(maximum_distance)
+    pruned = None
+    if network_index is None:
+        searched_gdf = network_gdf
+        if prune and np.isfinite(limit):
+            with profiler.stage("prune_network", rows=len(network_gdf)):
+                searched_gdf, pruned = _prune_network(network_gdf, destination_geometries, 2 * limit)
+            if len(searched_gdf) > len(network_gdf) / 2:
+                # the destinations cover most of the network, pruning would not pay off
+                searched_gdf, pruned = network_gdf, None
+        with profiler.stage("network_index", rows=len(searched_gdf)):
+            network_index = NetworkIndex(searched_gdf)
+
+    with profiler.stage("snap", rows=len(start_geometries) + len(destination_geometries)):
+        destination_edge, destination_offset, destination_access = network_index.snap(destination_geometries)
+        access = np.max(np.nan_to_num(destination_access, nan=0.0), initial=0.0)
+        if pruned is not None and access > limit / 2:
+            # paths from a destination far away from the streets may leave the kept edges
+            pruned = None
+            network_index = NetworkIndex(network_gdf)
+            destination_edge, destination_offset, _ = network_index.snap(destination_geometries)
+        if pruned is None:
+            origin_edge, origin_offset, _ = network_index.snap(start_geometries)
+        else:
+            origin_edge, origin_offset = _snap_pruned(
+                network_index,
+                pruned,
+                start_geometries,
+                destination_geometries.geometry.centroid.to_numpy(),
+                limit,
+                access,
+            )
+    origin_id = np.flatnonzero(origin_edge >= 0)
+    destination_id = np.flatnonzero(destination_edge >= 0)
+    with profiler.stage("router", rows=len(origin_id)):
+        distance, destination = routing.nearest_destination(
+            network_index.edge_from,
+            network_index.edge_to,
+            network_index.edge_length,
+            origin_edge[origin_id],
+            origin_offset[origin_id],
+            destination_edge[destination_id],
+            destination_offset[destination_id],
+            limit=limit,
+        )
+    reached = np.isfinite(distance)
+    return pd.DataFrame(
+        {
+            "o_id": origin_id[reached],
+            "d_id": destination_id[destination[reached]],
+            "distance_pt": distance[reached],
+        }
+    )
+
+
+def _snap_pruned(network_index, pruned, geometries, destinations, limit, access):
+    # Every edge within twice the limit of a destination was kept. A destination lies at most access off the
+    # streets, so every position reachable within the limit lies within limit + access of a destination and
+    # every pruned edge more than limit - access away from it. An origin within half of that distance of a kept
+    # edge therefore snaps onto the same edge as in the whole network or cannot be reached in either. Any other
+    # origin can only be reached if no pruned edge is closer to it than its closest kept edge, a pruned edge
+    # within the snap radius rules it out. Growing boxes inscribed in that circle find such edges without
+    # computing distances for all of them.
+    radius = (limit - access) / 2
+    centroids = geometries.geometry.centroid
+    x, y = centroids.x.to_numpy(), centroids.y.to_numpy()
+    edge, offset, _ = network_index.snap_xy(x, y, max_distance=radius)
+    remaining = np.flatnonzero((edge < 0) & np.isfinite(x) & np.isfinite(y))
+    if len(pruned) == 0:
+        far_edge, far_offset, _ = network_index.snap_xy(x[remaining], y[remaining])
+        edge[remaining], offset[remaining] = far_edge, far_offset
+        return edge, offset
+    pruned_tree = shapely.STRtree(pruned)
+    for half_size in (radius / 16, radius / 4, radius / np.sqrt(2)):
+        if len(remaining) == 0:
+            break
+        boxes = shapely.box(
+            x[remaining] - half_size, y[remaining] - half_size, x[remaining] + half_size, y[remaining] + half_size
+        )
+        hit = np.unique(pruned_tree.query(boxes, predicate="intersects")[0])
+        remaining = np.delete(remaining, hit)
+    if len(remaining) > 0:
+        # far away from all streets, only origins that could still reach a destination are snapped exactly
+        far_edge, far_offset, far_access = network_index.snap_xy(x[remaining], y[remaining])
+        points = shapely.points(x[remaining], y[remaining])
+        _, destination_distance = shapely.STRtree(destinations).query_nearest(
+            points, all_matches=False, return_distance=True
+        )
+        candidate = np.flatnonzero((far_edge >= 0) & (destination_distance <= far_access + limit + access))
+        (point_index, _), pruned_distance = pruned_tree.query_nearest(
+            points[candidate], all_matches=False, return_distance=True
+        )
+        reachable = np.zeros(len(remaining), dtype=bool)
+        reachable[candidate[point_index]] = pruned_distance >= far_access[candidate[point_index]]
+        edge[remaining] = np.where(reachable, far_edge, -1)
+        offset[remaining] = far_offset
+    return edge, offset
+
+
+def _prune_network(network_gdf, destination_geometries, radius):
+    # keep the edges within the radius of a destination, return the walkable geometries of the others
+    destinations = destination_geometries.geometry.centroid.to_numpy()
+    geometries = network_gdf.geometry.to_numpy()
+    edge = np.unique(shapely.STRtree(destinations).query(geometries, predicate="dwithin", distance=radius)[0])
+    keep = np.zeros(len(network_gdf), dtype=bool)
+    keep[edge] = True
+    walkable = network_gdf["mode_walk"].eq(True).to_numpy()
+    return network_gdf[keep], geometries[~keep & walkable]
+
+
+def distance_to_closest_sets(start_geometries, destination_sets, network_gdf=None, boundary_geometries=None, verbose=0):
+    """
+    Calculate the distance to the closest destination of several destination sets in one routing run.
+
+    The network is prepared and the origins are snapped only once. The distances to all sets are computed by
+    a single Dijkstra run of the native engine (see routing.distance_to_sets). An origin is accessible if it
+    lies within the maximum distance of at least one set, so the combined SDG 11.2.1 indicator can be
+    calculated with calculate_sdg(start_geometries, accessibility_output[accessibility_output["accessible"]]).
+
+    :param start_geometries: Starting points for accessibility calculation
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_sets: Destination points and maximum walking distance by name, e.g.
+        {"low": (stops_low, "low-capacity"), "high": (stops_high, "high-capacity")}. The maximum distance is
+        either given in meters or as transport system
+    :type destination_sets: dict
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param boundary_geometries: Boundary dataset of the desired area
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return accessibility_output: Starting points with one column distance_<name> per destination set
+        (NaN if no destination can be reached within the largest maximum distance, e.g. for an empty set) and
+        the boolean column "accessible"
+    :rtype accessibility_output: Geopandas.GeoDataFrame::POINT
+    """
+    start = timeit.default_timer()
+    start_geometries = util.project_gdf(start_geometries, to_crs=_crs(start_geometries, network_gdf))
+
+    if boundary_geometries is None:
+        boundary_geometries = _bounding_box(start_geometries)
+
+    if not boundary_geometries.crs == settings.default_crs:
+        boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
+
+    if "index" in start_geometries.columns:
+        start_geometries = start_geometries.drop(columns="index")
+    start_geometries = start_geometries.reset_index()
+
+    network_index = _network_index(network_gdf, boundary_geometries, start_geometries.crs, verbose=verbose)
+
+    origin_edge, origin_offset, _ = network_index.snap(start_geometries)
+    snapped = origin_edge >= 0
+    destination_edges, destination_offsets, maximum_distances = [], [], []
+    for destination_geometries, maximum_distance in destination_sets.values():
+        maximum_distances.append(_maximum_distance(maximum_distance))
+        if len(destination_geometries) == 0:
+            # e.g. no stop is served in a time slice, nothing can be reached
+            destination_edges.append(np.empty(0, dtype=np.int64))
+            destination_offsets.append(np.empty(0))
+            continue
+        destination_geometries = util.project_gdf(destination_geometries, to_crs=start_geometries.crs)
+        destination_edge, destination_offset, _ = network_index.snap(destination_geometries)
+        destination_edges.append(destination_edge[destination_edge >= 0])
+        destination_offsets.append(destination_offset[destination_edge >= 0])
+
+    if verbose > 0:
+        print(f"Calculating accessibilities to {len(destination_sets)} destination sets in-process\n")
+    distance = np.full((len(start_geometries), len(destination_sets)), np.inf)
+    distance[snapped] = routing.distance_to_sets(
+        network_index.edge_from,
+        network_index.edge_to,
+        network_index.edge_length,
+        origin_edge[snapped],
+        origin_offset[snapped],
+        destination_edges,
+        destination_offsets,
+        # no set is searched beyond the largest maximum distance
+        limit=max(maximum_distances, default=np.inf),
+    )
+
+    for column, name in enumerate(destination_sets):
+        start_geometries[f"distance_{name}"] = np.where(np.isfinite(distance[:, column]), distance[:, column], np.nan)
+    start_geometries["accessible"] = (distance <= np.asarray(maximum_distances, dtype=np.float64)).any(axis=1)
+    stop = timeit.default_timer()
+
+    print(f"calculation finished in {stop - start} seconds")
+    return start_geometries
+
+
+def distance_to_closest_modes(
+    start_geometries,
+    destination_geometries,
+    modes=("mode_walk", "mode_bike"),
+    network_gdf=None,
+    boundary_geometries=None,
+    maximum_time=None,
+    verbose=0,
+):
+    """
+    Calculate travel time and distance to the closest destination for several modes in one call.
+
+    The network is prepared, indexed and snapped to only once for all modes. Every mode then uses the edges it
+    may use according to settings.streettypes and searches for the destination with the shortest travel time
+    at the speed of settings.mode_speeds (see NetworkIndex.travel_time), e.g. walking and cycling to stops for
+    bike-and-ride studies. Origins and destinations snapped to an edge a mode may not use are snapped again
+    onto the closest edge of that mode. On networks with one edge per direction of travel (see
+    NetworkIndex), modes other than settings.bidirectional_modes follow the direction of the edges and do not
+    use one-way streets backwards. Other networks, e.g. with one edge per street, are routed in both directions
+    for all modes.
+
+    :param start_geometries: Starting points for accessibility calculation
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_geometries: Destination points
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param modes: Mode columns of settings.streettypes
+    :type modes: list of str
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param boundary_geometries: Boundary dataset of the desired area
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param maximum_time: Maximum travel time in seconds to search (optional)
+    :type maximum_time: float
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return accessibility_output: Starting points with the columns time_<mode> (travel time in seconds) and
+        distance_<mode> (length of the fastest path in meters) per mode, e.g. time_walk and distance_walk
+        (NaN if no destination can be reached)
+    :rtype accessibility_output: Geopandas.GeoDataFrame::POINT
+    """
+    start = timeit.default_timer()
+    modes = list(modes)
+    unknown = [mode for mode in modes if mode not in settings.mode_speeds]
+    if unknown:
+        raise ValueError(f"there is no such mode {unknown}. Please indicate modes of {list(settings.mode_speeds)}")
+    crs = _crs(start_geometries, network_gdf)
+    start_geometries = util.project_gdf(start_geometries, to_crs=crs)
+    destination_geometries = util.project_gdf(destination_geometries, to_crs=crs)
+
+    if boundary_geometries is None:
+        boundary_geometries = _bounding_box(start_geometries)
+
+    if not boundary_geometries.crs == settings.default_crs:
+        boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
+
+    if "index" in start_geometries.columns:
+        start_geometries = start_geometries.drop(columns="index")
+    start_geometries = start_geometries.reset_index()
+
+    network_index = _network_index(network_gdf, boundary_geometries, crs, mode=modes, verbose=verbose)
+    origins = start_geometries.geometry.centroid
+    destinations = destination_geometries.geometry.centroid
+    origin_xy = origins.x.to_numpy(), origins.y.to_numpy()
+    destination_xy = destinations.x.to_numpy(), destinations.y.to_numpy()
+    origin_snap = network_index.snap_xy(*origin_xy)[:2]
+    destination_snap = network_index.snap_xy(*destination_xy)[:2]
+    limit = np.inf if maximum_time is None else float(maximum_time)
+
+    for mode in modes:
+        if verbose > 0:
+            print(f"Calculating accessibilities by {mode} in-process\n")
+        usable = network_index.edge_modes[mode]
+        # edges of the mode are numbered densely, nodes keep the numbering of the index
+        position = np.cumsum(usable) - 1
+        origin_edge, origin_offset = _snap_mode(network_index, mode, *origin_snap, *origin_xy)
+        destination_edge, destination_offset = _snap_mode(network_index, mode, *destination_snap, *destination_xy)
+        origin_id = np.flatnonzero(origin_edge >= 0)
+        destination_id = np.flatnonzero(destination_edge >= 0)
+        travel_time = np.full(len(start_geometries), np.nan)
+        distance = np.full(len(start_geometries), np.nan)
+        if len(origin_id) and len(destination_id):
+            field = routing.DistanceField(
+                network_index.edge_from[usable],
+                network_index.edge_to[usable],
+                network_index.edge_length[usable],
+                position[destination_edge[destination_id]],
+                destination_offset[destination_id],
+                limit=limit,
+                edge_cost=network_index.travel_time(mode)[usable],
+                directed=network_index.directed and mode not in settings.bidirectional_modes,
+            )
+            mode_time, mode_distance, _ = field.nearest(
+                position[origin_edge[origin_id]], origin_offset[origin_id], return_length=True
+            )
+            reached = np.isfinite(mode_time)
+            travel_time[origin_id[reached]] = mode_time[reached]
+            distance[origin_id[reached]] = mode_distance[reached]
+        name = mode.replace("mode_", "", 1) if mode.startswith("mode_") else mode
+        start_geometries[f"time_{name}"] = travel_time
+        start_geometries[f"distance_{name}"] = distance
+    stop = timeit.default_timer()
+
+    print(f"calculation finished in {stop - start} seconds")
+    return start_geometries
+
+
+def _snap_mode(network_index, mode, edge, offset, x, y):
+    # the closest edge of all modes is also the closest edge of a mode that may use it, only the others are
+    # snapped again onto the edges of the mode
+    edge, offset = edge.copy(), offset.copy()
+    other = np.flatnonzero((edge >= 0) & ~network_index.edge_modes[mode][np.maximum(edge, 0)])
+    edge[other], offset[other], _ = network_index.snap_xy(x[other], y[other], mode=mode)
+    return edge, offset
+
+
+def distance_matrix(
+    start_geometries,
+    destination_geometries,
+    network_gdf=None,
+    boundary_geometries=None,
+    transport_system=None,
+    maximum_distance=None,
+    k=None,
+    verbose=0,
+):
+    """
+    Calculate the network distances from every origin to all destinations within the maximum distance.
+
+    Unlike distance_to_closest, not only the closest destination is kept: either the k closest destinations
+    of every origin or all destinations within the maximum distance, e.g. to analyse how many stops serve an
+    origin. The destinations are searched with bounded Dijkstra runs (see routing.destinations_within), so the
+    memory grows with the number of reachable pairs, not with the number of origins times destinations.
+
+    :param start_geometries: Starting points for accessibility calculation
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_geometries: Destination points
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param boundary_geometries: Boundary dataset of the desired area
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param transport_system: Low-capacity or high-capacity pt system, decides the maximum distance
+    :type transport_system: str
+    :param maximum_distance: Maximum distance to the destinations (either this or the transport system is needed)
+    :type maximum_distance: float
+    :param k: only keep the k closest destinations of every origin (optional, all within the maximum distance
+        if None)
+    :type k: int
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return: sparse distances, with the indices of the starting points and destinations as ids
+    :rtype: ptac.routing.ODMatrix
+    """
+    start = timeit.default_timer()
+    if maximum_distance is None:
+        if transport_system is None:
+            raise ValueError("please indicate either transport_system or maximum_distance")
+        maximum_distance = _maximum_distance(transport_system)
+    crs = _crs(start_geometries, network_gdf)
+    start_geometries = util.project_gdf(start_geometries, to_crs=crs)
+    destination_geometries = util.project_gdf(destination_geometries, to_crs=crs)
+
+    if boundary_geometries is None:
+        boundary_geometries = _bounding_box(start_geometries)
+
+    if not boundary_geometries.crs == settings.default_crs:
+        boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
+
+    network_index = _network_index(network_gdf, boundary_geometries, crs, verbose=verbose)
+    origin_edge, origin_offset, _ = network_index.snap(start_geometries)
+    destination_edge, destination_offset, _ = network_index.snap(destination_geometries)
+    origin_id = np.flatnonzero(origin_edge >= 0)
+    destination_id = np.flatnonzero(destination_edge >= 0)
+
+    if verbose > 0:
+        print("Calculating origin-destination distances in-process\n")
+    origin, destination, distance = routing.destinations_within(
+        network_index.edge_from,
+        network_index.edge_to,
+        network_index.edge_length,
+        origin_edge[origin_id],
+        origin_offset[origin_id],
+        destination_edge[destination_id],
+        destination_offset[destination_id],
+        limit=float(maximum_distance),
+        k=k,
+    )
+    od_matrix = routing.ODMatrix.from_coo(
+        origin_id[origin],
+        destination_id[destination],
+        distance,
+        origin_id=start_geometries.index.to_numpy(),
+        destination_id=destination_geometries.index.to_numpy(),
+    )
+    stop = timeit.default_timer()
+
+    print(f"calculation finished in {stop - start} seconds")
+    return od_matrix
+
+
+def distance_to_closest_sweep(
+    start_geometries,
+    feed,
+    time_slices,
+    date=None,
+    minimum_frequency=None,
+    transport_system=None,
+    maximum_distance=None,
+    network_gdf=None,
+    boundary_geometries=None,
+    verbose=0,
+):
+    """
+    Calculate the distance to the closest served stop for several time slices of a GTFS feed.
+
+    The feed is read once and the stops served within every time slice form one destination set of
+    distance_to_closest_sets, so the network is prepared, the origins are snapped and the network is searched
+    only once for the whole sweep.
+
+    :param start_geometries: Starting points for accessibility calculation
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :param time_slices: start and end of every time slice, in seconds of the service day or as "HH:MM[:SS]",
+        e.g. [("06:00", "07:00"), ("07:00", "08:00")]
+    :type time_slices: list of tuple
+    :param date: only consider trips running on this date, e.g. 20200915 (optional, all trips if None)
+    :type date: int
+    :param minimum_frequency: minimum number of departures per hour for a stop to be served (optional)
+    :type minimum_frequency: float
+    :param transport_system: Low-capacity or high-capacity pt system, decides the maximum distance
+    :type transport_system: str
+    :param maximum_distance: Maximum distance to next pt station (optional)
+    :type maximum_distance: int
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param boundary_geometries: Boundary dataset of the desired area
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return accessibility_output: Starting points with the columns distance_<slice> (NaN if no served stop can
+        be reached) and accessible_<slice> for every time slice, e.g. distance_07:00-08:00
+    :rtype accessibility_output: Geopandas.GeoDataFrame::POINT
+    """
+    if maximum_distance is None:
+        maximum_distance = np.inf if transport_system is None else _maximum_distance(transport_system)
+    stops_gdf = gtfs.read_stops(feed)
+    departures = gtfs.read_departures(feed, date=date)
+    destination_sets = {}
+    for start_time, end_time in time_slices:
+        served = gtfs.served_stops(departures, start_time, end_time, minimum_frequency=minimum_frequency)
+        destination_sets[gtfs.time_slice_label(start_time, end_time)] = (
+            stops_gdf[stops_gdf["stop_id"].isin(served)],
+            maximum_distance,
+        )
+    if verbose > 0:
+        print(f"Calculating accessibilities for {len(destination_sets)} time slices\n")
+    accessibility_output = distance_to_closest_sets(
+        start_geometries,
+        destination_sets,
+        network_gdf=network_gdf,
+        boundary_geometries=boundary_geometries,
+        verbose=verbose,
+    )
+    for name in destination_sets:
+        accessibility_output[f"accessible_{name}"] = accessibility_output[f"distance_{name}"] <= maximum_distance
+    return accessibility_output.drop(columns="accessible")
+
+
+def _crs(start_geometries, network_gdf):
+    # compact networks are stored in a fixed crs, everything else is projected into the UTM zone of the origins
+    if isinstance(network_gdf, network.PtacNetwork):
+        return network_gdf.crs
+    return util.utm_crs(start_geometries)
+
+
+def _network_index(network_gdf, boundary_geometries, crs, mode="mode_walk", verbose=0):
+    # prepare the network for the native engine and index the edges usable by the mode
+    if isinstance(network_gdf, network.PtacNetwork):
+        return NetworkIndex(network_gdf, mode=mode)
+    if network_gdf is None:
+        if verbose > 0:
+            print("No street network was specified. Loading osm network..\n")
+        # other modes than walking use streets the walking network leaves out
+        network_type = "walk" if mode in ["mode_walk", ["mode_walk"]] else "all"
+        network_gdf = get_prepared_network(boundary_geometries, network_type=network_type, verbose=verbose)
+    else:
+        network_gdf = _prepare_edges(network_gdf)
+    return NetworkIndex(util.project_gdf(network_gdf, to_crs=crs), mode=mode)
+
+
+def _bounding_box(gdf):
+    # the bounds are enough to download the network, a union of millions of points is not needed
+    return (
+        gpd.GeoDataFrame(index=[0], crs=gdf.crs, geometry=[shapely.box(*gdf.total_bounds)])
+        .to_crs(settings.default_crs)
+        .envelope.to_frame("geometry")
+    )
+
+
+def _maximum_distance(maximum_distance):
+    # maximum distances can be given in meters or as transport system
+    if isinstance(maximum_distance, str):
+        if maximum_distance not in settings.maximum_distances:
+            print("there is no such transport system. Please indicate either None, 'low-capacity' or 'high-capacity'")
+            sys.exit()
+        return settings.maximum_distances[maximum_distance]
+    return maximum_distance
+
+
+def origin_distances(output, number_of_origins, maximum_distance=None):
+    """
+    Align routing results with the starting points.
+
+    :param output: Closest destination and network distance of the reached origins (columns "o_id" and
+        "distance_pt", o_id being the position of the origin)
+    :type output: pandas.DataFrame
+    :param number_of_origins: number of starting points
+    :type number_of_origins: int
+    :param maximum_distance: Maximum walkable distance (optional)
+    :type maximum_distance: float
+    :return: network distance of every starting point, inf if no destination is reached within the maximum
+        distance
+    :rtype: numpy.ndarray
+    """
+    distance = np.full(number_of_origins, np.inf)
+    reached = output["distance_pt"].notna().to_numpy()
+    distance[output["o_id"].to_numpy()[reached].astype(np.int64)] = output["distance_pt"].to_numpy()[reached]
+    if maximum_distance is not None:
+        distance[distance > maximum_distance] = np.inf
+    return distance
+
+
 def subset_result(accessibility_output, transport_system=None, maximum_distance=None):
     """
     Subset accessibility results based on transport system type or maximum distance.
@@ -316,22 +1230,14 @@ def subset_result(accessibility_output, transport_system=None, maximum_distance=
         print("please indicate either transport_system or maximum_distance. Not both")
         sys.exit()
     if maximum_distance is not None:
-        accessibility_output = accessibility_output[
-            (accessibility_output["distance_pt"] <= maximum_distance)
-        ]
+        accessibility_output = accessibility_output[(accessibility_output["distance_pt"] <= maximum_distance)]
     if transport_system is not None:
-        if transport_system == "low-capacity":
+        if transport_system in settings.maximum_distances:
             accessibility_output = accessibility_output[
-                (accessibility_output["distance_pt"] <= 500)
-            ]
-        elif transport_system == "high-capacity":
-            accessibility_output = accessibility_output[
-                (accessibility_output["distance_pt"] <= 1000)
+                (accessibility_output["distance_pt"] <= settings.maximum_distances[transport_system])
             ]
         else:
-            print(
-                "there is no such transport system. Please indicate either None, 'low-capacity' or 'high-capacity'"
-            )
+            print("there is no such transport system. Please indicate either None, 'low-capacity' or 'high-capacity'")
             sys.exit()
     return accessibility_output
 
@@ -352,16 +1258,17 @@ def calculate_sdg(df_pop_total, pop_accessible, population_column, verbose=0):
     total_population = df_pop_total[population_column].sum()
     # if input is a list of dataframes (low- and high-capacity transit systems):
     if isinstance(pop_accessible, list):
-        if (population_column not in df_pop_total.columns) or (
-            population_column not in pop_accessible[0]
-        ):
-            print(
-                f"column {population_column} does not exist in both population datasets"
-            )
+        if (population_column not in df_pop_total.columns) or (population_column not in pop_accessible[0]):
+            print(f"column {population_column} does not exist in both population datasets")
             sys.exit()
 
-        # concatenate dataframes
-        df = pd.concat(pop_accessible)
+        # concatenate the key and population columns only, the geometries are not needed
+        df = pd.DataFrame(
+            {
+                column: np.concatenate([output[column].to_numpy() for output in pop_accessible])
+                for column in ["index", "o_id", population_column]
+            }
+        )
         # drop duplicates:
         df = df.drop_duplicates(subset=["index", "o_id"])
         # sum population of accessibility output:
@@ -374,12 +1281,8 @@ def calculate_sdg(df_pop_total, pop_accessible, population_column, verbose=0):
         print("SDG 11.2.1 indicator is calculated")
     # if input is a single dataframe:
     else:
-        if (population_column not in df_pop_total.columns) or (
-            population_column not in pop_accessible
-        ):
-            print(
-                f"column {population_column} does not exist in both population datasets"
-            )
+        if (population_column not in df_pop_total.columns) or (population_column not in pop_accessible):
+            print(f"column {population_column} does not exist in both population datasets")
             sys.exit()
         # sum population of accessibility output:
         accessibility_output_population = pop_accessible[population_column].sum()
@@ -389,3 +1292,95 @@ def calculate_sdg(df_pop_total, pop_accessible, population_column, verbose=0):
         sdg = accessibility_output_population / total_population
         # print("SDG 11.2.1 indicator is calculated")
     return sdg
+
+
+def calculate_sdg_raster(
+    path,
+    destination_geometries,
+    network_gdf=None,
+    boundary_geometries=None,
+    transport_system=None,
+    maximum_distance=None,
+    band=1,
+    clip=None,
+    verbose=0,
+):
+    """
+    Calculate sdg 11.2.1 value directly from a population raster.
+
+    The distance of every network node to its closest destination is computed once (see routing.DistanceField).
+    The raster is then read window by window, the centres of the populated cells are snapped onto the network and
+    their population is summed up if they lie within the maximum distance. No point geometries are built for the
+    cells and only one window is held in memory, besides the network. The result equals calculate_sdg of the
+    native engine run on population.raster_to_points.
+
+    :param path: Path to the population raster
+    :type path: str
+    :param destination_geometries: Public transport stops
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param boundary_geometries: Boundary dataset of the desired area (optional, the bounds of the raster or of
+        the clip area if None)
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param transport_system: Low-capacity or high-capacity pt system, decides the maximum distance
+    :type transport_system: str
+    :param maximum_distance: Maximum distance to next pt station (either this or the transport system is needed)
+    :type maximum_distance: float
+    :param band: Band of the raster
+    :type band: int
+    :param clip: Area to calculate the indicator for (optional, see population.iter_raster_points)
+    :type clip: Geopandas.GeoDataFrame::POLYGON or shapely.Polygon
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return SDG 11.2.1 indicator: SDG 11.2.1 indicator (NaN if the raster holds no population)
+    :rtype SDG 11.2.1 indicator: float
+    """
+    if maximum_distance is None:
+        if transport_system is None:
+            raise ValueError("please indicate either transport_system or maximum_distance")
+        maximum_distance = _maximum_distance(transport_system)
+    with rasterio.open(path) as src:
+        raster_crs = src.crs
+        raster_bounds = gpd.GeoDataFrame(index=[0], crs=raster_crs, geometry=[shapely.box(*src.bounds)])
+    crs = _crs(destination_geometries, network_gdf)
+    destination_geometries = util.project_gdf(destination_geometries, to_crs=crs)
+
+    if boundary_geometries is None:
+        if isinstance(clip, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            boundary_geometries = _bounding_box(clip)
+        elif clip is not None:
+            boundary_geometries = _bounding_box(gpd.GeoDataFrame(index=[0], crs=raster_crs, geometry=[clip]))
+        else:
+            boundary_geometries = _bounding_box(raster_bounds)
+    if not boundary_geometries.crs == settings.default_crs:
+        boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
+
+    network_index = _network_index(network_gdf, boundary_geometries, crs, verbose=verbose)
+    destination_edge, destination_offset, _ = network_index.snap(destination_geometries)
+    snapped = destination_edge >= 0
+    distance_field = routing.DistanceField(
+        network_index.edge_from,
+        network_index.edge_to,
+        network_index.edge_length,
+        destination_edge[snapped],
+        destination_offset[snapped],
+        limit=float(maximum_distance),
+    )
+
+    if verbose > 0:
+        print("Calculating SDG 11.2.1 indicator window by window\n")
+    transformer = pyproj.Transformer.from_crs(raster_crs, crs, always_xy=True)
+    total_population = 0.0
+    accessible_population = 0.0
+    for xs, ys, pop in population.iter_raster_points(path, band=band, clip=clip):
+        edge, offset, _ = network_index.snap_xy(*transformer.transform(xs, ys))
+        distance = np.full(len(pop), np.inf)
+        on_network = edge >= 0
+        distance[on_network] = distance_field.nearest(edge[on_network], offset[on_network])[0]
+        total_population += float(pop.sum(dtype=np.float64))
+        accessible_population += float(pop[distance <= maximum_distance].sum(dtype=np.float64))
+    if total_population == 0:
+        return float("nan")
+    return accessible_population / total_population
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import numpy as np
+import pandas as pd
+
+"""Aggregates the accessible population from arrays aligned with the starting points"""
+
+"""
+@name : aggregation.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# All functions take the population and the network distance of every starting point as arrays of the same length,
+# e.g. start_geometries["pop"].to_numpy() and the result of accessibility.distance_to_closest(...,
+# geodataframe=False). Unreachable starting points have an infinite or NaN distance.
+
+
+def accessible(distance, maximum_distance):
+    """
+    Return which starting points lie within the maximum distance of a destination.
+
+    :param distance: network distance of every starting point, or one column per destination set
+    :type distance: numpy.ndarray
+    :param maximum_distance: Maximum walkable distance, or one per destination set
+    :type maximum_distance: float or list of float
+    :return: one flag per starting point, True if any destination set is within its maximum distance
+    :rtype: numpy.ndarray
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    # NaN distances compare as False
+    within = distance <= np.asarray(maximum_distance, dtype=np.float64)
+    return within if within.ndim == 1 else within.any(axis=1)
+
+
+def calculate_sdg(population, distance, maximum_distance):
+    """
+    Calculate the SDG 11.2.1 indicator.
+
+    :param population: population of every starting point
+    :type population: numpy.ndarray
+    :param distance: network distance of every starting point, or one column per destination set, e.g.
+        np.column_stack([distance_low, distance_high])
+    :type distance: numpy.ndarray
+    :param maximum_distance: Maximum walkable distance, or one per destination set, e.g. [500, 1000]
+    :type maximum_distance: float or list of float
+    :return: share of the population within the maximum distance
+    :rtype: float
+    """
+    population = np.asarray(population, dtype=np.float64)
+    return float(population[accessible(distance, maximum_distance)].sum() / population.sum())
+
+
+def threshold_curve(population, distance, thresholds):
+    """
+    Calculate the accessible share of the population for several maximum distances at once (see DistanceCurve).
+
+    :param population: population of every starting point
+    :type population: numpy.ndarray
+    :param distance: network distance of every starting point
+    :type distance: numpy.ndarray
+    :param thresholds: maximum walkable distances, e.g. [100, 200, 500, 1000]
+    :type thresholds: list of float
+    :return: accessible share of the population for every threshold
+    :rtype: pandas.Series
+    """
+    return DistanceCurve(population, distance).share(thresholds)
+
+
+def zone_sdg(population, distance, zones, maximum_distance):
+    """
+    Calculate the SDG 11.2.1 indicator for every zone, e.g. city or district.
+
+    :param population: population of every starting point
+    :type population: numpy.ndarray
+    :param distance: network distance of every starting point, or one column per destination set
+    :type distance: numpy.ndarray
+    :param zones: zone of every starting point, starting points without zone (NaN or None) are left out
+    :type zones: numpy.ndarray or pandas.Series
+    :param maximum_distance: Maximum walkable distance, or one per destination set
+    :type maximum_distance: float or list of float
+    :return: total and accessible population and SDG 11.2.1 indicator ("population", "accessible_population",
+        "sdg") of every zone
+    :rtype: pandas.DataFrame
+    """
+    # accessible starting points are put at distance 0, all others out of reach
+    curve = DistanceCurve(population, np.where(accessible(distance, maximum_distance), 0.0, np.inf), zones)
+    reached = curve.population_within([0.0]).iloc[:, 0].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sdg = reached / curve.total_population
+    return pd.DataFrame(
+        {"population": curve.total_population, "accessible_population": reached, "sdg": sdg},
+        index=pd.Index(curve.zones, name="zone"),
+    )
+
+
+class DistanceCurve:
+    """
+    Cumulative population within network distance of a destination.
+
+    The starting points are sorted by zone and distance once, after that the accessible share of the
+    population can be read for any list of thresholds with one binary search per zone, e.g. for
+    100, 200, ..., 2000 m.
+
+    :param population: population of every starting point
+    :type population: numpy.ndarray
+    :param distance: network distance of every starting point
+    :type distance: numpy.ndarray
+    :param zones: zone of every starting point, e.g. city or district (optional, one curve for all starting points
+        if None). Starting points without zone (NaN or None) are left out
+    :type zones: numpy.ndarray or pandas.Series
+    """
+
+    def __init__(self, population, distance, zones=None):
+        """Sort the starting points by zone and distance and sum up their population."""
+        population = np.asarray(population, dtype=np.float64)
+        distance = np.nan_to_num(np.asarray(distance, dtype=np.float64), nan=np.inf)
+        if zones is None:
+            codes, self.zones = np.zeros(len(population), dtype=np.int64), None
+        else:
+            codes, self.zones = pd.factorize(np.asarray(zones), sort=True)
+            in_zone = codes >= 0
+            codes, population, distance = codes[in_zone], population[in_zone], distance[in_zone]
+        number_of_zones = 1 if self.zones is None else len(self.zones)
+        order = np.lexsort((distance, codes))
+        self.distance = distance[order]
+        # cumulative population of the sorted starting points, starting with 0
+        self.cumulative_population = np.concatenate([[0.0], np.cumsum(population[order])])
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=number_of_zones))])
+        self.total_population = np.diff(self.cumulative_population[self.offsets])
+
+    def population_within(self, thresholds):
+        """
+        Return the population within every threshold.
+
+        :param thresholds: maximum walkable distances
+        :type thresholds: list of float
+        :return: population within every threshold, one row per zone (a Series if no zones were given)
+        :rtype: pandas.DataFrame or pandas.Series
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        within = np.empty((len(self.offsets) - 1, len(thresholds)))
+        for zone, (start, end) in enumerate(zip(self.offsets[:-1], self.offsets[1:])):
+            position = start + np.searchsorted(self.distance[start:end], thresholds, side="right")
+            within[zone] = self.cumulative_population[position] - self.cumulative_population[start]
+        return self._frame(within, thresholds)
+
+    def share(self, thresholds):
+        """
+        Return the accessible share of the population for every threshold.
+
+        :param thresholds: maximum walkable distances
+        :type thresholds: list of float
+        :return: share of the population within every threshold, one row per zone (a Series if no zones were
+            given)
+        :rtype: pandas.DataFrame or pandas.Series
+        """
+        within = self.population_within(thresholds)
+        total = self.total_population[0] if self.zones is None else self.total_population
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return within.div(total, axis=0)
+
+    def _frame(self, values, thresholds):
+        columns = pd.Index(thresholds, name="distance")
+        if self.zones is None:
+            return pd.Series(values[0], index=columns)
+        return pd.DataFrame(values, index=pd.Index(self.zones, name="zone"), columns=columns)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import os
+import tempfile
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+import ptac.accessibility as accessibility
+import ptac.population as population
+import ptac.settings as settings
+import ptac.util as util
+
+"""Computes SDG 11.2.1 for many cities in parallel"""
+
+"""
+@name : batch.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# rough upper bound of the memory one city needs, used to derive the number of workers from a memory budget
+default_memory_per_city = 4 * 1024**3  # bytes
+
+
+def iter_sdg(
+    cities,
+    population_source,
+    stops_low,
+    stops_high,
+    network_gdf=None,
+    population_column="pop",
+    id_column=None,
+    processes=None,
+    memory_budget=None,
+    memory_per_city=default_memory_per_city,
+    scratch_directory=None,
+    engine="urmoac",
+    verbose=0,
+):
+    """
+    Calculate SDG 11.2.1 for many cities in a process pool and yield the results as they are finished.
+
+    Every worker process gets its own scratch directory, so parallel UrMoAC runs never share files.
+    Only as many cities as there are workers are in flight at any time.
+
+    :param cities: City boundaries (one row per city)
+    :type cities: Geopandas.GeoDataFrame::POLYGON
+    :param population_source: Path to a population raster or population points
+    :type population_source: str or Geopandas.GeoDataFrame::POINT
+    :param stops_low: Low-capacity public transport stops
+    :type stops_low: Geopandas.GeoDataFrame::POINT
+    :param stops_high: High-capacity public transport stops
+    :type stops_high: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Street network covering all cities (optional, if None the network of every city is
+        loaded from the cache or downloaded from osm)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param population_column: The name of the population column
+    :type population_column: str
+    :param id_column: Column identifying the cities (optional, the index is used if None)
+    :type id_column: str
+    :param processes: Number of worker processes (optional, defaults to the number of cpus)
+    :type processes: int
+    :param memory_budget: Memory in bytes all workers may use together (optional)
+    :type memory_budget: int
+    :param memory_per_city: Memory in bytes one worker is expected to need
+    :type memory_per_city: int
+    :param scratch_directory: Folder for the worker scratch directories (optional, temporary folder if None)
+    :type scratch_directory: str
+    :param engine: Routing engine to use, either "urmoac" or "native"
+    :type engine: str
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return: one dict per city with the keys "city", "sdg_low", "sdg_high", "sdg" and "error"
+    :rtype: generator
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if memory_budget is not None:
+        processes = max(1, min(processes, int(memory_budget // memory_per_city)))
+    if cities.crs != settings.default_crs:
+        cities = cities.to_crs(settings.default_crs)
+    city_ids = cities.index if id_column is None else cities[id_column]
+
+    def tasks():
+        for city_id, (_, city) in zip(city_ids, cities.iterrows()):
+            boundary = gpd.GeoDataFrame(index=[0], crs=cities.crs, geometry=[city.geometry])
+            extent = _extent(boundary)
+            yield (
+                city_id,
+                boundary,
+                _clip(population_source, boundary),
+                _clip(stops_low, extent),
+                _clip(stops_high, extent),
+                None if network_gdf is None else _clip(network_gdf, extent),
+                population_column,
+                engine,
+                verbose,
+            )
+
+    with tempfile.TemporaryDirectory(dir=scratch_directory) as scratch_root:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(scratch_root,)) as pool:
+            pending = set()
+            for task in tasks():
+                # keep the number of clipped inputs held in memory bounded
+                if len(pending) >= processes:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(_process_city, *task))
+            for future in wait(pending).done:
+                yield future.result()
+
+
+def calculate_sdg_batch(cities, population_source, stops_low, stops_high, **kwargs):
+    """
+    Calculate SDG 11.2.1 for many cities in a process pool.
+
+    See iter_sdg for a description of the parameters.
+
+    :return: One row per city with the low-capacity, high-capacity and combined SDG 11.2.1 indicator
+    :rtype: pandas.DataFrame
+    """
+    results = pd.DataFrame(list(iter_sdg(cities, population_source, stops_low, stops_high, **kwargs)))
+    return results.set_index("city")
+
+
+def _init_worker(scratch_root):
+    # every worker writes its UrMoAC files into a folder of its own
+    accessibility.home_directory = Path(tempfile.mkdtemp(dir=scratch_root))
+
+
+def _extent(boundary, buffer=1000):
+    # stops slightly outside of a city still serve its population
+    projected = util.project_gdf(boundary)
+    return projected.buffer(buffer).to_crs(settings.default_crs).to_frame("geometry")
+
+
+def _clip(source, boundary):
+    if isinstance(source, (str, Path)):
+        # rasters are read by the workers, window by window
+        return source
+    if source.crs != boundary.crs:
+        boundary = boundary.to_crs(source.crs)
+    candidates = source.iloc[source.sindex.query(boundary.geometry.iloc[0], predicate="intersects")]
+    return candidates.sort_index()
+
+
+def _process_city(
+    city_id, boundary, population_gdf, stops_low, stops_high, network_gdf, population_column, engine, verbose
+):
+    result = {"city": city_id, "sdg_low": None, "sdg_high": None, "sdg": None, "error": None}
+    try:
+        if isinstance(population_gdf, (str, Path)):
+            population_gdf = population.raster_to_points(population_gdf, clip=boundary)
+        if len(population_gdf) == 0 or population_gdf[population_column].sum() == 0:
+            raise ValueError("no population within city boundary")
+        accessible = []
+        for key, stops, transport_system in [
+            ("sdg_low", stops_low, "low-capacity"),
+            ("sdg_high", stops_high, "high-capacity"),
+        ]:
+            if len(stops) == 0:
+                result[key] = 0.0
+                continue
+            accessibility_output = accessibility.distance_to_closest(
+                population_gdf.copy(),
+                stops.copy(),
+                network_gdf=None if network_gdf is None else network_gdf.copy(),
+                boundary_geometries=boundary,
+                transport_system=transport_system,
+                engine=engine,
+                verbose=verbose,
+            )
+            accessible.append(accessibility_output)
+            result[key] = accessibility.calculate_sdg(population_gdf, accessibility_output, population_column)
+        if accessible:
+            result["sdg"] = accessibility.calculate_sdg(population_gdf, accessible, population_column)
+        else:
+            result["sdg"] = 0.0
+    except (Exception, SystemExit):
+        result["error"] = traceback.format_exc()
+    return result
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import hashlib
+import json
+import os
+import uuid
+
+import geopandas as gpd
+
+import ptac.settings as settings
+
+"""Caches prepared street networks on disk"""
+
+"""
+@name : cache.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+
+def network_key(boundary, network_type="walk", custom_filter=None, simplify=False, streettypes=None, pbf_file=None):
+    """
+    Build the content address of a prepared network.
+
+    :param boundary: boundary of the area the network was downloaded for (in WGS84)
+    :type boundary: Geopandas.GeoDataFrame::POLYGON
+    :param network_type: network type passed to osm.get_network
+    :type network_type: str
+    :param custom_filter: custom filter passed to osm.get_network
+    :type custom_filter: str
+    :param simplify: simplify flag passed to osm.get_network
+    :type simplify: bool
+    :param streettypes: street type table used for preparation (default: settings.streettypes)
+    :type streettypes: pandas.DataFrame
+    :param pbf_file: local osm extract the network was read from (optional, identified by path, size and
+        modification time)
+    :type pbf_file: str
+    :return key: hex digest identifying the prepared network
+    :rtype key: str
+    """
+    if streettypes is None:
+        streettypes = settings.streettypes
+    # accessibility._prepare_edges moves the street types into a column, the key must not depend on that
+    if "street_type" in streettypes.columns:
+        streettypes = streettypes.set_index("street_type").rename_axis(None)
+    content = {
+        "bounds": [round(float(value), 6) for value in boundary.total_bounds],
+        "network_type": network_type,
+        "custom_filter": custom_filter,
+        "simplify": bool(simplify),
+        "streettypes": streettypes.sort_index().to_csv(),
+    }
+    if pbf_file is not None:
+        stat = os.stat(pbf_file)
+        content["pbf_file"] = [os.path.abspath(pbf_file), stat.st_size, stat.st_mtime_ns]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_network(key, folder=None):
+    """
+    Load a prepared network from the cache.
+
+    :param key: content address of the network (see network_key)
+    :type key: str
+    :param folder: cache folder (default: settings.cache_folder)
+    :type folder: str
+    :return network_gdf: prepared network or None if it is not cached
+    :rtype network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    """
+    path = _path(key, folder)
+    if not os.path.exists(path):
+        return None
+    network_gdf = gpd.read_parquet(path)
+    # mark the entry as recently used
+    os.utime(path)
+    return network_gdf
+
+
+def store_network(key, network_gdf, folder=None, size_limit=None):
+    """
+    Store a prepared network in the cache and evict least recently used entries.
+
+    :param key: content address of the network (see network_key)
+    :type key: str
+    :param network_gdf: prepared network
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param folder: cache folder (default: settings.cache_folder)
+    :type folder: str
+    :param size_limit: maximum size of the cache in bytes (default: settings.cache_size_limit)
+    :type size_limit: int
+    """
+    path = _path(key, folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write to a temporary file first so that parallel runs never read half written entries
+    temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    network_gdf.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, path)
+    evict(folder=folder, size_limit=size_limit)
+
+
+def evict(folder=None, size_limit=None, suffix=".parquet"):
+    """
+    Remove least recently used files until the cache fits into the size limit.
+
+    :param folder: cache folder (default: settings.cache_folder)
+    :type folder: str
+    :param size_limit: maximum size of the cache in bytes (default: settings.cache_size_limit)
+    :type size_limit: int
+    :param suffix: suffix of the files belonging to the cache
+    :type suffix: str
+    """
+    folder = settings.cache_folder if folder is None else folder
+    size_limit = settings.cache_size_limit if size_limit is None else size_limit
+    if not os.path.exists(folder):
+        return
+    entries = []
+    for name in os.listdir(folder):
+        if name.endswith(suffix):
+            stat = os.stat(os.path.join(folder, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total_size <= size_limit:
+            break
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def _path(key, folder):
+    folder = settings.cache_folder if folder is None else folder
+    return os.path.join(folder, f"{key}.parquet")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import timeit
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import ptac.accessibility as accessibility
+import ptac.population as population
+import ptac.routing as routing
+import ptac.settings as settings
+import ptac.util as util
+
+"""Computes the walking catchments of public transport stops"""
+
+"""
+@name : catchment.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# distance in meters the reached streets are buffered with
+default_buffer = 50
+
+
+def stop_catchments(
+    destination_geometries,
+    network_gdf=None,
+    boundary_geometries=None,
+    transport_system=None,
+    maximum_distance=None,
+    buffer=default_buffer,
+    method="buffer",
+    ratio=0.3,
+    verbose=0,
+):
+    """
+    Calculate the walking catchment of every stop.
+
+    All stops are searched together and every search stops at the maximum distance (see
+    routing.reached_intervals). The walkable edges are cut where the maximum distance is reached and the reached
+    parts of every stop are turned into one polygon, either by buffering them or by their concave hull.
+
+    :param destination_geometries: Public transport stops
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param boundary_geometries: Boundary dataset of the desired area (optional, the bounding box of the stops
+        if None)
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param transport_system: Low-capacity or high-capacity pt system, decides the maximum distance
+    :type transport_system: str
+    :param maximum_distance: Maximum walking distance (either this or the transport system is needed)
+    :type maximum_distance: float
+    :param buffer: Distance in meters the reached streets are buffered with
+    :type buffer: float
+    :param method: "buffer" to buffer the reached streets or "concave_hull" for their concave hull
+    :type method: str
+    :param ratio: ratio of the concave hull, between 0 (most concave) and 1 (convex hull)
+    :type ratio: float
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return catchments: one polygon per stop, with the index of the stops and the columns "transport_system"
+        and "maximum_distance" (stops off the network get an empty polygon)
+    :rtype catchments: Geopandas.GeoDataFrame::POLYGON
+    """
+    start = timeit.default_timer()
+    if method not in ["buffer", "concave_hull"]:
+        raise ValueError("there is no such method. Please indicate either 'buffer' or 'concave_hull'")
+    if maximum_distance is None:
+        if transport_system is None:
+            raise ValueError("please indicate either transport_system or maximum_distance")
+        maximum_distance = accessibility._maximum_distance(transport_system)
+    crs = accessibility._crs(destination_geometries, network_gdf)
+    destination_geometries = util.project_gdf(destination_geometries, to_crs=crs)
+
+    if boundary_geometries is None:
+        # the catchments reach beyond the outermost stops
+        boundary_geometries = accessibility._bounding_box(
+            gpd.GeoDataFrame(geometry=destination_geometries.buffer(maximum_distance), crs=crs)
+        )
+    if not boundary_geometries.crs == settings.default_crs:
+        boundary_geometries = boundary_geometries.to_crs(settings.default_crs)
+
+    network_index = accessibility._network_index(network_gdf, boundary_geometries, crs, verbose=verbose)
+    destination_edge, destination_offset, _ = network_index.snap(destination_geometries)
+    destination_id = np.flatnonzero(destination_edge >= 0)
+
+    if verbose > 0:
+        print(f"Calculating catchments of {len(destination_id)} stops\n")
+    destination, edge, begin, end = routing.reached_intervals(
+        network_index.edge_from,
+        network_index.edge_to,
+        network_index.edge_length,
+        destination_edge[destination_id],
+        destination_offset[destination_id],
+        limit=float(maximum_distance),
+    )
+    reached = end > begin
+    destination, edge = destination_id[destination[reached]], edge[reached]
+    length = network_index.edge_length[edge]
+    pieces = _substrings(network_index.geometries[edge], begin[reached] / length, end[reached] / length)
+
+    order = np.argsort(destination, kind="stable")
+    streets = np.full(len(destination_geometries), None, dtype=object)
+    has_streets = np.unique(destination)
+    streets[has_streets] = shapely.multilinestrings(
+        pieces[order], indices=np.searchsorted(has_streets, destination[order])
+    )
+    if method == "buffer":
+        polygons = shapely.buffer(streets, buffer)
+    else:
+        polygons = shapely.concave_hull(streets, ratio=ratio)
+    polygons[shapely.is_missing(polygons)] = shapely.Polygon()
+
+    catchments = gpd.GeoDataFrame(
+        {"transport_system": transport_system, "maximum_distance": float(maximum_distance)},
+        index=destination_geometries.index,
+        geometry=polygons,
+        crs=crs,
+    )
+    if verbose > 0:
+        print(f"calculation finished in {timeit.default_timer() - start} seconds")
+    return catchments
+
+
+def dissolve_catchments(catchments, by="transport_system"):
+    """
+    Merge the catchments of several stops into one area, e.g. per transport system.
+
+    :param catchments: Catchments of stops (see stop_catchments)
+    :type catchments: Geopandas.GeoDataFrame::POLYGON
+    :param by: Column to group the catchments by (optional, all catchments are merged if None)
+    :type by: str
+    :return: one (multi-)polygon per group
+    :rtype: Geopandas.GeoDataFrame::POLYGON
+    """
+    if by is None:
+        return gpd.GeoDataFrame(geometry=[shapely.union_all(catchments.geometry.to_numpy())], crs=catchments.crs)
+    codes, groups = pd.factorize(catchments[by], sort=True)
+    geometries = catchments.geometry.to_numpy()
+    return gpd.GeoDataFrame(
+        geometry=[shapely.union_all(geometries[codes == code]) for code in range(len(groups))],
+        index=pd.Index(groups, name=by),
+        crs=catchments.crs,
+    )
+
+
+def _substrings(lines, begin, end):
+    # parts of lines between two normalized positions, all lines are cut at once
+    coordinates, line = shapely.get_coordinates(lines, return_index=True)
+    step = np.zeros(len(coordinates))
+    step[1:] = np.hypot(*(coordinates[1:] - coordinates[:-1]).T)
+    step[np.flatnonzero(np.diff(line)) + 1] = 0
+    distance = np.cumsum(step)
+    first = np.searchsorted(line, line)
+    distance -= distance[first]
+    total = shapely.length(lines)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        position = np.where(total[line] > 0, distance / total[line], 0)
+    # inner vertices between the ends of every part, the ends are interpolated
+    inner = (position > begin[line]) & (position < end[line])
+    start_points = shapely.get_coordinates(shapely.line_interpolate_point(lines, begin, normalized=True))
+    end_points = shapely.get_coordinates(shapely.line_interpolate_point(lines, end, normalized=True))
+    piece = np.concatenate([np.arange(len(lines)), line[inner], np.arange(len(lines))])
+    key = np.concatenate([np.full(len(lines), -1.0), position[inner], np.full(len(lines), 2.0)])
+    order = np.lexsort((key, piece))
+    points = np.concatenate([start_points, coordinates[inner], end_points])[order]
+    return shapely.linestrings(points, indices=piece[order])
+
+
+def calculate_sdg_catchments(path, catchments, band=1, clip=None):
+    """
+    Calculate sdg 11.2.1 value as share of the raster population within the catchments of the stops.
+
+    The catchments are merged and the population of the raster cells whose centre lies within them is summed up
+    window by window (see population.zonal_sum), without routing any population point. The result depends on
+    the buffer of the catchments, see accessibility.calculate_sdg_raster for the routed indicator.
+
+    :param path: Path to the population raster
+    :type path: str
+    :param catchments: Catchments of stops (see stop_catchments), e.g. of low- and high-capacity stops together
+    :type catchments: Geopandas.GeoDataFrame::POLYGON
+    :param band: Band of the raster
+    :type band: int
+    :param clip: Area to calculate the indicator for (optional, see population.iter_raster_points)
+    :type clip: Geopandas.GeoDataFrame::POLYGON or shapely.Polygon
+    :return SDG 11.2.1 indicator: SDG 11.2.1 indicator (NaN if the raster holds no population)
+    :rtype SDG 11.2.1 indicator: float
+    """
+    covered, total = population.zonal_sum(path, dissolve_catchments(catchments, by=None), band=band, clip=clip)
+    if total == 0:
+        return float("nan")
+    return float(covered.iloc[0]) / total
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import os
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+import ptac.settings as settings
+
+"""Reads public transport stops and their departures from GTFS feeds"""
+
+"""
+@name : gtfs.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# rows of stop_times.txt read at once, national feeds have tens of millions of rows
+default_chunksize = 10**6
+
+
+def read_stops(feed):
+    """
+    Read the stops of a GTFS feed.
+
+    Stations, entrances and other nodes without departures (location_type > 0) are skipped.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :return stops_gdf: stops with stop_id and stop_name
+    :rtype stops_gdf: Geopandas.GeoDataFrame::POINT
+    """
+    stops = _read_table(
+        feed,
+        "stops.txt",
+        dtype={
+            "stop_id": str,
+            "stop_name": str,
+            "stop_lat": np.float64,
+            "stop_lon": np.float64,
+            "location_type": str,
+        },
+    )
+    if "location_type" in stops.columns:
+        location_type = pd.to_numeric(stops["location_type"], errors="coerce").fillna(0)
+        stops = stops[location_type == 0]
+    stops = stops.dropna(subset=["stop_lat", "stop_lon"])
+    return gpd.GeoDataFrame(
+        stops[["stop_id", "stop_name"]].reset_index(drop=True),
+        geometry=gpd.points_from_xy(stops["stop_lon"], stops["stop_lat"]),
+        crs=settings.default_crs,
+    )
+
+
+def read_departures(feed, date=None, chunksize=default_chunksize):
+    """
+    Read all departures of a GTFS feed.
+
+    stop_times.txt is streamed in chunks, only the stop and departure time of every row are kept. Stop ids are
+    stored as categorical codes of the stop ids in stops.txt, so national feeds with tens of millions of rows
+    take eight bytes per departure. Rows of stops missing from stops.txt are skipped.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :param date: only keep departures of trips running on this date, e.g. 20200915 (optional, all trips if None)
+    :type date: int
+    :param chunksize: number of stop_times rows read at once
+    :type chunksize: int
+    :return departures: stop_id (categorical) and departure time in seconds after the start of the service day
+    :rtype departures: pandas.DataFrame
+    """
+    running = None
+    if date is not None:
+        trips = read_trips(feed)
+        running = trips.index[trips["service_id"].isin(active_services(feed, date))]
+    stop_ids = pd.Index(_read_table(feed, "stops.txt", usecols=["stop_id"], dtype={"stop_id": str})["stop_id"])
+    stop_ids = stop_ids.dropna().unique()
+    codes, departures = [], []
+    for stop_times in _iter_table(
+        feed,
+        "stop_times.txt",
+        usecols=["trip_id", "stop_id", "arrival_time", "departure_time"],
+        dtype={"trip_id": str, "stop_id": str, "arrival_time": str, "departure_time": str},
+        chunksize=chunksize,
+    ):
+        if running is not None:
+            stop_times = stop_times[stop_times["trip_id"].isin(running)]
+        # departure times may be left empty between timepoints
+        departure = parse_time(stop_times["departure_time"].fillna(stop_times["arrival_time"]))
+        code = stop_ids.get_indexer(stop_times["stop_id"])
+        valid = (departure >= 0) & (code >= 0)
+        codes.append(code[valid].astype(np.int32))
+        departures.append(departure[valid])
+    codes = np.concatenate(codes) if codes else np.empty(0, dtype=np.int32)
+    return pd.DataFrame(
+        {
+            "stop_id": pd.Categorical.from_codes(codes, categories=stop_ids),
+            "departure": np.concatenate(departures) if departures else np.empty(0, dtype=np.int32),
+        }
+    )
+
+
+def read_routes(feed):
+    """
+    Read the route types of a GTFS feed.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :return routes: route_type indexed by route_id
+    :rtype routes: pandas.DataFrame
+    """
+    routes = _read_table(
+        feed, "routes.txt", usecols=["route_id", "route_type"], dtype={"route_id": str, "route_type": np.int32}
+    )
+    return routes.set_index("route_id")
+
+
+def read_trips(feed):
+    """
+    Read the routes and services of the trips of a GTFS feed.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :return trips: route_id and service_id indexed by trip_id
+    :rtype trips: pandas.DataFrame
+    """
+    trips = _read_table(
+        feed,
+        "trips.txt",
+        usecols=["trip_id", "route_id", "service_id"],
+        dtype={"trip_id": str, "route_id": "category", "service_id": "category"},
+    )
+    return trips.set_index("trip_id")
+
+
+def classify_stops(feed, date=None, chunksize=default_chunksize):
+    """
+    Classify stops by the transport systems serving them.
+
+    The route type of every trip is looked up once, stop_times.txt is then streamed in chunks and reduced to
+    the distinct pairs of stop and transport system (see settings.route_types), so memory stays bounded by
+    the number of stops. A stop served by routes of both systems belongs to both.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :param date: only consider trips running on this date, e.g. 20200915 (optional, all trips if None)
+    :type date: int
+    :param chunksize: number of stop_times rows read at once
+    :type chunksize: int
+    :return stops_gdf: stops (see read_stops) with the boolean columns "low-capacity" and "high-capacity"
+    :rtype stops_gdf: Geopandas.GeoDataFrame::POINT
+    """
+    systems = ["low-capacity", "high-capacity"]
+    routes = read_routes(feed)
+    trips = read_trips(feed)
+    if date is not None:
+        trips = trips[trips["service_id"].isin(active_services(feed, date))]
+    # transport system of every trip as small integer code (-1 for route types without one)
+    route_type = routes["route_type"].reindex(trips["route_id"].astype(str)).to_numpy()
+    route_type = np.where(route_type >= 100, route_type // 100 * 100, route_type)
+    system = pd.Series(route_type).map(settings.route_types).map({name: code for code, name in enumerate(systems)})
+    trip_system = pd.Series(system.fillna(-1).to_numpy(dtype=np.int8), index=trips.index)
+
+    served = []
+    for stop_times in _iter_table(
+        feed,
+        "stop_times.txt",
+        usecols=["trip_id", "stop_id"],
+        dtype={"trip_id": str, "stop_id": str},
+        chunksize=chunksize,
+    ):
+        code = trip_system.reindex(stop_times["trip_id"]).fillna(-1).to_numpy(dtype=np.int8)
+        pairs = pd.DataFrame({"stop_id": stop_times["stop_id"].to_numpy(), "system": code})
+        served.append(pairs[pairs["system"] >= 0].drop_duplicates())
+    if served:
+        served = pd.concat(served, ignore_index=True).drop_duplicates()
+    else:
+        served = pd.DataFrame({"stop_id": pd.Series(dtype=str), "system": pd.Series(dtype=np.int8)})
+
+    stops_gdf = read_stops(feed)
+    for code, name in enumerate(systems):
+        stops_gdf[name] = stops_gdf["stop_id"].isin(served.loc[served["system"] == code, "stop_id"])
+    return stops_gdf
+
+
+def stops_by_transport_system(feed, date=None, chunksize=default_chunksize):
+    """
+    Split the stops of a GTFS feed into low-capacity and high-capacity stops.
+
+    The keys are the transport systems of subset_result, e.g.
+    distance_to_closest(population, stops["low-capacity"], transport_system="low-capacity") or
+    distance_to_closest_sets(population, {name: (gdf, name) for name, gdf in stops.items()}).
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :param date: only consider trips running on this date, e.g. 20200915 (optional, all trips if None)
+    :type date: int
+    :param chunksize: number of stop_times rows read at once
+    :type chunksize: int
+    :return: stops served by each transport system
+    :rtype: dict of Geopandas.GeoDataFrame::POINT
+    """
+    stops_gdf = classify_stops(feed, date=date, chunksize=chunksize)
+    systems = ["low-capacity", "high-capacity"]
+    return {
+        name: stops_gdf.loc[stops_gdf[name], ["stop_id", "stop_name", "geometry"]].reset_index(drop=True)
+        for name in systems
+    }
+
+
+def active_services(feed, date):
+    """
+    Return the services running on a date according to calendar.txt and calendar_dates.txt.
+
+    :param feed: path of the GTFS feed (zip file or folder)
+    :type feed: str
+    :param date: date, e.g. 20200915
+    :type date: int
+    :return: service ids
+    :rtype: set
+    """
+    date = int(date)
+    weekday = datetime.strptime(str(date), "%Y%m%d").strftime("%A").lower()
+    services = set()
+    if _has_table(feed, "calendar.txt"):
+        calendar = _read_table(feed, "calendar.txt", dtype={"service_id": str})
+        running = (
+            (calendar["start_date"].astype(int) <= date)
+            & (calendar["end_date"].astype(int) >= date)
+            & (calendar[weekday].astype(int) == 1)
+        )
+        services.update(calendar.loc[running, "service_id"])
+    if _has_table(feed, "calendar_dates.txt"):
+        exceptions = _read_table(feed, "calendar_dates.txt", dtype={"service_id": str})
+        exceptions = exceptions[exceptions["date"].astype(int) == date]
+        # exception_type 1 adds, 2 removes the service on that date
+        services.update(exceptions.loc[exceptions["exception_type"].astype(int) == 1, "service_id"])
+        services.difference_update(exceptions.loc[exceptions["exception_type"].astype(int) == 2, "service_id"])
+    return services
+
+
+def served_stops(departures, start_time, end_time, minimum_frequency=None):
+    """
+    Select the stops served within a time slice.
+
+    :param departures: departures (see read_departures)
+    :type departures: pandas.DataFrame
+    :param start_time: start of the time slice (seconds of the service day or "HH:MM[:SS]")
+    :type start_time: int or str
+    :param end_time: end of the time slice, exclusive (seconds of the service day or "HH:MM[:SS]")
+    :type end_time: int or str
+    :param minimum_frequency: minimum number of departures per hour (optional, one departure within the slice
+        suffices if None)
+    :type minimum_frequency: float
+    :return: ids of the served stops
+    :rtype: pandas.Index
+    """
+    start_time, end_time = _seconds(start_time), _seconds(end_time)
+    within = departures["departure"].between(start_time, end_time, inclusive="left")
+    counts = departures.loc[within, "stop_id"].value_counts()
+    # categorical stop ids are counted for every stop, also those without departures
+    counts = counts[counts > 0]
+    if minimum_frequency is not None:
+        counts = counts[counts >= minimum_frequency * (end_time - start_time) / 3600]
+    return counts.index.astype(object)
+
+
+def parse_time(times):
+    """
+    Convert GTFS times to seconds after the start of the service day.
+
+    GTFS times may exceed 24:00:00 for trips running past midnight.
+
+    :param times: times in the format "H:MM:SS"
+    :type times: pandas.Series
+    :return: seconds (-1 for missing or malformed times)
+    :rtype: numpy.ndarray
+    """
+    # pad to "HH:MM:SS" and read the digits from the raw bytes instead of parsing every string
+    raw = times.fillna("").str.strip().str.zfill(8).to_numpy(dtype="S8")
+    digits = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 8).astype(np.int32) - ord("0")
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 3] * 10 + digits[:, 4]
+    seconds = hours * 3600 + minutes * 60 + digits[:, 6] * 10 + digits[:, 7]
+    colon = ord(":") - ord("0")
+    number = np.delete(digits, [2, 5], axis=1)
+    valid = (digits[:, 2] == colon) & (digits[:, 5] == colon) & ((number >= 0) & (number <= 9)).all(axis=1)
+    return np.where(valid, seconds, -1).astype(np.int32)
+
+
+def time_slice_label(start_time, end_time):
+    """
+    Name a time slice, e.g. "07:00-08:00".
+
+    :param start_time: start of the time slice (seconds of the service day or "HH:MM[:SS]")
+    :type start_time: int or str
+    :param end_time: end of the time slice (seconds of the service day or "HH:MM[:SS]")
+    :type end_time: int or str
+    :return: label
+    :rtype: str
+    """
+    return f"{_clock(start_time)}-{_clock(end_time)}"
+
+
+def _clock(time):
+    time = _seconds(time)
+    return f"{time // 3600:02d}:{time % 3600 // 60:02d}"
+
+
+def _seconds(time):
+    if isinstance(time, str):
+        parts = [int(part) for part in time.split(":")]
+        return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) > 2 else 0)
+    return int(time)
+
+
+def _has_table(feed, name):
+    if os.path.isdir(feed):
+        return os.path.exists(os.path.join(feed, name))
+    with zipfile.ZipFile(feed) as archive:
+        return name in archive.namelist()
+
+
+@contextmanager
+def _open(feed, name):
+    # feeds are either unpacked folders or zip files
+    if os.path.isdir(feed):
+        with open(os.path.join(feed, name), "rb") as f:
+            yield f
+    else:
+        with zipfile.ZipFile(feed) as archive, archive.open(name) as f:
+            yield f
+
+
+def _read_table(feed, name, usecols=None, dtype=None):
+    with _open(feed, name) as f:
+        table = pd.read_csv(f, usecols=usecols, dtype=dtype, encoding="utf-8-sig", skipinitialspace=True)
+    table.columns = table.columns.str.strip()
+    return table
+
+
+def _iter_table(feed, name, usecols=None, dtype=None, chunksize=default_chunksize):
+    with _open(feed, name) as f:
+        for table in pd.read_csv(
+            f, usecols=usecols, dtype=dtype, encoding="utf-8-sig", skipinitialspace=True, chunksize=chunksize
+        ):
+            table.columns = table.columns.str.strip()
+            yield table
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyproj
+import shapely
+
+import ptac.routing as routing
+
+"""Compact array representation of prepared street networks"""
+
+"""
+@name : network.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# bit of every mode column of settings.streettypes in PtacNetwork.modes
+mode_bits = {"mode_walk": 1, "mode_bike": 2, "mode_mit": 4}
+
+magic = b"PTACNET\x00"
+version = 1
+# arrays start at multiples of the alignment, so that memory-mapped views are aligned
+alignment = 64
+
+
+class PtacNetwork:
+    """
+    Prepared street network stored in contiguous numpy arrays.
+
+    Nodes are numbered densely from 0, their osm ids and coordinates are kept in node_id, node_x and node_y.
+    Edges are straight lines between their end nodes, no shapely geometries are held. The mode columns of
+    settings.streettypes are packed into one bit mask per edge (see mode_bits). The outgoing edges of every
+    node are stored as CSR adjacency: the edges leaving node i are adjacency[indptr[i]:indptr[i + 1]].
+
+    The network is written to a single file, which can be memory-mapped read-only, so that several worker
+    processes share one copy of the network.
+
+    A directed network holds one edge per direction of travel, like the osm networks, so modes following the
+    direction of the edges do not use one-way streets backwards. Other networks are routed in both directions.
+
+    :param node_id: osm id of every node
+    :type node_id: numpy.ndarray
+    :param node_x: x coordinate of every node
+    :type node_x: numpy.ndarray
+    :param node_y: y coordinate of every node
+    :type node_y: numpy.ndarray
+    :param edge_id: id of every edge in the prepared network
+    :type edge_id: numpy.ndarray
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param length: length of every edge in meters
+    :type length: numpy.ndarray
+    :param modes: mode bit mask of every edge
+    :type modes: numpy.ndarray
+    :param vmax: maximum speed of every edge in km/h
+    :type vmax: numpy.ndarray
+    :param crs: coordinate reference system of the node coordinates
+    :type crs: pyproj.CRS
+    :param indptr: CSR row pointers (optional, built if None)
+    :type indptr: numpy.ndarray
+    :param adjacency: CSR edge indices (optional, built if None)
+    :type adjacency: numpy.ndarray
+    :param directed: If True, every edge may only be travelled in its direction by modes following the direction
+    :type directed: bool
+    """
+
+    def __init__(
+        self,
+        node_id,
+        node_x,
+        node_y,
+        edge_id,
+        edge_from,
+        edge_to,
+        length,
+        modes,
+        vmax,
+        crs,
+        indptr=None,
+        adjacency=None,
+        directed=True,
+    ):
+        """Wrap the network arrays and build the CSR adjacency if it is not given."""
+        self.node_id = node_id
+        self.node_x = node_x
+        self.node_y = node_y
+        self.edge_id = edge_id
+        self.edge_from = edge_from
+        self.edge_to = edge_to
+        self.length = length
+        self.modes = modes
+        self.vmax = vmax
+        self.crs = None if crs is None else pyproj.CRS(crs)
+        if indptr is None or adjacency is None:
+            adjacency = np.argsort(edge_from, kind="stable").astype(np.int32)
+            indptr = np.zeros(len(node_id) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(edge_from, minlength=len(node_id)), out=indptr[1:])
+        self.indptr = indptr
+        self.adjacency = adjacency
+        self.directed = bool(directed)
+
+    @property
+    def number_of_nodes(self):
+        """Return the number of nodes."""
+        return len(self.node_id)
+
+    @property
+    def number_of_edges(self):
+        """Return the number of edges."""
+        return len(self.edge_from)
+
+    @classmethod
+    def from_gdf(cls, network_gdf):
+        """
+        Convert a prepared street network.
+
+        Node coordinates are taken from the end points of the edge geometries. The network is directed if the
+        edges have a oneway column, like the osm networks.
+
+        :param network_gdf: Street network including geometries (see accessibility._prepare_edges)
+        :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+        :return: compact network
+        :rtype: PtacNetwork
+        """
+        node_id, node_index = np.unique(
+            np.concatenate([network_gdf["fromnode"].to_numpy(), network_gdf["tonode"].to_numpy()]),
+            return_inverse=True,
+        )
+        geometries = network_gdf.geometry.to_numpy()
+        coordinates = np.concatenate(
+            [
+                shapely.get_coordinates(shapely.get_point(geometries, 0)),
+                shapely.get_coordinates(shapely.get_point(geometries, -1)),
+            ]
+        )
+        node_x = np.empty(len(node_id))
+        node_y = np.empty(len(node_id))
+        node_x[node_index], node_y[node_index] = coordinates[:, 0], coordinates[:, 1]
+
+        edge_from, edge_to = np.split(node_index, 2)
+        modes = np.zeros(len(network_gdf), dtype=np.uint8)
+        for column, bit in mode_bits.items():
+            modes[network_gdf[column].eq(True).to_numpy()] |= bit
+        return cls(
+            node_id=node_id.astype(np.int64),
+            node_x=node_x,
+            node_y=node_y,
+            edge_id=network_gdf["index"].to_numpy(dtype=np.int64),
+            edge_from=edge_from.astype(np.int32),
+            edge_to=edge_to.astype(np.int32),
+            length=network_gdf["length"].to_numpy(dtype=np.float32),
+            modes=modes,
+            vmax=network_gdf["vmax"].to_numpy(dtype=np.float32),
+            crs=network_gdf.crs,
+            directed="oneway" in network_gdf.columns,
+        )
+
+    def mode_mask(self, mode="mode_walk"):
+        """
+        Return which edges may be used by a mode.
+
+        :param mode: Mode column of settings.streettypes
+        :type mode: str
+        :return: one flag per edge
+        :rtype: numpy.ndarray
+        """
+        return (self.modes & mode_bits[mode]) != 0
+
+    def graph(self, mode="mode_walk"):
+        """
+        Build the adjacency matrix of the edges usable by a mode.
+
+        :param mode: Mode column of settings.streettypes
+        :type mode: str
+        :return: adjacency matrix with edge lengths as weights
+        :rtype: scipy.sparse.csr_matrix
+        """
+        usable = self.mode_mask(mode)
+        return routing.build_graph(
+            self.edge_from[usable], self.edge_to[usable], self.length[usable], self.number_of_nodes
+        )
+
+    def geometries(self, edges=None):
+        """
+        Build straight line geometries of edges.
+
+        :param edges: indices of the edges (optional, all edges if None)
+        :type edges: numpy.ndarray
+        :return: one line per edge
+        :rtype: numpy.ndarray
+        """
+        start = self.edge_from if edges is None else self.edge_from[edges]
+        end = self.edge_to if edges is None else self.edge_to[edges]
+        coordinates = np.stack(
+            [
+                np.stack([self.node_x[start], self.node_y[start]], axis=1),
+                np.stack([self.node_x[end], self.node_y[end]], axis=1),
+            ],
+            axis=1,
+        )
+        return shapely.linestrings(coordinates)
+
+    def to_frame(self):
+        """
+        Return the edges in the format prepare_network writes for UrMoAC.
+
+        :return: edges with osm node ids, mode flags, vmax, length and bounds
+        :rtype: pandas.DataFrame
+        """
+        x = np.stack([self.node_x[self.edge_from], self.node_x[self.edge_to]])
+        y = np.stack([self.node_y[self.edge_from], self.node_y[self.edge_to]])
+        frame = pd.DataFrame(
+            {
+                "index": self.edge_id,
+                "fromnode": self.node_id[self.edge_from],
+                "tonode": self.node_id[self.edge_to],
+            }
+        )
+        for column in mode_bits:
+            frame[column] = self.mode_mask(column)
+        frame["vmax"] = self.vmax
+        frame["length"] = self.length
+        frame["minx"], frame["miny"], frame["maxx"], frame["maxy"] = x.min(0), y.min(0), x.max(0), y.max(0)
+        return frame
+
+    def to_gdf(self):
+        """
+        Convert back into a prepared street network with straight line geometries.
+
+        :return: Street network including geometries (see accessibility._prepare_edges)
+        :rtype: Geopandas.GeoDataFrame::LINESTRING
+        """
+        frame = self.to_frame().drop(columns=["minx", "miny", "maxx", "maxy"])
+        if self.directed:
+            frame["oneway"] = routing.reverse_edges(self.edge_from, self.edge_to, self.length) < 0
+        return gpd.GeoDataFrame(frame, geometry=self.geometries(), crs=self.crs)
+
+    def save(self, path):
+        """
+        Write the network to a single file.
+
+        The file starts with a JSON header describing the arrays, followed by the raw little-endian arrays.
+
+        :param path: path of the network file
+        :type path: str
+        """
+        arrays = self._arrays()
+        header = {
+            "version": version,
+            "crs": None if self.crs is None else self.crs.to_wkt(),
+            "directed": self.directed,
+            "arrays": {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // alignment) * alignment
+        encoded = json.dumps(header).encode("utf-8")
+        # the arrays follow the aligned header
+        start = -(-(len(magic) + 8 + len(encoded)) // alignment) * alignment
+        with open(path, "wb") as f:
+            f.write(magic)
+            f.write(np.uint64(len(encoded)).tobytes())
+            f.write(encoded)
+            for name, array in arrays.items():
+                f.seek(start + header["arrays"][name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(start + offset)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Read a network written by save.
+
+        :param path: path of the network file
+        :type path: str
+        :param mmap: If True, the arrays are read-only memory-mapped views of the file, otherwise they are read
+            into memory
+        :type mmap: bool
+        :return: compact network
+        :rtype: PtacNetwork
+        """
+        with open(path, "rb") as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError(f"{path} is not a ptac network file")
+            length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(length).decode("utf-8"))
+        if header["version"] != version:
+            raise ValueError(f"unsupported network file version {header['version']}")
+        start = -(-(len(magic) + 8 + length) // alignment) * alignment
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            shape = tuple(spec["shape"])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=start + spec["offset"], shape=shape)
+            else:
+                arrays[name] = np.fromfile(
+                    path, dtype=dtype, count=int(np.prod(shape)), offset=start + spec["offset"]
+                ).reshape(shape)
+        # files written before the flag was stored hold osm networks
+        return cls(crs=header["crs"], directed=header.get("directed", True), **arrays)
+
+    def _arrays(self):
+        dtypes = {
+            "node_id": "<i8",
+            "node_x": "<f8",
+            "node_y": "<f8",
+            "edge_id": "<i8",
+            "edge_from": "<i4",
+            "edge_to": "<i4",
+            "length": "<f4",
+            "modes": "u1",
+            "vmax": "<f4",
+            "indptr": "<i8",
+            "adjacency": "<i4",
+        }
+        return {name: np.ascontiguousarray(getattr(self, name), dtype=dtype) for name, dtype in dtypes.items()}
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import ptac.accessibility as accessibility
+import ptac.network as network
+import ptac.util as util
+
+"""Aggregates population points into fewer origins before routing"""
+
+"""
+@name : origins.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+
+class AggregatedOrigins:
+    """
+    Population points merged into fewer origins.
+
+    The aggregated origins are routed instead of the points, e.g. with accessibility.distance_to_closest, and the
+    distances are broadcast back to the points. Every point keeps the origin it was merged into, the distance
+    added to the distance of that origin and a bound of the error of the broadcast distance.
+
+    :param origins: Aggregated origins with the summed population
+    :type origins: Geopandas.GeoDataFrame::POINT
+    :param point_origin: position of the origin of every population point (-1 if it was not merged)
+    :type point_origin: numpy.ndarray
+    :param offset: distance added to the distance of the origin for every population point
+    :type offset: numpy.ndarray
+    :param error: bound of the difference between broadcast and routed distance of every population point
+    :type error: numpy.ndarray
+    """
+
+    def __init__(self, origins, point_origin, offset, error):
+        """Keep the aggregated origins and the mapping of the population points."""
+        self.origins = origins
+        self.point_origin = point_origin
+        self.offset = offset
+        self.error = error
+
+    @property
+    def reduction(self):
+        """
+        Return how many population points there are per origin.
+
+        :return: number of population points divided by number of origins
+        :rtype: float
+        """
+        return len(self.point_origin) / max(1, len(self.origins))
+
+    def broadcast(self, accessibility_output):
+        """
+        Return the distance of every population point from the distances of the origins.
+
+        :param accessibility_output: Routing result of the origins, either distance_to_closest output (with the
+            columns "o_id" and "distance_pt") or one distance per origin
+        :type accessibility_output: Geopandas.GeoDataFrame::POINT or numpy.ndarray
+        :return: distance of every population point (inf if its origin was not reached) and its error bound
+        :rtype: pandas.DataFrame
+        """
+        if isinstance(accessibility_output, pd.DataFrame):
+            accessibility_output = accessibility.origin_distances(accessibility_output, len(self.origins))
+        origin_distance = np.append(np.asarray(accessibility_output, dtype=np.float64), np.inf)
+        # points that were not merged (-1) look up the appended inf
+        distance = origin_distance[self.point_origin] + self.offset
+        return pd.DataFrame({"distance_pt": distance, "distance_error": self.error})
+
+
+def aggregate_by_node(start_geometries, network_gdf, population_column="pop"):
+    """
+    Merge population points snapped onto the network near the same node.
+
+    Every point is snapped onto its closest walkable edge and merged into the closer end node of that edge. The
+    broadcast distance is the distance of the node plus the way from the point along the edge to the node. It is
+    the length of a real path, so it never underestimates the routed distance, and the routed distance is at
+    least the distance of the node minus that way, so the error is at most twice the way along the edge.
+
+    :param start_geometries: Population points
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Network dataset to snap onto
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param population_column: The name of the population column
+    :type population_column: str
+    :return: aggregated origins, one per node, in the crs of the routing
+    :rtype: AggregatedOrigins
+    """
+    crs = accessibility._crs(start_geometries, network_gdf)
+    start_geometries = util.project_gdf(start_geometries, to_crs=crs)
+    if isinstance(network_gdf, network.PtacNetwork):
+        network_index = accessibility.NetworkIndex(network_gdf)
+    else:
+        network_index = accessibility.NetworkIndex(
+            util.project_gdf(accessibility._prepare_edges(network_gdf), to_crs=crs)
+        )
+    edge, offset, _ = network_index.snap(start_geometries)
+    snapped = np.flatnonzero(edge >= 0)
+    edge, offset = edge[snapped], offset[snapped]
+    to_end = network_index.edge_length[edge] - offset
+    at_start = offset <= to_end
+    node = np.where(at_start, network_index.edge_from[edge], network_index.edge_to[edge])
+    coordinates = np.where(
+        at_start[:, None],
+        shapely.get_coordinates(shapely.get_point(network_index.geometries[edge], 0)),
+        shapely.get_coordinates(shapely.get_point(network_index.geometries[edge], -1)),
+    )
+
+    nodes, first, origin = np.unique(node, return_index=True, return_inverse=True)
+    population = start_geometries[population_column].to_numpy(dtype=np.float64)
+    origins = gpd.GeoDataFrame(
+        {
+            "node": network_index.node_id[nodes],
+            population_column: np.bincount(origin, weights=population[snapped], minlength=len(nodes)),
+        },
+        geometry=gpd.points_from_xy(coordinates[first, 0], coordinates[first, 1]),
+        crs=crs,
+    )
+    point_origin = np.full(len(start_geometries), -1, dtype=np.int64)
+    point_origin[snapped] = origin
+    point_offset = np.zeros(len(start_geometries))
+    point_offset[snapped] = np.minimum(offset, to_end)
+    return AggregatedOrigins(origins, point_origin, point_offset, 2 * point_offset)
+
+
+def aggregate_by_grid(start_geometries, cell_size, population_column="pop"):
+    """
+    Merge population points within the same cell of a square grid.
+
+    Every cell becomes one origin at the population-weighted centre of its points. The broadcast distance is the
+    distance of that origin, the reported error is the straight line distance between point and origin. It is a
+    measure of the displacement, not a strict bound: the network distance between both may be longer.
+
+    :param start_geometries: Population points
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param cell_size: Edge length of the grid cells in meters
+    :type cell_size: float
+    :param population_column: The name of the population column
+    :type population_column: str
+    :return: aggregated origins, one per populated cell, in the UTM zone of the points
+    :rtype: AggregatedOrigins
+    """
+    start_geometries = util.project_gdf(start_geometries)
+    centroids = start_geometries.geometry.centroid
+    x, y = centroids.x.to_numpy(), centroids.y.to_numpy()
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    cell = np.stack([np.floor(x[valid] / cell_size), np.floor(y[valid] / cell_size)], axis=1).astype(np.int64)
+    cells, origin = np.unique(cell, axis=0, return_inverse=True)
+    origin = origin.ravel()
+
+    population = start_geometries[population_column].to_numpy(dtype=np.float64)[valid]
+    total = np.bincount(origin, weights=population, minlength=len(cells))
+    # cells without population are placed at the mean of their points
+    weights = np.where(total[origin] > 0, population, 1.0)
+    weight_sum = np.bincount(origin, weights=weights, minlength=len(cells))
+    origin_x = np.bincount(origin, weights=weights * x[valid], minlength=len(cells)) / weight_sum
+    origin_y = np.bincount(origin, weights=weights * y[valid], minlength=len(cells)) / weight_sum
+    origins = gpd.GeoDataFrame(
+        {population_column: total},
+        geometry=gpd.points_from_xy(origin_x, origin_y),
+        crs=start_geometries.crs,
+    )
+    point_origin = np.full(len(start_geometries), -1, dtype=np.int64)
+    point_origin[valid] = origin
+    error = np.full(len(start_geometries), np.nan)
+    error[valid] = np.hypot(x[valid] - origin_x[origin], y[valid] - origin_y[origin])
+    return AggregatedOrigins(origins, point_origin, np.zeros(len(start_geometries)), error)
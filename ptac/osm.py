@@ -1,7 +1,15 @@
 #!/usr/bin/env python3
 # coding:utf-8
 
+from array import array
+
+import geopandas as gpd
+import numpy as np
 import osmnx as ox
+import pandas as pd
+import shapely
+
+import ptac.settings as settings
 
 """Downloads pois, footprints and graphs from OSM"""
 
@@ -13,10 +21,19 @@ import osmnx as ox
 """
 
 
-def get_network(polygon, network_type="walk", custom_filter=None, simplify=False, verbose=0):
+# mode column of settings.streettypes that decides which highways belong to a network type
+network_type_modes = {"walk": "mode_walk", "bike": "mode_bike", "drive": "mode_mit"}
+# mean earth radius used by osmnx
+earth_radius = 6371009  # meters
+
+
+def get_network(polygon, network_type="walk", custom_filter=None, simplify=False, verbose=0, pbf_file=None):
     """
     Download street network from osm via osmnx.
 
+    If a local osm extract is given (or set in settings.pbf_file), the network is read from that file
+    instead (see get_network_from_pbf).
+
     :param polygon: boundary of the area from which to download the network (in WGS84)
     :type polygon: Geopandas.GeoDataFrame::POLYGON
     :param network_type: can be "all_private", "all", "bike", "drive", "drive_service",
@@ -26,14 +43,20 @@ def get_network(polygon, network_type="walk", custom_filter=None, simplify=False
     :type custom_filter: str
     :param verbose: Degree of verbosity (the higher, the more)
     :type verbose: int
+    :param pbf_file: path of a local osm extract (.osm.pbf) to read instead of downloading (optional)
+    :type pbf_file: str
 
     :return network_gdf: OSM city network
     :rtype network_gdf: GeoPandas.GeoDataFrame::LineString
 
     """
+    if pbf_file is None:
+        pbf_file = settings.pbf_file
+    if pbf_file is not None:
+        return get_network_from_pbf(pbf_file, polygon=polygon, network_type=network_type, verbose=verbose)
     if verbose > 0:
         print("downloading street network. This may take some time for bigger areas\n")
-    bounds = polygon.unary_union.bounds
+    bounds = polygon.total_bounds
     network_gdf = ox.graph_to_gdfs(
         ox.graph_from_bbox(
             north=bounds[3],
@@ -46,3 +69,181 @@ def get_network(polygon, network_type="walk", custom_filter=None, simplify=False
         )
     )[1]
     return network_gdf
+
+
+def get_network_from_pbf(path, polygon=None, network_type="walk", geometry=True, locations="flex_mem", verbose=0):
+    """
+    Read a street network from a local osm extract.
+
+    The ways of the file are streamed through pyosmium and filtered on the highway types of
+    settings.streettypes that are open for the network type. Every pair of consecutive way nodes becomes one
+    edge, as in the unsimplified networks of get_network, but no networkx graph is built. Every direction of
+    travel becomes an edge of its own. Pedestrians may walk both directions of every way, bikes and cars
+    follow the oneway tag (see _oneway). The columns mode_walk, mode_bike and mode_mit tell which mode may
+    travel an edge in its direction, the street type may restrict the modes further (see
+    accessibility._prepare_edges). The oneway column marks edges without an edge in the opposite direction,
+    like in the networks of osmnx.
+
+    Node coordinates are kept in a pyosmium location index while the file is read. For country extracts,
+    a disk based index such as "sparse_file_array,/tmp/nodes.idx" keeps the memory bounded.
+
+    :param path: path of the osm extract (.osm.pbf, .osm or any other format pyosmium reads)
+    :type path: str
+    :param polygon: boundary of the area to keep, edges with an end node within its bounds are kept
+        (optional, in WGS84, the whole file is read if None)
+    :type polygon: Geopandas.GeoDataFrame::POLYGON
+    :param network_type: "walk", "bike", "drive" or "all" (all highway types of settings.streettypes)
+    :type network_type: str
+    :param geometry: If False, return the end node coordinates (x_u, y_u, x_v, y_v) instead of geometries
+    :type geometry: bool
+    :param locations: pyosmium node location index
+    :type locations: str
+    :param verbose: Degree of verbosity (the higher, the more)
+    :type verbose: int
+
+    :return network_gdf: OSM network in WGS84, indexed by u, v and key like the networks of get_network
+    :rtype network_gdf: GeoPandas.GeoDataFrame::LineString
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError(
+            "reading osm extracts requires pyosmium, install it with 'pip install osmium' or "
+            "'conda install -c conda-forge pyosmium'"
+        ) from None
+
+    streettypes = _street_types(network_type)
+    highways = list(streettypes.index)
+    highway_codes = {highway: code for code, highway in enumerate(highways)}
+    modes = list(network_type_modes.values())
+    network_modes = [network_type_modes[network_type]] if network_type in network_type_modes else modes
+
+    # one entry per way node
+    node_ref, node_x, node_y = array("q"), array("d"), array("d")
+    # one entry per way
+    way_id, way_size, way_highway = array("q"), array("q"), array("b")
+    way_oneway = {mode: array("b") for mode in modes}
+    way_maxspeed, way_lanes = [], []
+
+    if verbose > 0:
+        print(f"reading street network from {path}\n")
+    processor = (
+        osmium.FileProcessor(str(path))
+        .with_locations(locations)
+        .with_filter(osmium.filter.EntityFilter(osmium.osm.WAY))
+        .with_filter(osmium.filter.KeyFilter("highway"))
+    )
+    for way in processor:
+        tags = way.tags
+        code = highway_codes.get(tags.get("highway"))
+        if code is None or tags.get("area") == "yes" or len(way.nodes) < 2:
+            continue
+        for node in way.nodes:
+            node_ref.append(node.ref)
+            if node.location.valid():
+                node_x.append(node.lon)
+                node_y.append(node.lat)
+            else:
+                # node outside of the extract
+                node_x.append(np.nan)
+                node_y.append(np.nan)
+        way_id.append(way.id)
+        way_size.append(len(way.nodes))
+        way_highway.append(code)
+        for mode in modes:
+            way_oneway[mode].append(_oneway(tags, mode))
+        way_maxspeed.append(tags.get("maxspeed"))
+        way_lanes.append(tags.get("lanes"))
+
+    node_ref = np.frombuffer(node_ref, dtype=np.int64)
+    node_x = np.frombuffer(node_x, dtype=np.float64)
+    node_y = np.frombuffer(node_y, dtype=np.float64)
+    way_size = np.frombuffer(way_size, dtype=np.int64)
+    way_oneway = {mode: np.frombuffer(oneway, dtype=np.int8) for mode, oneway in way_oneway.items()}
+
+    # every way node except the last one of its way starts an edge
+    edge_way = np.repeat(np.arange(len(way_size)), way_size - 1)
+    start = np.ones(len(node_ref), dtype=bool)
+    start[np.cumsum(way_size) - 1] = False
+    first = np.flatnonzero(start)
+    second = first + 1
+    valid = ~(np.isnan(node_x[first]) | np.isnan(node_x[second]))
+    if polygon is not None:
+        west, south, east, north = polygon.total_bounds
+        inside = (node_x >= west) & (node_x <= east) & (node_y >= south) & (node_y <= north)
+        valid &= inside[first] | inside[second]
+    edge_way, first, second = edge_way[valid], first[valid], second[valid]
+
+    # directions of travel of every mode, an edge is kept if any mode of the network type may travel it
+    way_highway = np.frombuffer(way_highway, dtype=np.int8)
+    permitted = {mode: streettypes[mode].to_numpy(dtype=bool)[way_highway[edge_way]] for mode in modes}
+    mode_forward = {mode: permitted[mode] & (way_oneway[mode][edge_way] >= 0) for mode in modes}
+    mode_backward = {mode: permitted[mode] & (way_oneway[mode][edge_way] <= 0) for mode in modes}
+    forward = np.logical_or.reduce([mode_forward[mode] for mode in network_modes])
+    backward = np.logical_or.reduce([mode_backward[mode] for mode in network_modes])
+    edge_oneway = np.concatenate([~backward[forward], ~forward[backward]])
+    edge_modes = {mode: np.concatenate([mode_forward[mode][forward], mode_backward[mode][backward]]) for mode in modes}
+    edge_way = np.concatenate([edge_way[forward], edge_way[backward]])
+    u = np.concatenate([first[forward], second[backward]])
+    v = np.concatenate([second[forward], first[backward]])
+
+    edges = pd.DataFrame(
+        {
+            "u": node_ref[u],
+            "v": node_ref[v],
+            "osmid": np.frombuffer(way_id, dtype=np.int64)[edge_way],
+            "highway": pd.Categorical.from_codes(way_highway[edge_way], highways),
+            "maxspeed": np.asarray(way_maxspeed, dtype=object)[edge_way],
+            "lanes": np.asarray(way_lanes, dtype=object)[edge_way],
+            "oneway": edge_oneway,
+            "length": _great_circle(node_x[u], node_y[u], node_x[v], node_y[v]),
+            **edge_modes,
+        }
+    )
+    edges["highway"] = edges["highway"].astype(str)
+    # parallel edges between the same nodes are numbered like in osmnx
+    edges["key"] = edges.groupby(["u", "v"]).cumcount()
+    edges = edges.set_index(["u", "v", "key"])
+    if not geometry:
+        edges["x_u"], edges["y_u"], edges["x_v"], edges["y_v"] = node_x[u], node_y[u], node_x[v], node_y[v]
+        return edges
+    coordinates = np.stack([np.stack([node_x[u], node_y[u]], axis=1), np.stack([node_x[v], node_y[v]], axis=1)], axis=1)
+    return gpd.GeoDataFrame(edges, geometry=shapely.linestrings(coordinates), crs=settings.default_crs)
+
+
+def _street_types(network_type):
+    # rows of settings.streettypes, indexed by highway value, that are open for the network type
+    streettypes = settings.streettypes
+    if "street_type" in streettypes.columns:
+        streettypes = streettypes.set_index("street_type")
+    mode = network_type_modes.get(network_type)
+    if mode is not None:
+        streettypes = streettypes[streettypes[mode].astype(bool)]
+    return streettypes
+
+
+def _oneway(tags, mode):
+    # directions a mode may travel a way, 1: forward only, -1: backward only, 0: both directions
+    if mode == "mode_walk":
+        return 0
+    value = tags.get("oneway")
+    if mode == "mode_bike":
+        # oneway:bicycle=no opens one-way streets for bikes in both directions
+        value = tags.get("oneway:bicycle", value)
+    if value in ("yes", "true", "1"):
+        return 1
+    if value in ("-1", "reverse"):
+        return -1
+    if value is None and (
+        tags.get("junction") in ("roundabout", "circular") or tags.get("highway") in ("motorway", "motorway_link")
+    ):
+        # roundabouts and motorways are one-way without a oneway tag
+        return 1
+    return 0
+
+
+def _great_circle(x1, y1, x2, y2):
+    # haversine distance in meters between wgs84 coordinates
+    x1, y1, x2, y2 = np.radians(x1), np.radians(y1), np.radians(x2), np.radians(y2)
+    h = np.sin((y2 - y1) / 2) ** 2 + np.cos(y1) * np.cos(y2) * np.sin((x2 - x1) / 2) ** 2
+    return 2 * earth_radius * np.arcsin(np.sqrt(np.clip(h, 0, 1)))
@@ -5,6 +5,8 @@ import geopandas as gpd
 import numpy as np
 import pandas as pd
 import rasterio
+import rasterio.windows
+import shapely
 
 """Converts population raster dataset to population points"""
 
@@ -17,7 +19,7 @@ Deutsches Zentrum fuer Luft- und Raumfahrt
 """
 
 
-def raster_to_points(path, band=1, epsg=4326):
+def raster_to_points(path, band=1, epsg=4326, clip=None):
     """
     Convert Raster to Point.
 
@@ -25,35 +27,110 @@ def raster_to_points(path, band=1, epsg=4326):
     :type path: str
     :param band: Band of dataset
     :type band: int
+    :param clip: Area to convert (optional, see iter_raster_points)
+    :type clip: Geopandas.GeoDataFrame::POLYGON or shapely.Polygon
     :return: Point GeoDataFrame including Raster values of specific band
     :rtype: GeoPandas.GeoDataFrame:: Point
     """
-    with rasterio.open(path) as src:
-        # create 1D coordinate arrays (coordinates of the pixel center)
-        xmin, ymax = np.around(src.xy(0.00, 0.00), 9)  # src.xy(0, 0)
-        xmax, ymin = np.around(
-            src.xy(src.height - 1, src.width - 1), 9
-        )  # src.xy(src.width-1, src.height-1)
-        x = np.linspace(xmin, xmax, src.width)
-        y = np.linspace(
-            ymax, ymin, src.height
-        )  # max -> min so coords are top -> bottom
-
-        # create 2D arrays
-        xs, ys = np.meshgrid(x, y)
-        pop = src.read(1)
-
-        # Apply NoData mask
-        mask = src.read_masks(1) > 0
-        xs, ys, pop = xs[mask], ys[mask], pop[mask]
-
-    data = {
-        "X": pd.Series(xs.ravel()),
-        "Y": pd.Series(ys.ravel()),
-        "pop": pd.Series(pop.ravel()),
-    }
-    df = pd.DataFrame(data=data)
-    df = df[df["pop"] > 0]
+    chunks = list(iter_raster_points(path, band=band, clip=clip))
+    if chunks:
+        xs, ys, pop = (np.concatenate(values) for values in zip(*chunks))
+    else:
+        xs, ys, pop = np.empty(0), np.empty(0), np.empty(0, dtype=np.float32)
+
+    df = pd.DataFrame(data={"X": xs, "Y": ys, "pop": pop})
     geometry = gpd.points_from_xy(df.X, df.Y)
     geo_df = gpd.GeoDataFrame(df, crs=f"EPSG:{epsg}", geometry=geometry)
     return geo_df
+
+
+def iter_raster_points(path, band=1, clip=None):
+    """
+    Iterate over the populated cells of a raster block by block.
+
+    Only one block window is held in memory at a time. Pixel centre coordinates are computed from the affine
+    transform of the window for cells with a value above zero only. If an area to clip is given, windows
+    outside of its bounds are not read at all and cells outside of it are skipped.
+
+    :param path: Path to raster file. (Tested with GeoTIF)
+    :type path: str
+    :param band: Band of dataset
+    :type band: int
+    :param clip: Area to convert (optional). Shapely geometries must be given in the crs of the raster
+    :type clip: Geopandas.GeoDataFrame::POLYGON or shapely.Polygon
+    :return: x and y coordinates (float64) and values (float32) of the cells of one window per iteration
+    :rtype: generator
+    """
+    with rasterio.open(path) as src:
+        if isinstance(clip, (gpd.GeoDataFrame, gpd.GeoSeries)):
+            if clip.crs is not None:
+                clip = clip.to_crs(src.crs)
+            clip = shapely.union_all(clip.geometry.to_numpy())
+        if clip is not None:
+            shapely.prepare(clip)
+            clip_window = rasterio.windows.from_bounds(*clip.bounds, transform=src.transform)
+
+        for _, window in src.block_windows(band):
+            if clip is not None and not _intersects(window, clip_window):
+                continue
+            pop = src.read(band, window=window)
+            # Apply NoData mask
+            valid = (src.read_masks(band, window=window) > 0) & (pop > 0)
+            rows, cols = np.nonzero(valid)
+            if len(rows) == 0:
+                continue
+            transform = src.window_transform(window)
+            xs = transform.c + (cols + 0.5) * transform.a + (rows + 0.5) * transform.b
+            ys = transform.f + (cols + 0.5) * transform.d + (rows + 0.5) * transform.e
+            pop = pop[rows, cols].astype(np.float32)
+            if clip is not None:
+                inside = shapely.contains_xy(clip, xs, ys)
+                xs, ys, pop = xs[inside], ys[inside], pop[inside]
+            if len(pop) > 0:
+                yield xs, ys, pop
+
+
+def zonal_sum(path, zones, band=1, clip=None):
+    """
+    Sum up the population of a raster within zones, window by window.
+
+    A cell belongs to a zone if its centre lies within it, like the points of raster_to_points. Zones may
+    overlap. Only one block window of the raster is held in memory at a time.
+
+    :param path: Path to raster file. (Tested with GeoTIF)
+    :type path: str
+    :param zones: Zones to sum up the population of, e.g. dissolved catchments of stops
+    :type zones: Geopandas.GeoDataFrame::POLYGON or Geopandas.GeoSeries::POLYGON
+    :param band: Band of dataset
+    :type band: int
+    :param clip: Area to sum up (optional, see iter_raster_points)
+    :type clip: Geopandas.GeoDataFrame::POLYGON or shapely.Polygon
+    :return sums, total: population within every zone (indexed like the zones) and total population
+    :rtype sums, total: pandas.Series, float
+    """
+    with rasterio.open(path) as src:
+        raster_crs = src.crs
+    geometries = zones.geometry
+    if geometries.crs is not None and raster_crs is not None:
+        geometries = geometries.to_crs(raster_crs)
+    geometries = geometries.to_numpy()
+    shapely.prepare(geometries)
+    tree = shapely.STRtree(geometries)
+
+    sums = np.zeros(len(geometries))
+    total = 0.0
+    for xs, ys, pop in iter_raster_points(path, band=band, clip=clip):
+        total += float(pop.sum(dtype=np.float64))
+        window = shapely.box(xs.min(), ys.min(), xs.max(), ys.max())
+        for zone in tree.query(window, predicate="intersects"):
+            sums[zone] += float(pop[shapely.contains_xy(geometries[zone], xs, ys)].sum(dtype=np.float64))
+    return pd.Series(sums, index=zones.index), total
+
+
+def _intersects(window, other):
+    return (
+        window.col_off < other.col_off + other.width
+        and other.col_off < window.col_off + window.width
+        and window.row_off < other.row_off + other.height
+        and other.row_off < window.row_off + window.height
+    )
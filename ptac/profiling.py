@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import json
+import sys
+import time
+import timeit
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+"""Records wall time, memory and row counts of the stages of the accessibility pipeline"""
+
+"""
+@name : profiling.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+
+class Profiler:
+    """
+    Collect one record per pipeline stage.
+
+    Every record holds the stage name, its wall time in seconds, the peak resident set size of the python
+    process and of its finished child processes (e.g. UrMoAC) in bytes at the end of the stage, and the
+    number of rows the stage processed. Peak values are high-water marks of the whole process, so they only
+    grow from stage to stage. They are None on platforms without the resource module.
+
+    :param path: JSON lines file every record is appended to (optional)
+    :type path: str
+    :param callback: Function called with every finished record (optional)
+    :type callback: callable
+    """
+
+    def __init__(self, path=None, callback=None):
+        """Start without any record."""
+        self.path = path
+        self.callback = callback
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Measure a stage of the pipeline.
+
+        The yielded record can be updated within the stage, e.g. to set the number of rows once it is known.
+
+        :param name: name of the stage
+        :type name: str
+        :param rows: number of rows processed by the stage (optional)
+        :type rows: int
+        :return: record of the stage
+        :rtype: dict
+        """
+        record = {"stage": name, "rows": rows, "started": time.time()}
+        start = timeit.default_timer()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = timeit.default_timer() - start
+            record["peak_rss"] = peak_rss()
+            record["peak_rss_children"] = peak_rss(children=True)
+            self.records.append(record)
+            if self.path is not None:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            if self.callback is not None:
+                self.callback(record)
+
+    def to_frame(self):
+        """
+        Return all records.
+
+        :return: one row per stage
+        :rtype: pandas.DataFrame
+        """
+        return pd.DataFrame(
+            self.records, columns=["stage", "rows", "started", "wall_time", "peak_rss", "peak_rss_children"]
+        )
+
+
+def peak_rss(children=False):
+    """
+    Return the peak resident set size of the current process.
+
+    :param children: If True, return the peak of the finished child processes instead
+    :type children: bool
+    :return: peak resident set size in bytes (None if the resource module is not available)
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in kilobytes on linux and in bytes on macos
+    return peak if sys.platform == "darwin" else peak * 1024
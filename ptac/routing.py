@@ -0,0 +1,763 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy.sparse.csgraph import dijkstra
+
+"""In-process shortest path computation on prepared street networks."""
+
+"""
+@name : routing.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# bytes of reached nodes destinations_within holds at a time
+default_chunk_memory = 256 * 1024**2
+
+
+def build_graph(fromnode, tonode, length, number_of_nodes):
+    """
+    Build a sparse CSR adjacency matrix from edge arrays.
+
+    Parallel edges between the same pair of nodes are reduced to the shortest one.
+
+    :param fromnode: dense index of the start node of every edge
+    :type fromnode: numpy.ndarray
+    :param tonode: dense index of the end node of every edge
+    :type tonode: numpy.ndarray
+    :param length: length of every edge
+    :type length: numpy.ndarray
+    :param number_of_nodes: number of nodes in the graph
+    :type number_of_nodes: int
+    :return graph: adjacency matrix with edge lengths as weights
+    :rtype graph: scipy.sparse.csr_matrix
+    """
+    fromnode = np.asarray(fromnode, dtype=np.int64)
+    tonode = np.asarray(tonode, dtype=np.int64)
+    length = np.asarray(length, dtype=np.float64)
+    # keep the shortest of parallel edges, csr construction would sum them up
+    order = np.lexsort((length, tonode, fromnode))
+    fromnode, tonode, length = fromnode[order], tonode[order], length[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (fromnode[1:] != fromnode[:-1]) | (tonode[1:] != tonode[:-1])
+    return sparse.csr_matrix(
+        (length[first], (fromnode[first], tonode[first])), shape=(number_of_nodes, number_of_nodes)
+    )
+
+
+def nearest_destination(
+    edge_from, edge_to, edge_length, origin_edge, origin_offset, destination_edge, destination_offset, limit=np.inf
+):
+    """
+    Compute the network distance from every origin to its closest destination.
+
+    Origins and destinations are given as positions on edges (edge index and offset from the start
+    node of the edge). Every destination is added to the graph as a virtual node connected to both
+    ends of its edge, so one multi-source Dijkstra run yields the closest destination of every node.
+    Edges are treated as undirected. With a finite limit the search stops expanding at that distance.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :param origin_edge: edge index of every origin
+    :type origin_edge: numpy.ndarray
+    :param origin_offset: offset of every origin along its edge
+    :type origin_offset: numpy.ndarray
+    :param destination_edge: edge index of every destination
+    :type destination_edge: numpy.ndarray
+    :param destination_offset: offset of every destination along its edge
+    :type destination_offset: numpy.ndarray
+    :param limit: maximum distance to search (optional)
+    :type limit: float
+    :return distance, destination: distance to and position of the closest destination for every
+        origin (inf and -1 if no destination can be reached within the limit)
+    :rtype distance, destination: numpy.ndarray, numpy.ndarray
+    """
+    if len(origin_edge) == 0:
+        return np.full(0, np.inf), np.full(0, -1, dtype=np.int64)
+    # the field is only computed if there are origins to evaluate it for
+    distance_field = DistanceField(edge_from, edge_to, edge_length, destination_edge, destination_offset, limit)
+    return distance_field.nearest(origin_edge, origin_offset)
+
+
+class DistanceField:
+    """
+    Network distance of every node to its closest destination.
+
+    Every destination is added to the graph as a virtual node connected to both ends of its edge, so one
+    multi-source Dijkstra run yields the closest destination of every node. The field is computed once and can
+    then be evaluated for any number of origins, e.g. window by window of a population raster. Edges are treated
+    as undirected. With a finite limit the search stops expanding at that distance.
+
+    If edge costs are given, e.g. travel times, the search minimizes the cost instead of the length, the limit
+    is given in the unit of the costs and the length of every cheapest path is tracked along (see nearest).
+
+    Directed edges may only be passed from their start to their end node, e.g. one-way streets for cars. Like in
+    osm networks, a street passable in both directions is then given as two edges (see reverse_edges), points on
+    either of both are moved onto the first one. The search runs on the reversed edges from the destinations, so
+    the distances are those from the origins to the destinations.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :param destination_edge: edge index of every destination
+    :type destination_edge: numpy.ndarray
+    :param destination_offset: offset of every destination along its edge
+    :type destination_offset: numpy.ndarray
+    :param limit: maximum distance (or cost) to search (optional)
+    :type limit: float
+    :param edge_cost: cost of every edge, spread evenly along the edge (optional, the length if None)
+    :type edge_cost: numpy.ndarray
+    :param directed: If True, edges are directed
+    :type directed: bool
+    """
+
+    def __init__(
+        self,
+        edge_from,
+        edge_to,
+        edge_length,
+        destination_edge,
+        destination_offset,
+        limit=np.inf,
+        edge_cost=None,
+        directed=False,
+    ):
+        """Search the network from all destinations."""
+        self.edge_from = np.asarray(edge_from, dtype=np.int64)
+        self.edge_to = np.asarray(edge_to, dtype=np.int64)
+        self.edge_length = np.asarray(edge_length, dtype=np.float64)
+        self.limit = limit
+        self.directed = directed
+        if edge_cost is None:
+            self.cost_per_length = np.ones(len(self.edge_length))
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                self.cost_per_length = np.where(
+                    self.edge_length > 0, np.asarray(edge_cost, dtype=np.float64) / self.edge_length, 0.0
+                )
+        if directed:
+            self.edge_reverse = reverse_edges(self.edge_from, self.edge_to, self.edge_length)
+        else:
+            # every edge can be passed both ways
+            self.edge_reverse = np.arange(len(self.edge_length))
+        self.destination_edge, self.destination_offset = self._first_of_pair(destination_edge, destination_offset)
+
+        number_of_nodes = int(max(self.edge_from.max(), self.edge_to.max())) + 1 if len(self.edge_from) else 0
+        if len(self.destination_edge) == 0:
+            self.node_distance = np.full(number_of_nodes, np.inf)
+            self.node_length = self.node_distance
+            self.node_destination = np.full(number_of_nodes, -1, dtype=np.int64)
+            return
+        edge = self.destination_edge
+        virtual_nodes = number_of_nodes + np.arange(len(edge))
+        # a destination is reached from the end node of its edge only if the edge can be passed backwards
+        backward = self.edge_reverse[edge] >= 0
+        # the search runs from the destinations, so directed edges are reversed
+        edge_start, edge_end = (self.edge_to, self.edge_from) if directed else (self.edge_from, self.edge_to)
+        fromnode = np.concatenate([edge_start, virtual_nodes, virtual_nodes[backward]])
+        tonode = np.concatenate([edge_end, self.edge_from[edge], self.edge_to[edge[backward]]])
+        length = np.concatenate(
+            [
+                self.edge_length,
+                self.destination_offset,
+                self.edge_length[edge[backward]] - self.destination_offset[backward],
+            ]
+        )
+        cost = length * np.concatenate(
+            [self.cost_per_length, self.cost_per_length[edge], self.cost_per_length[edge[backward]]]
+        )
+        graph = build_graph(fromnode, tonode, cost, number_of_nodes + len(edge))
+        node_distance, predecessor, node_source = dijkstra(
+            graph, directed=directed, indices=virtual_nodes, min_only=True, return_predecessors=True, limit=limit
+        )
+        self.node_distance = node_distance[:number_of_nodes]
+        self.node_destination = np.where(node_source >= 0, node_source - number_of_nodes, -1)[:number_of_nodes]
+        if edge_cost is None:
+            self.node_length = self.node_distance
+        else:
+            node_length = _path_length(fromnode, tonode, length, cost, node_distance, predecessor, directed)
+            self.node_length = node_length[:number_of_nodes]
+
+    def nearest(self, origin_edge, origin_offset, return_length=False):
+        """
+        Return the distance to and the closest destination of every origin.
+
+        :param origin_edge: edge index of every origin
+        :type origin_edge: numpy.ndarray
+        :param origin_offset: offset of every origin along its edge
+        :type origin_offset: numpy.ndarray
+        :param return_length: If True, also return the length of the path to the closest destination, which
+            differs from its distance if edge costs were given
+        :type return_length: bool
+        :return distance, destination: distance (or cost) to and position of the closest destination for every
+            origin (inf and -1 if no destination can be reached within the limit)
+        :rtype distance, destination: numpy.ndarray, numpy.ndarray
+        """
+        origin_edge, origin_offset = self._first_of_pair(origin_edge, origin_offset)
+        if len(self.destination_edge) == 0:
+            distance = np.full(len(origin_edge), np.inf)
+            destination = np.full(len(origin_edge), -1, dtype=np.int64)
+            return (distance, distance.copy(), destination) if return_length else (distance, destination)
+        edge_from, edge_to, edge_length = self.edge_from, self.edge_to, self.edge_length
+        scale = self.cost_per_length[origin_edge]
+        backward = self.edge_reverse[origin_edge] >= 0
+
+        # leave the origin edge through its end or, if it can be passed backwards, its start node
+        to_end = edge_length[origin_edge] - origin_offset
+        via_from = np.where(backward, self.node_distance[edge_from[origin_edge]] + origin_offset * scale, np.inf)
+        via_to = self.node_distance[edge_to[origin_edge]] + to_end * scale
+        distance = np.minimum(via_from, via_to)
+        use_from = via_from <= via_to
+        destination = np.where(
+            use_from, self.node_destination[edge_from[origin_edge]], self.node_destination[edge_to[origin_edge]]
+        )
+        length = np.where(
+            use_from,
+            self.node_length[edge_from[origin_edge]] + origin_offset,
+            self.node_length[edge_to[origin_edge]] + to_end,
+        )
+
+        # destinations on the same edge can be reached directly
+        same_edge_distance, same_edge_destination = _nearest_on_same_edge(
+            edge_length, origin_edge, origin_offset, self.destination_edge, self.destination_offset, backward
+        )
+        closer = same_edge_distance * scale < distance
+        distance[closer] = same_edge_distance[closer] * scale[closer]
+        length[closer] = same_edge_distance[closer]
+        destination[closer] = same_edge_destination[closer]
+        distance[distance > self.limit] = np.inf
+        unreached = ~np.isfinite(distance)
+        destination[unreached] = -1
+        length[unreached] = np.inf
+        if return_length:
+            return distance, length, destination
+        return distance, destination
+
+    def _first_of_pair(self, edge, offset):
+        # points on the second edge of a street passable both ways are moved onto the first one
+        edge = np.asarray(edge, dtype=np.int64)
+        offset = np.asarray(offset, dtype=np.float64)
+        if not self.directed:
+            return edge, offset
+        reverse = self.edge_reverse[edge]
+        second = (reverse >= 0) & (reverse < edge)
+        return np.where(second, reverse, edge), np.where(second, self.edge_length[edge] - offset, offset)
+
+
+def _path_length(fromnode, tonode, length, cost, distance, predecessor, directed=False):
+    # length of the cheapest path to every node, summed up along the predecessors by pointer jumping
+    number_of_nodes = len(predecessor)
+    if directed:
+        first, second = fromnode, tonode
+    else:
+        first, second = np.minimum(fromnode, tonode), np.maximum(fromnode, tonode)
+    # of parallel edges the search uses the cheapest one
+    order = np.lexsort((cost, second, first))
+    key = first[order] * number_of_nodes + second[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = key[1:] != key[:-1]
+    key, edge_length = key[keep], length[order][keep]
+
+    node = np.flatnonzero(predecessor >= 0)
+    parent = predecessor[node]
+    total = np.zeros(number_of_nodes)
+    if directed:
+        node_key = parent * number_of_nodes + node
+    else:
+        node_key = np.minimum(node, parent) * number_of_nodes + np.maximum(node, parent)
+    total[node] = edge_length[np.searchsorted(key, node_key)]
+    ancestor = np.where(predecessor >= 0, predecessor, -1)
+    while (ancestor >= 0).any():
+        has_ancestor = ancestor >= 0
+        total = total + np.where(has_ancestor, total[ancestor], 0)
+        ancestor = np.where(has_ancestor, ancestor[ancestor], -1)
+    return np.where(np.isfinite(distance), total, np.inf)
+
+
+def reverse_edges(edge_from, edge_to, edge_length):
+    """
+    Find the edge leading back along every edge.
+
+    Streets passable in both directions are given as two edges of the same length in opposite directions, e.g.
+    in osm networks. Of several candidates the first one is taken.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :return: edge index of the reverse edge (-1 for one-way edges)
+    :rtype: numpy.ndarray
+    """
+    # lengths are compared in centimeters, loops are their own reverse edge
+    length = np.round(np.asarray(edge_length, dtype=np.float64), 2)
+    edges = pd.DataFrame({"from": edge_from, "to": edge_to, "length": length}).drop_duplicates()
+    index = pd.MultiIndex.from_frame(edges)
+    position = index.get_indexer(pd.MultiIndex.from_arrays([edge_to, edge_from, length]))
+    return np.where(position >= 0, edges.index.to_numpy()[np.maximum(position, 0)], -1)
+
+
+def _nearest_on_same_edge(edge_length, origin_edge, origin_offset, destination_edge, destination_offset, backward=None):
+    # sort destinations along a single key (edge, offset) and look up the neighbours of every origin, origins
+    # with backward False only reach the destinations ahead of them
+    stride = 2.0 * float(edge_length.max()) + 1.0
+    destination_key = destination_edge * stride + destination_offset
+    order = np.argsort(destination_key)
+    destination_key = destination_key[order]
+    origin_key = origin_edge * stride + origin_offset
+
+    distance = np.full(len(origin_edge), np.inf)
+    destination = np.full(len(origin_edge), -1, dtype=np.int64)
+    position = np.searchsorted(destination_key, origin_key)
+    # the destination before and the one at or after the origin
+    for candidate, ahead in ((position - 1, False), (position, True)):
+        valid = (candidate >= 0) & (candidate < len(order))
+        candidate = np.clip(candidate, 0, len(order) - 1)
+        matching = valid & (destination_edge[order[candidate]] == origin_edge)
+        if backward is not None and not ahead:
+            matching &= backward
+        candidate_distance = np.where(matching, np.abs(origin_key - destination_key[candidate]), np.inf)
+        closer = candidate_distance < distance
+        distance[closer] = candidate_distance[closer]
+        destination[closer] = order[candidate[closer]]
+    return distance, destination
+
+
+def distance_to_sets(
+    edge_from, edge_to, edge_length, origin_edge, origin_offset, destination_edges, destination_offsets, limit=np.inf
+):
+    """
+    Compute the network distance from every origin to the closest destination of several destination sets.
+
+    Every destination set is connected to a virtual source node of its own. The graph is built once and
+    searched from every virtual source, one Dijkstra run per set, which yields the distance of every node to
+    every set. The node distances are held for all sets at once, so memory grows with the number of sets times
+    the number of nodes. With a finite limit every search stops expanding at that distance.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :param origin_edge: edge index of every origin
+    :type origin_edge: numpy.ndarray
+    :param origin_offset: offset of every origin along its edge
+    :type origin_offset: numpy.ndarray
+    :param destination_edges: edge indices of the destinations of every set
+    :type destination_edges: list of numpy.ndarray
+    :param destination_offsets: offsets of the destinations of every set along their edges
+    :type destination_offsets: list of numpy.ndarray
+    :param limit: maximum distance to search (optional)
+    :type limit: float
+    :return distance: distance from every origin (rows) to the closest destination of every set (columns),
+        inf if no destination of a set can be reached within the limit
+    :rtype distance: numpy.ndarray
+    """
+    edge_from = np.asarray(edge_from, dtype=np.int64)
+    edge_to = np.asarray(edge_to, dtype=np.int64)
+    edge_length = np.asarray(edge_length, dtype=np.float64)
+    origin_edge = np.asarray(origin_edge, dtype=np.int64)
+    origin_offset = np.asarray(origin_offset, dtype=np.float64)
+    destination_edges = [np.asarray(edge, dtype=np.int64) for edge in destination_edges]
+    destination_offsets = [np.asarray(offset, dtype=np.float64) for offset in destination_offsets]
+
+    distance = np.full((len(origin_edge), len(destination_edges)), np.inf)
+    if len(origin_edge) == 0 or len(destination_edges) == 0:
+        return distance
+
+    number_of_nodes = int(max(edge_from.max(), edge_to.max())) + 1
+    virtual_nodes = number_of_nodes + np.arange(len(destination_edges))
+    source = np.concatenate(
+        [np.full(len(edge), node, dtype=np.int64) for node, edge in zip(virtual_nodes, destination_edges)]
+    )
+    destination_edge = np.concatenate(destination_edges)
+    destination_offset = np.concatenate(destination_offsets)
+    # virtual edges only lead away from the virtual sources, otherwise a search could take a shortcut
+    # through the virtual source of another set
+    graph = build_graph(
+        np.concatenate([edge_from, edge_to, source, source]),
+        np.concatenate([edge_to, edge_from, edge_from[destination_edge], edge_to[destination_edge]]),
+        np.concatenate(
+            [edge_length, edge_length, destination_offset, edge_length[destination_edge] - destination_offset]
+        ),
+        number_of_nodes + len(destination_edges),
+    )
+    node_distance = dijkstra(graph, directed=True, indices=virtual_nodes, limit=limit)
+
+    for column, (edge, offset) in enumerate(zip(destination_edges, destination_offsets)):
+        if len(edge) == 0:
+            continue
+        via_from = node_distance[column, edge_from[origin_edge]] + origin_offset
+        via_to = node_distance[column, edge_to[origin_edge]] + edge_length[origin_edge] - origin_offset
+        same_edge_distance, _ = _nearest_on_same_edge(edge_length, origin_edge, origin_offset, edge, offset)
+        distance[:, column] = np.minimum(np.minimum(via_from, via_to), same_edge_distance)
+    distance[distance > limit] = np.inf
+    return distance
+
+
+def destinations_within(
+    edge_from,
+    edge_to,
+    edge_length,
+    origin_edge,
+    origin_offset,
+    destination_edge,
+    destination_offset,
+    limit,
+    k=None,
+    chunk_memory=default_chunk_memory,
+):
+    """
+    Compute the network distance of every origin to every destination within a limit.
+
+    The search from every destination stops at the limit and only keeps the nodes it reaches. The destinations
+    are searched in chunks, so the working memory is limited by chunk_memory, and both the run time and the
+    result grow with the number of reachable pairs. Edges are treated as undirected.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :param origin_edge: edge index of every origin
+    :type origin_edge: numpy.ndarray
+    :param origin_offset: offset of every origin along its edge
+    :type origin_offset: numpy.ndarray
+    :param destination_edge: edge index of every destination
+    :type destination_edge: numpy.ndarray
+    :param destination_offset: offset of every destination along its edge
+    :type destination_offset: numpy.ndarray
+    :param limit: maximum distance to search
+    :type limit: float
+    :param k: only keep the k closest destinations of every origin (optional, all within the limit if None)
+    :type k: int
+    :param chunk_memory: bytes of reached nodes held per chunk of destinations
+    :type chunk_memory: int
+    :return origin, destination, distance: reachable pairs sorted by origin and distance (COO)
+    :rtype origin, destination, distance: numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+    edge_from = np.asarray(edge_from, dtype=np.int64)
+    edge_to = np.asarray(edge_to, dtype=np.int64)
+    edge_length = np.asarray(edge_length, dtype=np.float64)
+    origin_edge = np.asarray(origin_edge, dtype=np.int64)
+    origin_offset = np.asarray(origin_offset, dtype=np.float64)
+    destination_edge = np.asarray(destination_edge, dtype=np.int64)
+    destination_offset = np.asarray(destination_offset, dtype=np.float64)
+    if not np.isfinite(limit):
+        raise ValueError("destinations_within needs a finite limit")
+
+    empty = np.empty(0, dtype=np.int64)
+    if len(origin_edge) == 0 or len(destination_edge) == 0:
+        return empty, empty, np.empty(0)
+
+    number_of_nodes = int(max(edge_from.max(), edge_to.max())) + 1
+    # origins by the start node, the end node and the edge they lie on
+    by_from = _group(edge_from[origin_edge], number_of_nodes)
+    by_to = _group(edge_to[origin_edge], number_of_nodes)
+    by_edge = _group(origin_edge, len(edge_from))
+
+    origins, destinations, distances = [], [], []
+    for start, count, pair_row, node, node_distance in _bounded_searches(
+        edge_from, edge_to, edge_length, destination_edge, destination_offset, limit, chunk_memory
+    ):
+        end = start + count
+        edge = destination_edge[start:end]
+        offset = destination_offset[start:end]
+        pair = np.arange(len(node))
+
+        # leave the origin edge through its start or its end node, or go along the edge of the destination
+        from_pair, from_origin = _gather(by_from, node, pair)
+        to_pair, to_origin = _gather(by_to, node, pair)
+        same_row, same_origin = _gather(by_edge, edge, np.arange(count))
+        row = np.concatenate([pair_row[from_pair], pair_row[to_pair], same_row])
+        origin = np.concatenate([from_origin, to_origin, same_origin])
+        distance = np.concatenate(
+            [
+                node_distance[from_pair] + origin_offset[from_origin],
+                node_distance[to_pair] + edge_length[origin_edge[to_origin]] - origin_offset[to_origin],
+                np.abs(origin_offset[same_origin] - offset[same_row]),
+            ]
+        )
+        # keep the shortest way of every pair
+        order = np.lexsort((distance, origin, row))
+        row, origin, distance = row[order], origin[order], distance[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (row[1:] != row[:-1]) | (origin[1:] != origin[:-1])
+        within = first & (distance <= limit)
+        origins.append(origin[within])
+        destinations.append(start + row[within])
+        distances.append(distance[within])
+
+    origin = np.concatenate(origins)
+    destination = np.concatenate(destinations)
+    distance = np.concatenate(distances)
+    order = np.lexsort((destination, distance, origin))
+    origin, destination, distance = origin[order], destination[order], distance[order]
+    if k is not None:
+        # rank of every pair among the pairs of its origin
+        first_of_origin = np.searchsorted(origin, origin, side="left")
+        keep = np.arange(len(origin)) - first_of_origin < k
+        origin, destination, distance = origin[keep], destination[keep], distance[keep]
+    return origin, destination, distance
+
+
+def reached_intervals(
+    edge_from,
+    edge_to,
+    edge_length,
+    destination_edge,
+    destination_offset,
+    limit,
+    chunk_memory=default_chunk_memory,
+):
+    """
+    Compute the parts of the edges within network distance of every destination.
+
+    The search from every destination is bounded by the limit. An edge is reached from its start node, from its
+    end node or, for the edge a destination lies on, from the destination itself. Edges are cut where the
+    remaining distance ends, so every reached part is returned as interval of offsets along its edge. Intervals
+    of the same destination may overlap. The destinations are searched in chunks like in destinations_within.
+
+    :param edge_from: dense index of the start node of every edge
+    :type edge_from: numpy.ndarray
+    :param edge_to: dense index of the end node of every edge
+    :type edge_to: numpy.ndarray
+    :param edge_length: length of every edge
+    :type edge_length: numpy.ndarray
+    :param destination_edge: edge index of every destination
+    :type destination_edge: numpy.ndarray
+    :param destination_offset: offset of every destination along its edge
+    :type destination_offset: numpy.ndarray
+    :param limit: maximum distance to search
+    :type limit: float
+    :param chunk_memory: bytes of reached nodes held per chunk of destinations
+    :type chunk_memory: int
+    :return destination, edge, begin, end: position of the destination, edge index and offsets of the start and
+        the end of every reached interval
+    :rtype destination, edge, begin, end: numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray
+    """
+    edge_from = np.asarray(edge_from, dtype=np.int64)
+    edge_to = np.asarray(edge_to, dtype=np.int64)
+    edge_length = np.asarray(edge_length, dtype=np.float64)
+    destination_edge = np.asarray(destination_edge, dtype=np.int64)
+    destination_offset = np.asarray(destination_offset, dtype=np.float64)
+    if not np.isfinite(limit):
+        raise ValueError("reached_intervals needs a finite limit")
+    if len(destination_edge) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0), np.empty(0)
+
+    number_of_nodes = int(max(edge_from.max(), edge_to.max())) + 1
+    # edges by their start and their end node
+    by_from = _group(edge_from, number_of_nodes)
+    by_to = _group(edge_to, number_of_nodes)
+
+    destinations, edges, begins, ends = [], [], [], []
+    for start, count, row, node, node_distance in _bounded_searches(
+        edge_from, edge_to, edge_length, destination_edge, destination_offset, limit, chunk_memory
+    ):
+        remaining = limit - node_distance
+        from_row, from_edge = _gather(by_from, node, np.arange(len(row)))
+        to_row, to_edge = _gather(by_to, node, np.arange(len(row)))
+        own = np.arange(start, start + count)
+        offset = destination_offset[own]
+        own_edge = destination_edge[own]
+        destinations.extend([start + row[from_row], start + row[to_row], own])
+        edges.extend([from_edge, to_edge, own_edge])
+        begins.extend(
+            [
+                np.zeros(len(from_edge)),
+                np.maximum(edge_length[to_edge] - remaining[to_row], 0),
+                np.maximum(offset - limit, 0),
+            ]
+        )
+        ends.extend(
+            [
+                np.minimum(remaining[from_row], edge_length[from_edge]),
+                edge_length[to_edge],
+                np.minimum(offset + limit, edge_length[own_edge]),
+            ]
+        )
+    return np.concatenate(destinations), np.concatenate(edges), np.concatenate(begins), np.concatenate(ends)
+
+
+def _bounded_searches(edge_from, edge_to, edge_length, destination_edge, destination_offset, limit, chunk_memory):
+    # The destinations are searched in chunks, yielding the first destination and the size of a chunk and the
+    # reached (row, node, distance) triples of the destinations of it. All searches of a chunk run together as a
+    # label correcting search: the labels improved in one round are expanded over the edges of their nodes in the
+    # next one, and labels beyond the limit are dropped. Only reached nodes are held, keyed by row and node, so
+    # the work grows with the number of reachable pairs.
+    number_of_nodes = int(max(edge_from.max(), edge_to.max())) + 1
+    by_tail = _group(np.concatenate([edge_from, edge_to]), number_of_nodes)
+    head = np.concatenate([edge_to, edge_from])
+    arc_length = np.concatenate([edge_length, edge_length])
+    # the first chunk assumes 64 reached nodes per destination, later chunks the average of the previous one
+    chunk_size = max(1, int(chunk_memory // (24 * 64)))
+    start = 0
+    while start < len(destination_edge):
+        end = start + chunk_size
+        edge = destination_edge[start:end]
+        offset = destination_offset[start:end]
+        row = np.tile(np.arange(len(edge)), 2)
+        key, distance = _shortest(
+            row * number_of_nodes + np.concatenate([edge_from[edge], edge_to[edge]]),
+            np.concatenate([offset, edge_length[edge] - offset]),
+            limit,
+        )
+        frontier, frontier_distance = key, distance
+        while len(frontier):
+            label, arc = _gather(by_tail, frontier % number_of_nodes, np.arange(len(frontier)))
+            candidate = frontier[label] - frontier[label] % number_of_nodes + head[arc]
+            candidate_distance = frontier_distance[label] + arc_length[arc]
+            # labels that do not improve a reached node are dropped before they are sorted
+            position = np.minimum(np.searchsorted(key, candidate), len(key) - 1)
+            known = key[position] == candidate
+            better = np.where(known, candidate_distance < distance[position], True)
+            frontier, frontier_distance = _shortest(candidate[better], candidate_distance[better], limit)
+            position = np.searchsorted(key, frontier)
+            known = np.zeros(len(frontier), dtype=bool)
+            inside = position < len(key)
+            known[inside] = key[position[inside]] == frontier[inside]
+            distance[position[known]] = frontier_distance[known]
+            key = np.insert(key, position[~known], frontier[~known])
+            distance = np.insert(distance, position[~known], frontier_distance[~known])
+        yield start, len(edge), key // number_of_nodes, key % number_of_nodes, distance
+        start += len(edge)
+        chunk_size = max(1, int(chunk_memory // (24 * max(1, len(key) / len(edge)))))
+
+
+def _shortest(key, distance, limit):
+    # shortest distance of every key within the limit, sorted by key
+    within = distance <= limit
+    key, distance = key[within], distance[within]
+    order = np.argsort(key)
+    key, distance = key[order], distance[order]
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    start = np.flatnonzero(first)
+    return key[start], np.minimum.reduceat(distance, start) if len(start) else distance
+
+
+def _group(key, number_of_keys):
+    # CSR grouping of positions by key: the positions with key i are values[indptr[i]:indptr[i + 1]]
+    values = np.argsort(key, kind="stable")
+    indptr = np.zeros(number_of_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(key, minlength=number_of_keys), out=indptr[1:])
+    return indptr, values
+
+
+def _gather(group, keys, labels):
+    # all positions grouped under the keys, together with the label of the key they were found by
+    indptr, values = group
+    counts = indptr[keys + 1] - indptr[keys]
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # position within the concatenated ranges
+    starts = np.repeat(indptr[keys] - np.cumsum(counts) + counts, counts)
+    return np.repeat(labels, counts), values[starts + np.arange(total)]
+
+
+class ODMatrix:
+    """
+    Sparse origin-destination distances.
+
+    The pairs are stored in CSR layout: the destinations reached from origin i and their distances are
+    destination[indptr[i]:indptr[i + 1]] and distance[indptr[i]:indptr[i + 1]], sorted by distance. Origins and
+    destinations are numbered by their position, origin_id and destination_id map the positions to ids.
+
+    :param indptr: CSR row pointers, one more than origins
+    :type indptr: numpy.ndarray
+    :param destination: position of the destination of every pair
+    :type destination: numpy.ndarray
+    :param distance: network distance of every pair
+    :type distance: numpy.ndarray
+    :param origin_id: id of every origin
+    :type origin_id: numpy.ndarray
+    :param destination_id: id of every destination
+    :type destination_id: numpy.ndarray
+    """
+
+    def __init__(self, indptr, destination, distance, origin_id, destination_id):
+        """Wrap the CSR arrays of the pairs (see from_coo)."""
+        self.indptr = indptr
+        self.destination = destination
+        self.distance = distance
+        self.origin_id = np.asarray(origin_id)
+        self.destination_id = np.asarray(destination_id)
+
+    @classmethod
+    def from_coo(cls, origin, destination, distance, origin_id, destination_id):
+        """
+        Build the matrix from pairs sorted by origin and distance (see destinations_within).
+
+        :param origin: position of the origin of every pair
+        :type origin: numpy.ndarray
+        :param destination: position of the destination of every pair
+        :type destination: numpy.ndarray
+        :param distance: network distance of every pair
+        :type distance: numpy.ndarray
+        :param origin_id: id of every origin
+        :type origin_id: numpy.ndarray
+        :param destination_id: id of every destination
+        :type destination_id: numpy.ndarray
+        :return: sparse origin-destination distances
+        :rtype: ODMatrix
+        """
+        indptr = np.zeros(len(origin_id) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origin, minlength=len(origin_id)), out=indptr[1:])
+        return cls(indptr, np.asarray(destination, dtype=np.int64), distance, origin_id, destination_id)
+
+    @property
+    def number_of_pairs(self):
+        """Return the number of reachable origin-destination pairs."""
+        return len(self.destination)
+
+    def to_coo(self):
+        """
+        Return the pairs as coordinate arrays.
+
+        :return origin, destination, distance: positions of origin and destination and distance of every pair
+        :rtype origin, destination, distance: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        origin = np.repeat(np.arange(len(self.origin_id)), np.diff(self.indptr))
+        return origin, self.destination, self.distance
+
+    def to_csr(self):
+        """
+        Return the distances as scipy matrix with one row per origin and one column per destination.
+
+        Pairs at distance 0 are stored explicitly, missing entries are pairs out of reach.
+
+        :return: sparse distance matrix
+        :rtype: scipy.sparse.csr_matrix
+        """
+        return sparse.csr_matrix(
+            (self.distance, self.destination, self.indptr), shape=(len(self.origin_id), len(self.destination_id))
+        )
+
+    def to_frame(self):
+        """
+        Return one row per pair with the ids of origin and destination.
+
+        :return: pairs with the columns "o_id", "d_id" and "distance_pt"
+        :rtype: pandas.DataFrame
+        """
+        origin, destination, distance = self.to_coo()
+        return pd.DataFrame(
+            {"o_id": self.origin_id[origin], "d_id": self.destination_id[destination], "distance_pt": distance}
+        )
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+import ptac.accessibility as accessibility
+import ptac.routing as routing
+import ptac.settings as settings
+import ptac.util as util
+
+"""Keeps accessibility results up to date while stops are added, moved or removed"""
+
+"""
+@name : session.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+
+class AccessibilitySession:
+    """
+    Accessibility of a fixed population to a changing set of stops.
+
+    The network is prepared and the origins are snapped once. For every origin the distance to and the key
+    of its closest stop are kept, together with the accessible population. Adding a stop runs one Dijkstra
+    search bounded by the maximum distance from the new stop and only improves distances. Removing a stop
+    only recomputes the origins that were served by it, using the stops within twice the maximum distance of
+    the removed one. Distances beyond the maximum distance are not tracked.
+
+    Stops are identified by the index of the GeoDataFrames they are added with.
+
+    :param start_geometries: Population points
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_geometries: Initial stops (optional)
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param population_column: The name of the population column
+    :type population_column: str
+    :param network_gdf: Network dataset to use (optional, if None is provided dataset will be downloaded from
+        osm automatically)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING or ptac.network.PtacNetwork
+    :param boundary_geometries: Boundary dataset of the desired area
+    :type boundary_geometries: Geopandas.GeoDataFrame::POLYGON
+    :param transport_system: Low-capacity or high-capacity pt system, decides the maximum distance
+    :type transport_system: str
+    :param maximum_distance: Maximum distance to next pt station (optional, unbounded if neither the maximum
+        distance nor the transport system is given)
+    :type maximum_distance: float
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    """
+
+    def __init__(
+        self,
+        start_geometries,
+        destination_geometries=None,
+        population_column="pop",
+        network_gdf=None,
+        boundary_geometries=None,
+        transport_system=None,
+        maximum_distance=None,
+        verbose=0,
+    ):
+        """Prepare the network, snap the population and add the initial stops."""
+        if maximum_distance is None and transport_system is not None:
+            maximum_distance = accessibility._maximum_distance(transport_system)
+        self.maximum_distance = np.inf if maximum_distance is None else float(maximum_distance)
+        self.crs = accessibility._crs(start_geometries, network_gdf)
+        self.start_geometries = util.project_gdf(start_geometries, to_crs=self.crs)
+        if boundary_geometries is None:
+            boundary_geometries = accessibility._bounding_box(self.start_geometries)
+        self.network_index = accessibility._network_index(
+            network_gdf, boundary_geometries.to_crs(settings.default_crs), self.crs, verbose=verbose
+        )
+        index = self.network_index
+        number_of_nodes = int(max(index.edge_from.max(), index.edge_to.max())) + 1 if len(index.edge_from) else 0
+        self.graph = routing.build_graph(index.edge_from, index.edge_to, index.edge_length, number_of_nodes)
+
+        self.origin_edge, self.origin_offset, _ = index.snap(self.start_geometries)
+        self.population = self.start_geometries[population_column].to_numpy(dtype=np.float64)
+        self.total_population = float(self.population.sum())
+        self.accessible_population = 0.0
+        self.distance = np.full(len(self.start_geometries), np.inf)
+        self.nearest = np.full(len(self.start_geometries), -1, dtype=np.int64)
+
+        # stops are numbered internally in the order they are added
+        self._stop_number = {}
+        self._stop_key = []
+        self._stop_edge = []
+        self._stop_offset = []
+        self._stop_active = []
+        if destination_geometries is not None and len(destination_geometries) > 0:
+            self._initialize(destination_geometries)
+
+    @property
+    def stops(self):
+        """
+        Keys of the current stops.
+
+        :return: stop keys
+        :rtype: list
+        """
+        return [key for key, active in zip(self._stop_key, self._stop_active) if active]
+
+    def calculate_sdg(self):
+        """
+        Return the SDG 11.2.1 indicator of the current stops.
+
+        :return: share of the population within the maximum distance of a stop
+        :rtype: float
+        """
+        return self.accessible_population / self.total_population
+
+    def add_stops(self, destination_geometries):
+        """
+        Add stops and improve the distances of the origins they are closer to.
+
+        :param destination_geometries: New stops, their index is used as key
+        :type destination_geometries: Geopandas.GeoDataFrame::POINT
+        """
+        for number in self._register(destination_geometries):
+            self._improve(number)
+
+    def remove_stops(self, keys):
+        """
+        Remove stops and recompute the origins they served.
+
+        :param keys: keys of the stops to remove
+        :type keys: list
+        """
+        for key in keys:
+            number = self._stop_number.pop(key, None)
+            if number is None:
+                raise ValueError(f"there is no stop {key}")
+            self._stop_active[number] = False
+            affected = np.flatnonzero(self.nearest == number)
+            if len(affected) == 0:
+                continue
+            self.accessible_population -= float(self.population[affected].sum())
+            self.distance[affected] = np.inf
+            self.nearest[affected] = -1
+            for candidate in self._candidates(number):
+                self._improve(candidate, affected)
+
+    def move_stops(self, destination_geometries):
+        """
+        Move stops to new positions.
+
+        :param destination_geometries: Stops at their new positions, the index holds the keys of the stops
+        :type destination_geometries: Geopandas.GeoDataFrame::POINT
+        """
+        self.remove_stops(list(destination_geometries.index))
+        self.add_stops(destination_geometries)
+
+    def accessibility_output(self):
+        """
+        Return the current distance of every origin to its closest stop.
+
+        :return accessibility_output: Population points with the columns "distance_pt" and "stop" (NaN and None
+            for origins without a stop within the maximum distance)
+        :rtype accessibility_output: Geopandas.GeoDataFrame::POINT
+        """
+        accessibility_output = self.start_geometries.copy()
+        reached = self.nearest >= 0
+        accessibility_output["distance_pt"] = np.where(reached, self.distance, np.nan)
+        keys = np.asarray(self._stop_key + [None], dtype=object)
+        accessibility_output["stop"] = keys[self.nearest]
+        return accessibility_output
+
+    def _register(self, destination_geometries):
+        destination_geometries = util.project_gdf(destination_geometries, to_crs=self.crs)
+        edge, offset, _ = self.network_index.snap(destination_geometries)
+        numbers = []
+        for key, stop_edge, stop_offset in zip(destination_geometries.index, edge, offset):
+            if key in self._stop_number:
+                raise ValueError(f"there already is a stop {key}")
+            if stop_edge < 0:
+                # stops without coordinates are kept, but never reached
+                stop_offset = np.nan
+            self._stop_number[key] = len(self._stop_key)
+            numbers.append(len(self._stop_key))
+            self._stop_key.append(key)
+            self._stop_edge.append(int(stop_edge))
+            self._stop_offset.append(float(stop_offset))
+            self._stop_active.append(True)
+        return numbers
+
+    def _initialize(self, destination_geometries):
+        # the initial stops are routed in one multi-source search
+        numbers = np.asarray(self._register(destination_geometries), dtype=np.int64)
+        edge = np.asarray(self._stop_edge, dtype=np.int64)[numbers]
+        offset = np.asarray(self._stop_offset)[numbers]
+        origin = np.flatnonzero(self.origin_edge >= 0)
+        valid = edge >= 0
+        distance, destination = routing.nearest_destination(
+            self.network_index.edge_from,
+            self.network_index.edge_to,
+            self.network_index.edge_length,
+            self.origin_edge[origin],
+            self.origin_offset[origin],
+            edge[valid],
+            offset[valid],
+            limit=self.maximum_distance,
+        )
+        within = np.isfinite(distance)
+        self.distance[origin[within]] = distance[within]
+        self.nearest[origin[within]] = numbers[valid][destination[within]]
+        self.accessible_population = float(self.population[self.nearest >= 0].sum())
+
+    def _node_distance(self, number, limit):
+        # network distance of every node to a stop, inf beyond the limit
+        edge, offset = self._stop_edge[number], self._stop_offset[number]
+        index = self.network_index
+        node_distance = dijkstra(
+            self.graph, directed=False, indices=[index.edge_from[edge], index.edge_to[edge]], limit=limit
+        )
+        return np.minimum(node_distance[0] + offset, node_distance[1] + index.edge_length[edge] - offset)
+
+    def _improve(self, number, origins=None):
+        # let a stop serve the origins it is closer to than their current stop
+        if self._stop_edge[number] < 0:
+            return
+        if origins is None:
+            origins = np.flatnonzero(self.origin_edge >= 0)
+        else:
+            origins = origins[self.origin_edge[origins] >= 0]
+        index = self.network_index
+        node_distance = self._node_distance(number, self.maximum_distance)
+        edge = self.origin_edge[origins]
+        offset = self.origin_offset[origins]
+        distance = np.minimum(
+            node_distance[index.edge_from[edge]] + offset,
+            node_distance[index.edge_to[edge]] + index.edge_length[edge] - offset,
+        )
+        same_edge = edge == self._stop_edge[number]
+        distance[same_edge] = np.minimum(distance[same_edge], np.abs(offset[same_edge] - self._stop_offset[number]))
+
+        better = (distance < self.distance[origins]) & (distance <= self.maximum_distance)
+        origins, distance = origins[better], distance[better]
+        newly_reached = self.nearest[origins] < 0
+        self.accessible_population += float(self.population[origins[newly_reached]].sum())
+        self.distance[origins] = distance
+        self.nearest[origins] = number
+
+    def _candidates(self, number):
+        # only stops within twice the maximum distance of a removed stop can be closest to the origins it served
+        active = np.flatnonzero(np.asarray(self._stop_active) & (np.asarray(self._stop_edge) >= 0))
+        if not np.isfinite(self.maximum_distance) or self._stop_edge[number] < 0:
+            return active
+        index = self.network_index
+        node_distance = self._node_distance(number, 2 * self.maximum_distance)
+        edge = np.asarray(self._stop_edge, dtype=np.int64)[active]
+        offset = np.asarray(self._stop_offset)[active]
+        distance = np.minimum(
+            node_distance[index.edge_from[edge]] + offset,
+            node_distance[index.edge_to[edge]] + index.edge_length[edge] - offset,
+        )
+        same_edge = edge == self._stop_edge[number]
+        distance[same_edge] = np.minimum(distance[same_edge], np.abs(offset[same_edge] - self._stop_offset[number]))
+        return active[distance <= 2 * self.maximum_distance]
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # coding:utf-8
 
+from pathlib import Path
+
 import pandas as pd
 
 """Defines street types"""
@@ -14,6 +16,60 @@ import pandas as pd
 
 default_crs = "epsg:4326"
 
+# maximum walking distance to public transport stops (in meters) according to SDG 11.2.1
+maximum_distances = {"low-capacity": 500, "high-capacity": 1000}
+
+# local osm extract (.osm.pbf) street networks are read from instead of downloading them (see osm.get_network)
+pbf_file = None
+
+# transport system of the GTFS route types (see gtfs.classify_stops), extended route types are grouped by hundreds
+# https://gtfs.org/schedule/reference/#routestxt
+# https://developers.google.com/transit/gtfs/reference/extended-route-types
+route_types = {
+    0: "low-capacity",  # tram
+    1: "high-capacity",  # subway, metro
+    2: "high-capacity",  # rail
+    3: "low-capacity",  # bus
+    4: "high-capacity",  # ferry
+    5: "low-capacity",  # cable tram
+    6: "low-capacity",  # aerial lift
+    7: "low-capacity",  # funicular
+    11: "low-capacity",  # trolleybus
+    12: "high-capacity",  # monorail
+    100: "high-capacity",  # railway service
+    200: "low-capacity",  # coach service
+    400: "high-capacity",  # urban railway service
+    700: "low-capacity",  # bus service
+    800: "low-capacity",  # trolleybus service
+    900: "low-capacity",  # tram service
+    1000: "high-capacity",  # water transport service
+    1200: "high-capacity",  # ferry service
+    1300: "low-capacity",  # aerial lift service
+    1400: "low-capacity",  # funicular service
+    1700: "low-capacity",  # miscellaneous service
+}
+
+# cache of prepared street networks
+use_cache = True
+cache_folder = f"{Path.home()}/.ptac/cache"
+cache_size_limit = 5 * 1024**3  # bytes
+# reusable UrMoAC input files in ~/.ptac
+scratch_size_limit = 2 * 1024**3  # bytes
+
+# UrMoAC runner (see ptac.urmoac)
+java = "java"
+urmoac_heap_size = None  # bytes, estimated from the size of every request if None
+urmoac_maximum_heap_size = 12 * 1024**3  # bytes
+urmoac_timeout = None  # seconds, UrMoAC is killed after this time
+
+# travel speeds of the modes of streettypes in km/h, limited by the vmax of every street type
+# (see accessibility.NetworkIndex.travel_time), None drives at vmax
+mode_speeds = {"mode_walk": 5.0, "mode_bike": 15.0, "mode_mit": None}
+# modes passing every street in both directions, the others follow one-way streets
+bidirectional_modes = ["mode_walk"]
+# UrMoAC names of the modes (see accessibility.build_request)
+urmoac_modes = {"mode_walk": "foot", "mode_bike": "bicycle", "mode_mit": "passenger"}
+
 streettypes = pd.DataFrame.from_dict(
     {
         "motorway": [False, False, True, 160, 2],
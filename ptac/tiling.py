@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import ptac.accessibility as accessibility
+import ptac.batch as batch
+import ptac.settings as settings
+import ptac.util as util
+
+"""Splits country-scale accessibility calculations into overlapping tiles"""
+
+"""
+@name : tiling.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+# tiles with more origins are split into quadrants
+default_origins_per_tile = 100000
+# distance in meters within which origins and stops are expected to lie of a walkable street
+default_snap_distance = 250
+# tiles are not split any further, e.g. for many origins at the same position
+maximum_depth = 16
+
+
+def distance_to_closest_tiled(
+    start_geometries,
+    destination_geometries,
+    network_gdf=None,
+    transport_system=None,
+    maximum_distance=None,
+    origins_per_tile=default_origins_per_tile,
+    snap_distance=default_snap_distance,
+    processes=None,
+    scratch_directory=None,
+    engine="urmoac",
+    verbose=0,
+):
+    """
+    Calculate the distance to the closest destination tile by tile.
+
+    The study area is split like a quadtree: starting with the bounding box of the origins, every tile holding
+    more than origins_per_tile origins is split into four quadrants. Every origin belongs to exactly one tile.
+    A tile is routed on its own with distance_to_closest, using the destinations within the maximum distance
+    plus twice the snap distance of the tile and the network within the maximum distance plus three times the
+    snap distance. Origins and stops are snapped to the streets before routing, so the buffer exceeds the
+    maximum distance by the snapping tolerance. For origins and stops within snap_distance of a walkable street
+    the stitched result is the same as that of a single run over the whole area.
+
+    Tiles are routed in a process pool, every worker gets its own scratch directory (see ptac.batch).
+
+    :param start_geometries: Starting points for accessibility calculation
+    :type start_geometries: Geopandas.GeoDataFrame::POINT
+    :param destination_geometries: Destination points
+    :type destination_geometries: Geopandas.GeoDataFrame::POINT
+    :param network_gdf: Network dataset covering all tiles (optional, if None the network of every tile is loaded
+        from the cache or downloaded from osm)
+    :type network_gdf: Geopandas.GeoDataFrame::LINESTRING
+    :param transport_system: Low-capacity or high-capacity pt system
+    :type transport_system: str
+    :param maximum_distance: Maximum distance to next pt station (either this or the transport system is needed)
+    :type maximum_distance: int
+    :param origins_per_tile: Maximum number of origins of a tile
+    :type origins_per_tile: int
+    :param snap_distance: Distance in meters within which origins and stops lie of a walkable street
+    :type snap_distance: float
+    :param processes: Number of worker processes (optional, defaults to the number of cpus)
+    :type processes: int
+    :param scratch_directory: Folder for the worker scratch directories (optional, temporary folder if None)
+    :type scratch_directory: str
+    :param engine: Routing engine to use, either "urmoac" or "native"
+    :type engine: str
+    :param verbose: The degree of verbosity. Valid values are 0 (silent) - 3 (debug)
+    :type verbose: int
+    :return accessibility_output: Accessible starting points with the columns "index" (index of the starting
+        point), "o_id" (position of the starting point), "d_id" (position of the destination) and "distance_pt",
+        like the output of distance_to_closest
+    :rtype accessibility_output: Geopandas.GeoDataFrame::POINT
+    """
+    if maximum_distance is None and transport_system is None:
+        raise ValueError("tiling needs either a maximum distance or a transport system")
+    if maximum_distance is not None and transport_system is not None:
+        raise ValueError("please indicate either transport_system or maximum_distance. Not both")
+    limit = maximum_distance if maximum_distance is not None else accessibility._maximum_distance(transport_system)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if "index" in start_geometries.columns:
+        start_geometries = start_geometries.drop(columns="index")
+    if not np.isfinite(start_geometries.total_bounds).all():
+        # without any valid origin there is no tile to route
+        return _stitch(start_geometries, [])
+
+    crs = util.utm_crs(start_geometries)
+    start_geometries = util.project_gdf(start_geometries, to_crs=crs)
+    if len(destination_geometries) == 0:
+        return _stitch(start_geometries, [])
+    destination_geometries = util.project_gdf(destination_geometries, to_crs=crs).reset_index(drop=True)
+    if network_gdf is not None:
+        network_gdf = util.project_gdf(network_gdf, to_crs=crs)
+    origins = start_geometries.geometry.centroid
+    tiles = split_tiles(origins.x.to_numpy(), origins.y.to_numpy(), origins_per_tile)
+    if verbose > 0:
+        print(f"Calculating accessibilities in {len(tiles)} tiles\n")
+
+    def tasks():
+        for bounds, origin_position in tiles:
+            tile = shapely.box(*bounds)
+            # square buffers contain the round ones
+            network_area = shapely.buffer(tile, limit + 3 * snap_distance, join_style="mitre")
+            stop_area = shapely.buffer(tile, limit + 2 * snap_distance, join_style="mitre")
+            stops = _within(destination_geometries, stop_area)
+            yield (
+                origin_position,
+                start_geometries.iloc[origin_position].reset_index(drop=True),
+                stops.reset_index(drop=True),
+                stops.index.to_numpy(),
+                None if network_gdf is None else _within(network_gdf, network_area),
+                gpd.GeoDataFrame(index=[0], crs=crs, geometry=[network_area]).to_crs(settings.default_crs),
+                transport_system,
+                maximum_distance,
+                engine,
+                verbose,
+            )
+
+    outputs = []
+    with tempfile.TemporaryDirectory(dir=scratch_directory) as scratch_root:
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=batch._init_worker, initargs=(scratch_root,)
+        ) as pool:
+            pending = set()
+            for task in tasks():
+                # keep the number of clipped tiles held in memory bounded
+                if len(pending) >= processes:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    outputs.extend(future.result() for future in done)
+                pending.add(pool.submit(_process_tile, *task))
+            outputs.extend(future.result() for future in wait(pending).done)
+
+    return _stitch(start_geometries, outputs)
+
+
+def _stitch(start_geometries, outputs):
+    # stitch the tiles, ids refer to the positions in the whole input again
+    outputs = [output for output in outputs if len(output)]
+    if outputs:
+        output = pd.concat(outputs, ignore_index=True).sort_values("o_id")
+    else:
+        output = pd.DataFrame(
+            {"o_id": np.empty(0, dtype=np.int64), "d_id": np.empty(0, dtype=np.int64), "distance_pt": np.empty(0)}
+        )
+    accessibility_output = start_geometries.iloc[output["o_id"].to_numpy()].reset_index()
+    accessibility_output["o_id"] = output["o_id"].to_numpy()
+    accessibility_output["d_id"] = output["d_id"].to_numpy()
+    accessibility_output["distance_pt"] = output["distance_pt"].to_numpy()
+    return accessibility_output
+
+
+def split_tiles(x, y, origins_per_tile=default_origins_per_tile):
+    """
+    Split the bounding box of points into quadtree tiles.
+
+    Tiles are half open, so points on a border belong to only one tile.
+
+    :param x: x coordinates
+    :type x: numpy.ndarray
+    :param y: y coordinates
+    :type y: numpy.ndarray
+    :param origins_per_tile: Maximum number of points of a tile
+    :type origins_per_tile: int
+    :return: bounds (minx, miny, maxx, maxy) and positions of the points of every non empty tile
+    :rtype: list of tuple
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(valid) == 0:
+        return []
+    tiles = []
+    stack = [((x[valid].min(), y[valid].min(), x[valid].max(), y[valid].max()), valid, 0)]
+    while stack:
+        (minx, miny, maxx, maxy), position, depth = stack.pop()
+        if len(position) <= origins_per_tile or depth >= maximum_depth:
+            tiles.append(((minx, miny, maxx, maxy), position))
+            continue
+        middle_x, middle_y = (minx + maxx) / 2, (miny + maxy) / 2
+        east = x[position] >= middle_x
+        north = y[position] >= middle_y
+        for quadrant, bounds in [
+            (~east & ~north, (minx, miny, middle_x, middle_y)),
+            (east & ~north, (middle_x, miny, maxx, middle_y)),
+            (~east & north, (minx, middle_y, middle_x, maxy)),
+            (east & north, (middle_x, middle_y, maxx, maxy)),
+        ]:
+            if quadrant.any():
+                stack.append((bounds, position[quadrant], depth + 1))
+    return tiles
+
+
+def _within(gdf, area):
+    # rows intersecting the area, in their original order
+    return gdf.iloc[np.sort(gdf.sindex.query(area, predicate="intersects"))]
+
+
+def _process_tile(
+    origin_position,
+    start_geometries,
+    destination_geometries,
+    destination_position,
+    network_gdf,
+    boundary,
+    transport_system,
+    maximum_distance,
+    engine,
+    verbose,
+):
+    columns = ["o_id", "d_id", "distance_pt"]
+    if len(destination_geometries) == 0:
+        return pd.DataFrame(columns=columns)
+    accessibility_output = accessibility.distance_to_closest(
+        start_geometries,
+        destination_geometries,
+        network_gdf=network_gdf,
+        boundary_geometries=boundary,
+        transport_system=transport_system,
+        maximum_distance=maximum_distance,
+        engine=engine,
+        verbose=verbose,
+    )
+    # origins and destinations are numbered from 0 within the tile
+    return pd.DataFrame(
+        {
+            "o_id": origin_position[accessibility_output["index"].to_numpy(dtype=np.int64)],
+            "d_id": destination_position[accessibility_output["d_id"].to_numpy(dtype=np.int64)],
+            "distance_pt": accessibility_output["distance_pt"].to_numpy(),
+        }
+    )
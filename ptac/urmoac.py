@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# coding:utf-8
+
+import logging
+import os
+import subprocess
+import threading
+from collections import deque
+
+import ptac.settings as settings
+
+"""Runs the UrMoAC router as a subprocess"""
+
+"""
+@name : urmoac.py
+@author : Simon Nieland, Serra Yosmaoglu
+@date : 26.07.2021
+@copyright : Institut fuer Verkehrsforschung, Deutsches Zentrum fuer Luft- und Raumfahrt
+"""
+
+logger = logging.getLogger(__name__)
+
+jar_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "urmoacjar", "UrMoAC.jar")
+
+# rough java heap needed per network edge and per origin or destination, used by heap_size
+heap_per_edge = 1024  # bytes
+heap_per_point = 512  # bytes
+heap_base = 512 * 1024**2  # bytes
+
+# number of output lines kept for the error message of a failed run
+error_lines = 50
+
+
+class UrMoACError(RuntimeError):
+    """
+    Raised if UrMoAC cannot be started, fails or exceeds its timeout.
+
+    :param message: description of the failure
+    :type message: str
+    :param returncode: exit code of the java process (None if it was not started or was killed)
+    :type returncode: int
+    :param output: last lines UrMoAC wrote to stdout and stderr
+    :type output: list of str
+    """
+
+    def __init__(self, message, returncode=None, output=None):
+        """Append the last output lines of UrMoAC to the message."""
+        self.returncode = returncode
+        self.output = [] if output is None else list(output)
+        if self.output:
+            message = message + "\n" + "\n".join(self.output)
+        super().__init__(message)
+
+
+def heap_size(number_of_edges, number_of_points):
+    """
+    Estimate the java heap UrMoAC needs for a request.
+
+    The estimate grows linearly with the network and the number of origins and destinations and is limited by
+    settings.urmoac_maximum_heap_size. A fixed settings.urmoac_heap_size is used as it is.
+
+    :param number_of_edges: number of network edges
+    :type number_of_edges: int
+    :param number_of_points: number of origins and destinations
+    :type number_of_points: int
+    :return: heap size in bytes
+    :rtype: int
+    """
+    if settings.urmoac_heap_size is not None:
+        return int(settings.urmoac_heap_size)
+    estimate = heap_base + heap_per_edge * number_of_edges + heap_per_point * number_of_points
+    return int(min(estimate, settings.urmoac_maximum_heap_size))
+
+
+def command(arguments, heap=None, java=None):
+    """
+    Build the command line of a UrMoAC run.
+
+    :param arguments: UrMoAC arguments, e.g. ["--from", "file;origins.csv", ...]
+    :type arguments: list of str
+    :param heap: java heap size in bytes (optional, settings.urmoac_maximum_heap_size if None)
+    :type heap: int
+    :param java: java executable (optional, settings.java if None)
+    :type java: str
+    :return: command line
+    :rtype: list of str
+    """
+    if heap is None:
+        heap = settings.urmoac_maximum_heap_size
+    if java is None:
+        java = settings.java
+    # the heap is given in whole megabytes
+    return [java, f"-Xmx{max(1, -(-int(heap) // 1024**2))}m", "-jar", jar_file] + [str(a) for a in arguments]
+
+
+def run(arguments, heap=None, timeout=None, callback=None):
+    """
+    Run UrMoAC and wait for it to finish.
+
+    Every line UrMoAC writes to stdout or stderr is logged to the "ptac.urmoac" logger at debug level and
+    passed to the callback while the process is running.
+
+    :param arguments: UrMoAC arguments (see command)
+    :type arguments: list of str
+    :param heap: java heap size in bytes (optional, settings.urmoac_maximum_heap_size if None)
+    :type heap: int
+    :param timeout: seconds after which UrMoAC is killed (optional, settings.urmoac_timeout if None)
+    :type timeout: float
+    :param callback: Function called with every output line (optional)
+    :type callback: callable
+    :return: exit code of UrMoAC (always 0)
+    :rtype: int
+    """
+    if timeout is None:
+        timeout = settings.urmoac_timeout
+    args = command(arguments, heap=heap)
+    logger.debug("starting %s", " ".join(args))
+    try:
+        process = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            errors="replace",
+        )
+    except OSError as e:
+        raise UrMoACError(f"UrMoAC could not be started: {e}") from e
+
+    output = deque(maxlen=error_lines)
+
+    def read():
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            output.append(line)
+            logger.debug(line)
+            if callback is not None:
+                callback(line)
+
+    # the output is read while waiting, so that a full pipe never blocks UrMoAC
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    try:
+        returncode = process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        reader.join()
+        raise UrMoACError(f"UrMoAC did not finish within {timeout} seconds", output=output) from None
+    reader.join()
+    process.stdout.close()
+    if returncode != 0:
+        raise UrMoACError(f"UrMoAC failed with exit code {returncode}", returncode=returncode, output=output)
+    return returncode
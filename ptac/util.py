@@ -3,7 +3,7 @@
 
 import math
 
-from pyproj import CRS
+from pyproj import CRS, Transformer
 
 import ptac.settings as settings
 
@@ -42,6 +42,8 @@ def project_gdf(gdf, geom_col="geometry", to_crs=None, to_latlong=False):
 
     # if to_crs was passed-in, use this value to project the gdf
     if to_crs is not None:
+        if gdf.crs is not None and gdf.crs == CRS.from_user_input(to_crs):
+            return gdf
         projected_gdf = gdf.to_crs(to_crs)
 
     # if to_crs was not passed-in, calculate the centroid of the geometry to
@@ -58,17 +60,40 @@ def project_gdf(gdf, geom_col="geometry", to_crs=None, to_latlong=False):
             if (gdf.crs is not None) and (gdf.crs.is_geographic is False):
                 return gdf
 
-            # calculate the centroid of the union of all the geometries in the
-            # GeoDataFrame
-            avg_longitude = gdf[geom_col].unary_union.centroid.x
-
-            # calculate the UTM zone from this avg longitude and define the UTM
-            # CRS to project
-            utm_zone = int(math.floor((avg_longitude + 180) / 6.0) + 1)
-            utm_crs = f"+proj = utm + datum = WGS84 + ellps = WGS84 + zone = {utm_zone} + units = m + type = crs"
-            crs = CRS.from_proj4(utm_crs)
-            epsg = crs.to_epsg()
-            projected_gdf = gdf.to_crs(epsg)
+            projected_gdf = gdf.to_crs(utm_crs(gdf, geom_col=geom_col))
 
     projected_gdf.gdf_name = gdf.gdf_name
     return projected_gdf
+
+
+def utm_crs(gdf, geom_col="geometry"):
+    """
+    Determine the UTM zone appropriate for the centre of the bounds of a GeoDataFrame.
+
+    Only the bounds are used, so no union of the geometries has to be built. If the GeoDataFrame is already
+    projected in a UTM zone, its crs is returned.
+
+    :param gdf: the gdf to find the UTM zone for
+    :type gdf: Geopandas.GeoDataFrame
+    :return crs: crs of the UTM zone
+    :rtype crs: pyproj.CRS
+    """
+    if gdf.crs is not None and _is_utm(gdf.crs):
+        return gdf.crs
+
+    minx, miny, maxx, maxy = gdf[geom_col].total_bounds
+    if gdf.crs is not None and not gdf.crs.is_geographic:
+        transformer = Transformer.from_crs(gdf.crs, settings.default_crs, always_xy=True)
+        minx, miny, maxx, maxy = transformer.transform_bounds(minx, miny, maxx, maxy)
+    avg_longitude = (minx + maxx) / 2
+
+    # calculate the UTM zone from this avg longitude and define the UTM
+    # CRS to project
+    utm_zone = int(math.floor((avg_longitude + 180) / 6.0) + 1)
+    utm_crs = f"+proj = utm + datum = WGS84 + ellps = WGS84 + zone = {utm_zone} + units = m + type = crs"
+    return CRS.from_epsg(CRS.from_proj4(utm_crs).to_epsg())
+
+
+def _is_utm(crs):
+    operation = crs.coordinate_operation
+    return operation is not None and operation.name.startswith("UTM zone")
@@ -1,4 +1,3 @@
-
 """
 PtAC setup script.
 
@@ -14,6 +13,7 @@ def readme():
     with open("README.md") as f:
         return f.read()
 
+
 # only specify install_requires if not in RTD environment
 if os.getenv("READTHEDOCS") == "True":
     INSTALL_REQUIRES = []
@@ -34,6 +34,7 @@ setup(
     include_package_data=True,
     python_requires=">=3.8",
     install_requires=INSTALL_REQUIRES,
+    extras_require={"pbf": ["osmium>=4.0"]},
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Programming Language :: Python :: 3",
@@ -2,14 +2,36 @@
 Unit tests for PtAC library
 """
 
+import importlib.util
+import os
 import pathlib
 import sys
-import unittest
+import tempfile
 import time
+import unittest
+
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import box
 
 import ptac.accessibility as accessibility
+import ptac.aggregation as aggregation
+import ptac.batch as batch
+import ptac.cache as cache
+import ptac.catchment as catchment
+import ptac.gtfs as gtfs
+import ptac.network as network
+import ptac.origins as origins
+import ptac.osm as osm
 import ptac.population as population
+import ptac.profiling as profiling
+import ptac.routing as routing
+import ptac.session as session
+import ptac.settings as settings
+import ptac.tiling as tiling
+import ptac.urmoac as urmoac
 import ptac.util as util
 
 
@@ -25,6 +47,38 @@ class PtACTest(unittest.TestCase):
         self.raster = self.data_path + "/input_data/raster_test.tif"
         self.timestamp = int(round(time.time()))
 
+    def write_feed(self, folder):
+        # buses serve the low-capacity stops on weekdays at 7, the subway the high-capacity stops at 8
+        # and on sundays at 7
+        stops = [(f"low{i}", p) for i, p in enumerate(self.pt_low.geometry)] + [
+            (f"high{i}", p) for i, p in enumerate(self.pt_high.geometry)
+        ]
+        tables = {
+            "stops.txt": ["stop_id,stop_name,stop_lat,stop_lon,location_type"]
+            + [f"{stop_id},{stop_id},{p.y},{p.x},0" for stop_id, p in stops]
+            + ["station,station,52.5,13.4,1"],
+            "routes.txt": ["route_id,route_type", "bus,3", "subway,1"],
+            "trips.txt": [
+                "route_id,service_id,trip_id",
+                "bus,weekday,bus1",
+                "subway,weekday,sub1",
+                "subway,sunday,sub2",
+            ],
+            "calendar.txt": [
+                "service_id,monday,tuesday,wednesday,thursday,friday,saturday,sunday,start_date,end_date",
+                "weekday,1,1,1,1,1,0,0,20200101,20201231",
+                "sunday,0,0,0,0,0,0,1,20200101,20201231",
+            ],
+            "stop_times.txt": ["trip_id,arrival_time,departure_time,stop_id,stop_sequence"]
+            + [f"bus1,07:1{i}:00,07:1{i}:00,low{i},{i}" for i in range(len(self.pt_low))]
+            + [f"sub1,08:1{i}:00,,high{i},{i}" for i in range(len(self.pt_high))]
+            + [f"sub2,07:3{i}:00,07:3{i}:00,high{i},{i}" for i in range(len(self.pt_high))],
+        }
+        for name, lines in tables.items():
+            with open(f"{folder}/{name}", "w") as f:
+                f.write("\n".join(lines) + "\n")
+        return folder
+
     def test_prepare_network(self):
         self.set_up()
         df_prepare_network = accessibility.prepare_network(
@@ -59,7 +113,6 @@ class PtACTest(unittest.TestCase):
         accessibility.clear_directory()
         self.assertEqual(diff_columns, 0)
 
-
     def test_dist_to_closest_max_dist(self):
         self.set_up()
         df_accessibility = accessibility.distance_to_closest(
@@ -108,6 +161,589 @@ class PtACTest(unittest.TestCase):
         elif sys.platform.startswith("macos"):
             self.assertEqual(round(value), 218)
 
+    def test_dist_to_closest_native(self):
+        self.set_up()
+        df_accessibility = accessibility.distance_to_closest(
+            self.pop,
+            self.pt,
+            network_gdf=self.net,
+            maximum_distance=50,
+            engine="native",
+        )
+        self.assertEqual(len(df_accessibility), 25)
+        self.assertEqual(round(df_accessibility["pop"].sum()), 227)
+        self.assertEqual(set(df_accessibility["d_id"]) - set(range(len(self.pt))), set())
+
+    def test_bounded_routing(self):
+        self.set_up()
+        network_gdf = accessibility._prepare_edges(util.project_gdf(self.net))
+        start_geometries = util.project_gdf(self.pop, to_crs=network_gdf.crs)
+        destination_geometries = util.project_gdf(self.pt.iloc[:2], to_crs=network_gdf.crs)
+        unbounded = accessibility.route_native(start_geometries, destination_geometries, network_gdf)
+        profiler = profiling.Profiler()
+        bounded = accessibility.route_native(
+            start_geometries, destination_geometries, network_gdf, maximum_distance=40, prune=True, profiler=profiler
+        )
+        # the search stops at the maximum distance, pruning does not change the result
+        self.assertIn("prune_network", profiler.to_frame()["stage"].tolist())
+        expected = unbounded[unbounded["distance_pt"] <= 40]
+        self.assertEqual(bounded["o_id"].tolist(), expected["o_id"].tolist())
+        self.assertAlmostEqual(bounded["distance_pt"].sum(), expected["distance_pt"].sum(), places=6)
+
+    def test_pruned_routing_off_street_stop(self):
+        # a straight street of 10 m edges and a stop 45 m off the street
+        x = np.arange(0, 1000, 10.0)
+        network_gdf = gpd.GeoDataFrame(
+            {
+                "index": np.arange(len(x)),
+                "fromnode": np.arange(len(x)),
+                "tonode": np.arange(len(x)) + 1,
+                "mode_walk": True,
+                "length": 10.0,
+            },
+            geometry=shapely.linestrings(np.stack([np.stack([x, x + 10], axis=1), np.zeros((len(x), 2))], axis=2)),
+            crs=32633,
+        )
+        destination_geometries = gpd.GeoDataFrame(geometry=[shapely.Point(500, 45)], crs=32633)
+        # the first origin lies 30 m off the street, but only 40 m along it from the stop
+        start_geometries = gpd.GeoDataFrame(
+            geometry=[shapely.Point(540, -30), shapely.Point(510, 1), shapely.Point(800, 1)], crs=32633
+        )
+        unpruned = accessibility.route_native(
+            start_geometries, destination_geometries, network_gdf, maximum_distance=50
+        )
+        pruned = accessibility.route_native(
+            start_geometries, destination_geometries, network_gdf, maximum_distance=50, prune=True
+        )
+        self.assertEqual(unpruned["o_id"].tolist(), [0, 1])
+        self.assertEqual(pruned["o_id"].tolist(), unpruned["o_id"].tolist())
+        np.testing.assert_allclose(pruned["distance_pt"], unpruned["distance_pt"])
+
+    def test_network_index_snap(self):
+        self.set_up()
+        pop = util.project_gdf(self.pop)
+        net = util.project_gdf(self.net, to_crs=pop.crs)
+        network_index = accessibility.NetworkIndex(accessibility._prepare_edges(net))
+        edge, offset, access_distance = network_index.snap(pop)
+        self.assertEqual(len(edge), len(pop))
+        self.assertTrue((edge >= 0).all())
+        self.assertTrue(((offset >= 0) & (offset <= network_index.edge_length[edge] + 1e-9)).all())
+        # the access distance is the distance to the closest edge
+        closest = net.geometry.distance(pop.geometry.iloc[0]).min()
+        self.assertAlmostEqual(access_distance[0], closest, places=6)
+
+    def test_scratch_files_are_reused(self):
+        self.set_up()
+        pop = util.project_gdf(self.pop)
+        path = accessibility.prepare_origins_and_destinations(pop, od="origin")
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(accessibility.prepare_origins_and_destinations(pop.copy(), od="origin"), path)
+        self.assertNotEqual(accessibility.prepare_origins_and_destinations(pop.iloc[1:], od="origin"), path)
+
+    def test_network_cache(self):
+        self.set_up()
+        network_gdf = accessibility._prepare_edges(util.project_gdf(self.net))
+        key = cache.network_key(self.boundary)
+        self.assertNotEqual(key, cache.network_key(self.boundary, network_type="drive"))
+        with tempfile.TemporaryDirectory() as folder:
+            self.assertIsNone(cache.load_network(key, folder=folder))
+            cache.store_network(key, network_gdf, folder=folder)
+            cached = cache.load_network(key, folder=folder)
+            self.assertEqual(len(cached), len(network_gdf))
+            self.assertEqual(cached.crs, network_gdf.crs)
+            # a limit smaller than one entry evicts everything
+            cache.evict(folder=folder, size_limit=0)
+            self.assertEqual(os.listdir(folder), [])
+
+    def test_compact_network(self):
+        self.set_up()
+        network_gdf = accessibility._prepare_edges(util.project_gdf(self.net))
+        compact = network.PtacNetwork.from_gdf(network_gdf)
+        with tempfile.TemporaryDirectory() as folder:
+            compact.save(f"{folder}/network.ptac")
+            loaded = network.PtacNetwork.load(f"{folder}/network.ptac")
+            self.assertEqual(loaded.number_of_edges, len(network_gdf))
+            self.assertEqual(loaded.crs, network_gdf.crs)
+            self.assertEqual(loaded.edge_from.dtype, "int32")
+            self.assertEqual(loaded.length.dtype, "float32")
+            self.assertEqual(loaded.mode_mask("mode_walk").sum(), network_gdf["mode_walk"].eq(True).sum())
+            self.assertEqual(loaded.indptr[-1], loaded.number_of_edges)
+            # the osm network holds one edge per direction of travel
+            self.assertTrue(loaded.directed)
+            self.assertFalse(network.PtacNetwork.from_gdf(network_gdf.drop(columns="oneway")).directed)
+            # routing on the compact network gives the distances of the GeoDataFrame
+            expected = accessibility.distance_to_closest(self.pop, self.pt, network_gdf=self.net, engine="native")
+            output = accessibility.distance_to_closest(self.pop, self.pt, network_gdf=loaded, engine="native")
+            self.assertAlmostEqual(output["distance_pt"].sum(), expected["distance_pt"].sum(), places=2)
+
+    @unittest.skipIf(importlib.util.find_spec("osmium") is None, "pyosmium is not installed")
+    def test_network_from_pbf(self):
+        extract = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="52.5000" lon="13.4000"/>
+  <node id="2" lat="52.5000" lon="13.4010"/>
+  <node id="3" lat="52.5010" lon="13.4010"/>
+  <node id="4" lat="52.5020" lon="13.4010"/>
+  <node id="5" lat="52.5020" lon="13.4020"/>
+  <node id="6" lat="52.5030" lon="13.4020"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><tag k="highway" v="motorway"/></way>
+  <way id="12"><nd ref="2"/><nd ref="4"/><tag k="building" v="yes"/></way>
+  <way id="13"><nd ref="4"/><nd ref="5"/><tag k="highway" v="residential"/><tag k="junction" v="roundabout"/></way>
+  <way id="14">
+    <nd ref="5"/><nd ref="6"/>
+    <tag k="highway" v="residential"/><tag k="oneway" v="yes"/><tag k="oneway:bicycle" v="no"/>
+  </way>
+</osm>
+"""
+        with tempfile.TemporaryDirectory() as folder:
+            path = f"{folder}/extract.osm"
+            with open(path, "w") as f:
+                f.write(extract)
+            walk = osm.get_network_from_pbf(path, network_type="walk")
+            bike = osm.get_network_from_pbf(path, network_type="bike")
+            drive = osm.get_network_from_pbf(path, network_type="drive")
+            everything = osm.get_network_from_pbf(path, network_type="all")
+        # the motorway is closed for pedestrians, walk networks contain both directions of every edge
+        self.assertEqual(len(walk), 8)
+        self.assertEqual(set(walk["highway"]), {"residential"})
+        self.assertFalse(walk["oneway"].any())
+        # motorways and roundabouts are one-way without a oneway tag, bikes may ride against the one-way street
+        self.assertEqual(sorted(drive.index.droplevel("key")), [(1, 2), (2, 1), (2, 3), (3, 2), (3, 4), (4, 5), (5, 6)])
+        self.assertEqual(sorted(bike.index.droplevel("key")), [(1, 2), (2, 1), (2, 3), (3, 2), (4, 5), (5, 6), (6, 5)])
+        self.assertTrue(bike.loc[(4, 5, 0), "oneway"])
+        # the network of all modes tells which mode may travel every edge in its direction
+        self.assertEqual(len(everything), 9)
+        self.assertNotIn((4, 3, 0), everything.index)
+        modes = ["mode_walk", "mode_bike", "mode_mit"]
+        self.assertEqual(everything.loc[(5, 4, 0), modes].tolist(), [True, False, False])
+        self.assertEqual(everything.loc[(6, 5, 0), modes].tolist(), [True, True, False])
+        self.assertAlmostEqual(walk.loc[(1, 2, 0), "length"], 67.8, delta=0.5)
+        self.assertEqual(walk.crs, "epsg:4326")
+        prepared = accessibility.prepare_network(network_gdf=walk.to_crs(32633))
+        self.assertEqual(len(prepared), 8)
+        prepared = accessibility._prepare_edges(everything.to_crs(32633)).set_index(["fromnode", "tonode"])
+        self.assertEqual(prepared.loc[(6, 5), modes].tolist(), [True, True, False])
+
+    def test_batch_sdg(self):
+        self.set_up()
+        xmin, ymin, xmax, ymax = self.pop.total_bounds
+        xmid = (xmin + xmax) / 2
+        cities = gpd.GeoDataFrame(
+            {"name": ["west", "east"]},
+            crs=self.pop.crs,
+            geometry=[
+                box(xmin - 1e-4, ymin - 1e-4, xmid, ymax + 1e-4),
+                box(xmid, ymin - 1e-4, xmax + 1e-4, ymax + 1e-4),
+            ],
+        )
+        result = batch.calculate_sdg_batch(
+            cities,
+            self.pop,
+            self.pt_low,
+            self.pt_high,
+            network_gdf=self.net,
+            id_column="name",
+            processes=2,
+            engine="native",
+        )
+        self.assertEqual(sorted(result.index), ["east", "west"])
+        self.assertTrue(result["error"].isna().all())
+        self.assertTrue(((result["sdg"] >= result["sdg_low"]) & (result["sdg"] >= result["sdg_high"])).all())
+
+    def test_tiled_distance(self):
+        self.set_up()
+        stops = self.pt.iloc[:3]
+        monolithic = accessibility.distance_to_closest(
+            self.pop, stops, network_gdf=self.net, maximum_distance=50, engine="native"
+        )
+        tiled = tiling.distance_to_closest_tiled(
+            self.pop,
+            stops,
+            network_gdf=self.net,
+            maximum_distance=50,
+            origins_per_tile=3,
+            snap_distance=20,
+            processes=2,
+            engine="native",
+        )
+        points = self.pop.geometry
+        self.assertGreater(len(tiling.split_tiles(points.x, points.y, 3)), 4)
+        self.assertLess(len(monolithic), len(self.pop))
+        self.assertEqual(tiled["o_id"].tolist(), monolithic["o_id"].tolist())
+        self.assertEqual(tiled["d_id"].tolist(), monolithic["d_id"].tolist())
+        self.assertAlmostEqual(
+            accessibility.calculate_sdg(self.pop, tiled, "pop"),
+            accessibility.calculate_sdg(self.pop, monolithic, "pop"),
+        )
+        # without origins or without stops near any tile nothing is accessible, the columns stay the same
+        distant_stops = gpd.GeoDataFrame(geometry=stops.translate(1, 0), crs=stops.crs)
+        for start_geometries, destinations in [
+            (self.pop.iloc[:0], stops),
+            (self.pop, stops.iloc[:0]),
+            (self.pop, distant_stops),
+        ]:
+            empty = tiling.distance_to_closest_tiled(
+                start_geometries, destinations, network_gdf=self.net, maximum_distance=50, processes=1, engine="native"
+            )
+            self.assertEqual(len(empty), 0)
+            self.assertEqual(list(empty.columns), list(tiled.columns))
+            self.assertEqual(empty["o_id"].dtype, np.int64)
+
+    def test_urmoac_runner(self):
+        self.assertLess(urmoac.heap_size(10, 10), urmoac.heap_size(10**6, 10**6))
+        self.assertEqual(urmoac.heap_size(10**9, 10**9), settings.urmoac_maximum_heap_size)
+        request = accessibility.build_request(32633, 1, 20200915, 35580, 1, heap_size=2 * 1024**3)
+        self.assertIn("-Xmx2048m", request)
+        # python rejects the java options, so the run fails with its usage message
+        java, settings.java = settings.java, sys.executable
+        lines = []
+        try:
+            with self.assertRaises(urmoac.UrMoACError) as context:
+                urmoac.run(["--help"], heap=1024**3, timeout=60, callback=lines.append)
+        finally:
+            settings.java = java
+        self.assertNotEqual(context.exception.returncode, 0)
+        self.assertTrue(lines)
+        error_lines = urmoac.error_lines
+        self.assertEqual(context.exception.output, lines[-error_lines:])
+
+    def test_aggregation(self):
+        self.set_up()
+        accessibility_output = accessibility.distance_to_closest(
+            self.pop, self.pt.iloc[:3], network_gdf=self.net, maximum_distance=50, engine="native"
+        )
+        distance = accessibility.distance_to_closest(
+            self.pop, self.pt.iloc[:3], network_gdf=self.net, engine="native", geodataframe=False
+        )
+        population = self.pop["pop"].to_numpy()
+        self.assertEqual(len(distance), len(self.pop))
+        self.assertAlmostEqual(
+            aggregation.calculate_sdg(population, distance, 50),
+            accessibility.calculate_sdg(self.pop, accessibility_output, "pop"),
+        )
+        curve = aggregation.threshold_curve(population, distance, [0, 50, 1e9])
+        self.assertAlmostEqual(curve[50], aggregation.calculate_sdg(population, distance, 50))
+        self.assertAlmostEqual(curve[1e9], 1.0)
+        self.assertTrue(curve.is_monotonic_increasing)
+        # two destination sets, a starting point is accessible if it lies within either maximum distance
+        both = aggregation.calculate_sdg(population, np.column_stack([distance, np.full(len(distance), 10.0)]), [50, 5])
+        self.assertAlmostEqual(both, aggregation.calculate_sdg(population, distance, 50))
+
+        zones = np.where(np.arange(len(population)) % 2 == 0, "even", "odd")
+        by_zone = aggregation.zone_sdg(population, distance, zones, 50)
+        self.assertEqual(list(by_zone.index), ["even", "odd"])
+        self.assertAlmostEqual(by_zone["population"].sum(), population.sum())
+        self.assertAlmostEqual(
+            by_zone["accessible_population"].sum() / population.sum(),
+            aggregation.calculate_sdg(population, distance, 50),
+        )
+
+    def test_distance_curve(self):
+        rng = np.random.default_rng(0)
+        population = rng.integers(1, 100, 1000).astype(float)
+        distance = rng.uniform(0, 3000, 1000)
+        distance[:50] = np.inf
+        zones = rng.choice(["a", "b", "c"], 1000)
+        thresholds = list(range(100, 2001, 100))
+        curve = aggregation.DistanceCurve(population, distance)
+        share = curve.share(thresholds)
+        for threshold in [100, 500, 2000]:
+            self.assertAlmostEqual(share[threshold], aggregation.calculate_sdg(population, distance, threshold))
+        self.assertTrue(np.allclose(share.to_numpy(), aggregation.threshold_curve(population, distance, thresholds)))
+
+        by_zone = aggregation.DistanceCurve(population, distance, zones).share(thresholds)
+        self.assertEqual(list(by_zone.index), ["a", "b", "c"])
+        expected = [aggregation.calculate_sdg(population[zones == z], distance[zones == z], 500) for z in "abc"]
+        self.assertTrue(np.allclose(by_zone[500].to_numpy(), expected))
+
+    def test_distance_matrix(self):
+        self.set_up()
+        od_matrix = accessibility.distance_matrix(self.pop, self.pt, network_gdf=self.net, maximum_distance=200)
+        nearest = accessibility.distance_matrix(self.pop, self.pt, network_gdf=self.net, maximum_distance=200, k=1)
+        closest = accessibility.distance_to_closest(
+            self.pop, self.pt, network_gdf=self.net, maximum_distance=200, engine="native"
+        ).sort_values("o_id")
+        self.assertEqual(od_matrix.to_csr().shape, (len(self.pop), len(self.pt)))
+        self.assertTrue((od_matrix.distance <= 200).all())
+        self.assertGreater(od_matrix.number_of_pairs, nearest.number_of_pairs)
+        # with k=1 only the closest destination of every origin is left, which comes first in every row
+        origin, _, distance = nearest.to_coo()
+        self.assertEqual(origin.tolist(), closest["o_id"].tolist())
+        self.assertTrue(np.allclose(distance, closest["distance_pt"]))
+        reached = np.diff(od_matrix.indptr) > 0
+        self.assertTrue(np.allclose(od_matrix.distance[od_matrix.indptr[:-1][reached]], distance))
+        self.assertEqual(list(od_matrix.to_frame().columns), ["o_id", "d_id", "distance_pt"])
+        # the graph is built once and reused by every chunk of destinations, one destination per chunk here
+        ring = (np.array([0, 1, 2, 3]), np.array([1, 2, 3, 0]), np.array([10.0, 20.0, 30.0, 40.0]))
+        positions = (np.array([0, 2]), np.array([5.0, 10.0]), np.array([1, 3, 3]), np.array([0.0, 15.0, 40.0]))
+        whole = routing.destinations_within(*ring, *positions, limit=50)
+        chunked = routing.destinations_within(*ring, *positions, limit=50, chunk_memory=1)
+        for expected, result in zip(whole, chunked):
+            np.testing.assert_allclose(result, expected)
+        self.assertEqual(len(whole[0]), 6)
+
+    def test_stop_catchments(self):
+        self.set_up()
+        stops = self.pt.iloc[:3]
+        catchments = catchment.stop_catchments(stops, network_gdf=self.net, maximum_distance=50, buffer=40)
+        self.assertEqual(list(catchments.index), list(stops.index))
+        self.assertTrue(catchments.is_valid.all() and (catchments.area > 0).all())
+        # all origins routed to a stop within the maximum distance lie within 40 m of its catchment streets
+        accessibility_output = accessibility.distance_to_closest(
+            self.pop, stops, network_gdf=self.net, maximum_distance=50, engine="native"
+        )
+        area = catchment.dissolve_catchments(catchments, by=None).geometry.iloc[0]
+        origins = util.project_gdf(self.pop, to_crs=catchments.crs).iloc[accessibility_output["o_id"]]
+        self.assertTrue(origins.within(area).all())
+
+        low = catchment.stop_catchments(self.pt_low, network_gdf=self.net, transport_system="low-capacity")
+        high = catchment.stop_catchments(
+            self.pt_high, network_gdf=self.net, transport_system="high-capacity", method="concave_hull"
+        )
+        dissolved = catchment.dissolve_catchments(pd.concat([low, high]))
+        self.assertEqual(list(dissolved.index), ["high-capacity", "low-capacity"])
+
+        # cut streets keep the length between the cuts
+        line = shapely.LineString([(0, 0), (10, 0), (10, 10)])
+        parts = catchment._substrings(np.array([line, line]), np.array([0.25, 0.0]), np.array([0.75, 0.4]))
+        self.assertEqual(shapely.get_coordinates(parts[0]).tolist(), [[5, 0], [10, 0], [10, 5]])
+        self.assertAlmostEqual(parts[1].length, 8)
+
+    def test_calculate_sdg_raster(self):
+        self.set_up()
+        stops = self.pt.iloc[:3]
+        population_points = population.raster_to_points(self.raster)
+        for maximum_distance in [20, 50]:
+            accessibility_output = accessibility.distance_to_closest(
+                population_points, stops, network_gdf=self.net, maximum_distance=maximum_distance, engine="native"
+            )
+            self.assertAlmostEqual(
+                accessibility.calculate_sdg_raster(
+                    self.raster, stops, network_gdf=self.net, maximum_distance=maximum_distance
+                ),
+                accessibility.calculate_sdg(population_points, accessibility_output, "pop"),
+                places=5,
+            )
+        sdg = accessibility.calculate_sdg_raster(
+            self.raster, stops, network_gdf=self.net, maximum_distance=50, clip=box(0, 0, 1, 1)
+        )
+        self.assertTrue(np.isnan(sdg))
+
+        # the catchments cover every cell, only half of the cells lie within the box
+        catchments = catchment.stop_catchments(stops, network_gdf=self.net, maximum_distance=100, buffer=100)
+        self.assertAlmostEqual(catchment.calculate_sdg_catchments(self.raster, catchments), 1.0)
+        # without population in the clip area there is no indicator
+        self.assertTrue(np.isnan(catchment.calculate_sdg_catchments(self.raster, catchments, clip=box(0, 0, 1, 1))))
+        xmin, ymin, xmax, ymax = population_points.total_bounds
+        zones = gpd.GeoDataFrame(geometry=[box(xmin - 1e-6, ymin - 1e-6, xmax + 1e-6, (ymin + ymax) / 2)], crs=4326)
+        sums, total = population.zonal_sum(self.raster, zones)
+        expected = population_points.loc[population_points["Y"] < (ymin + ymax) / 2, "pop"].sum()
+        self.assertAlmostEqual(sums.iloc[0], expected, places=2)
+        self.assertAlmostEqual(total, population_points["pop"].sum(), places=2)
+
+    def test_aggregate_origins(self):
+        self.set_up()
+        stops = self.pt.iloc[:3]
+        exact = accessibility.distance_to_closest(
+            self.pop, stops, network_gdf=self.net, engine="native", geodataframe=False
+        )
+        by_node = origins.aggregate_by_node(self.pop, self.net)
+        self.assertLess(len(by_node.origins), len(self.pop))
+        self.assertAlmostEqual(by_node.origins["pop"].sum(), self.pop["pop"].sum(), places=3)
+        routed = accessibility.distance_to_closest(by_node.origins, stops, network_gdf=self.net, engine="native")
+        broadcast = by_node.broadcast(routed)
+        # the broadcast distance is a real path, at most the error bound longer than the routed one
+        self.assertTrue((broadcast["distance_pt"] >= exact - 1e-6).all())
+        self.assertTrue((broadcast["distance_pt"] - exact <= broadcast["distance_error"] + 1e-6).all())
+
+        by_grid = origins.aggregate_by_grid(self.pop, 50)
+        self.assertLess(len(by_grid.origins), len(self.pop))
+        self.assertEqual(len(by_grid.broadcast(np.zeros(len(by_grid.origins)))), len(self.pop))
+        self.assertTrue((by_grid.error <= 50 * np.sqrt(2)).all())
+
+    def test_nearest_destination(self):
+        # path 0 - 1 - 2 with one destination in the middle of the second edge
+        distance, destination = routing.nearest_destination(
+            edge_from=[0, 1],
+            edge_to=[1, 2],
+            edge_length=[10.0, 10.0],
+            origin_edge=[0, 1, 1],
+            origin_offset=[2.0, 9.0, 1.0],
+            destination_edge=[1],
+            destination_offset=[5.0],
+        )
+        self.assertEqual(list(distance), [13.0, 4.0, 4.0])
+        self.assertEqual(list(destination), [0, 0, 0])
+
+    def test_profiler_stages(self):
+        self.set_up()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "profile.jsonl")
+            profiler = profiling.Profiler(path=path)
+            accessibility.distance_to_closest(
+                self.pop, self.pt, network_gdf=self.net, engine="native", profiler=profiler
+            )
+            stages = profiler.to_frame()
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), len(stages))
+        self.assertEqual(
+            list(stages["stage"]),
+            ["project_gdf", "prepare_network", "network_index", "snap", "router", "merge", "subset_result"],
+        )
+        self.assertTrue((stages["wall_time"] >= 0).all())
+        self.assertEqual(stages.set_index("stage").loc["subset_result", "rows"], len(self.pop))
+
+    def test_dist_to_closest_sets(self):
+        self.set_up()
+        df_accessibility = accessibility.distance_to_closest_sets(
+            self.pop,
+            {"low": (self.pt_low, "low-capacity"), "high": (self.pt_high, 10)},
+            network_gdf=self.net,
+        )
+        df_low = accessibility.distance_to_closest(self.pop, self.pt_low, network_gdf=self.net, engine="native")
+        self.assertEqual(len(df_accessibility), len(self.pop))
+        self.assertEqual(list(df_accessibility["distance_low"].round(6)), list(df_low["distance_pt"].round(6)))
+        accessible = (df_accessibility["distance_low"] <= 500) | (df_accessibility["distance_high"] <= 10)
+        self.assertTrue((df_accessibility["accessible"] == accessible).all())
+        # no set is searched beyond the largest maximum distance, empty sets reach nothing
+        df_bounded = accessibility.distance_to_closest_sets(
+            self.pop,
+            {"low": (self.pt_low, 20), "none": (self.pt_high.iloc[:0], 500)},
+            network_gdf=self.net,
+        )
+        self.assertTrue(df_bounded["distance_none"].isna().all())
+        self.assertEqual(df_bounded["accessible"].sum(), (df_accessibility["distance_low"] <= 20).sum())
+
+    def test_distance_to_closest_modes(self):
+        self.set_up()
+        df_modes = accessibility.distance_to_closest_modes(
+            self.pop, self.pt, modes=["mode_walk", "mode_bike", "mode_mit"], network_gdf=self.net
+        )
+        df_walk = accessibility.distance_to_closest(self.pop, self.pt, network_gdf=self.net, engine="native")
+        self.assertEqual(list(df_modes["distance_walk"].round(6)), list(df_walk["distance_pt"].round(6)))
+        # walking is not limited by any street type, cycling is faster
+        np.testing.assert_allclose(df_modes["time_walk"], df_modes["distance_walk"] / (5 / 3.6))
+        self.assertTrue((df_modes["time_bike"] < df_modes["time_walk"]).all())
+        # cars may not use service roads and drive at the vmax of the street type
+        self.assertTrue(self.net["highway"].eq("service").any())
+        self.assertTrue(df_modes["time_mit"].notna().all())
+        # the maximum time is given in seconds
+        bounded = accessibility.distance_to_closest_modes(
+            self.pop, self.pt, modes=["mode_walk"], network_gdf=self.net, maximum_time=10
+        )
+        self.assertEqual(bounded["time_walk"].notna().sum(), (df_modes["time_walk"] <= 10).sum())
+        with self.assertRaises(ValueError):
+            accessibility.distance_to_closest_modes(self.pop, self.pt, modes=["mode_fly"], network_gdf=self.net)
+
+    def test_one_way_streets(self):
+        # a one-way street from node 0 to node 1 and a detour of 300 m back, passable in both directions
+        network_gdf = gpd.GeoDataFrame(
+            {
+                "u": [0, 1, 2, 2, 0],
+                "v": [1, 2, 1, 0, 2],
+                "highway": "residential",
+                "oneway": [True, False, False, False, False],
+                "length": [100.0, 150.0, 150.0, 150.0, 150.0],
+            },
+            geometry=[
+                shapely.LineString([(0, 0), (100, 0)]),
+                shapely.LineString([(100, 0), (50, 200)]),
+                shapely.LineString([(50, 200), (100, 0)]),
+                shapely.LineString([(50, 200), (0, 0)]),
+                shapely.LineString([(0, 0), (50, 200)]),
+            ],
+            crs=32633,
+        )
+        stop = gpd.GeoDataFrame(geometry=[shapely.Point(5, -1)], crs=32633)
+        origin = gpd.GeoDataFrame(geometry=[shapely.Point(95, -1)], crs=32633)
+        df_modes = accessibility.distance_to_closest_modes(
+            origin, stop, modes=["mode_walk", "mode_mit"], network_gdf=network_gdf
+        )
+        # pedestrians walk back along the one-way street, cars take the detour
+        self.assertAlmostEqual(df_modes["distance_walk"].iloc[0], 90)
+        self.assertAlmostEqual(df_modes["distance_mit"].iloc[0], 310)
+        self.assertAlmostEqual(df_modes["time_mit"].iloc[0], 310 / (50 / 3.6))
+        # the other way round the one-way street is the shortest way for cars as well
+        df_modes = accessibility.distance_to_closest_modes(
+            stop, origin, modes=["mode_walk", "mode_mit"], network_gdf=network_gdf
+        )
+        self.assertAlmostEqual(df_modes["distance_mit"].iloc[0], 90)
+
+        # one edge per street without oneway column carries no direction, bikes ride both ways
+        street = gpd.GeoDataFrame(
+            {"u": [0], "v": [1], "highway": "residential", "length": [100.0]},
+            geometry=[shapely.LineString([(0, 0), (100, 0)])],
+            crs=32633,
+        )
+        df_modes = accessibility.distance_to_closest_modes(origin, stop, modes=["mode_bike"], network_gdf=street)
+        self.assertAlmostEqual(df_modes["distance_bike"].iloc[0], 90)
+
+    def test_distance_to_closest_sweep(self):
+        self.set_up()
+        with tempfile.TemporaryDirectory() as folder:
+            feed = self.write_feed(folder)
+            self.assertEqual(len(gtfs.read_stops(feed)), len(self.pt_low) + len(self.pt_high))
+            output = accessibility.distance_to_closest_sweep(
+                self.pop,
+                feed,
+                [("07:00", "08:00"), (8 * 3600, 9 * 3600), ("02:00", "03:00")],
+                date=20200915,
+                transport_system="low-capacity",
+                network_gdf=self.net,
+            )
+            departures = gtfs.read_departures(feed)
+            frequent = gtfs.served_stops(departures, "07:00", "08:00", minimum_frequency=2)
+        # stop ids are kept as codes of the stops
+        self.assertIsInstance(departures["stop_id"].dtype, pd.CategoricalDtype)
+        self.assertEqual(len(departures), 2 * len(self.pt_high) + len(self.pt_low))
+        # only the buses run in the morning of a tuesday, the subway at 8
+        low = accessibility.distance_to_closest(self.pop, self.pt_low, network_gdf=self.net, engine="native")
+        high = accessibility.distance_to_closest(self.pop, self.pt_high, network_gdf=self.net, engine="native")
+        self.assertAlmostEqual(output["distance_07:00-08:00"].sum(), low["distance_pt"].sum(), places=3)
+        self.assertAlmostEqual(output["distance_08:00-09:00"].sum(), high["distance_pt"].sum(), places=3)
+        self.assertEqual(output["accessible_07:00-08:00"].sum(), (output["distance_07:00-08:00"] <= 500).sum())
+        # no stop is served at night
+        self.assertTrue(output["distance_02:00-03:00"].isna().all())
+        self.assertFalse(output["accessible_02:00-03:00"].any())
+        # every stop is served once per hour on one of the days only
+        self.assertEqual(len(frequent), 0)
+
+    def test_classify_stops(self):
+        self.set_up()
+        with tempfile.TemporaryDirectory() as folder:
+            feed = self.write_feed(folder)
+            stops = gtfs.stops_by_transport_system(feed, chunksize=2)
+            classified = gtfs.classify_stops(feed, date=20200920, chunksize=2)
+        self.assertEqual(sorted(stops["low-capacity"]["stop_id"]), ["low0", "low1", "low2"])
+        self.assertEqual(sorted(stops["high-capacity"]["stop_id"]), ["high0", "high1", "high2", "high3"])
+        self.assertEqual(stops["low-capacity"].crs, "epsg:4326")
+        # no buses on sundays
+        self.assertEqual(classified["low-capacity"].sum(), 0)
+        self.assertEqual(classified["high-capacity"].sum(), len(self.pt_high))
+
+    def test_accessibility_session(self):
+        self.set_up()
+        scenario = session.AccessibilitySession(self.pop, self.pt.iloc[:3], network_gdf=self.net, maximum_distance=40)
+        scenario.add_stops(self.pt.iloc[3:])
+        scenario.remove_stops([0, 4])
+        moved = self.pt.iloc[[1]].copy()
+        moved.geometry = self.pt.geometry.iloc[[0]].to_numpy()
+        scenario.move_stops(moved)
+        self.assertEqual(sorted(scenario.stops), [1, 2, 3, 5, 6])
+        # the maintained result equals a computation from scratch
+        stops = self.pt.drop(index=[0, 4])
+        stops.loc[1, "geometry"] = self.pt.geometry.iloc[0]
+        expected = accessibility.distance_to_closest(
+            self.pop, stops, network_gdf=self.net, maximum_distance=40, engine="native"
+        )
+        output = scenario.accessibility_output()
+        self.assertEqual(output["distance_pt"].notna().sum(), len(expected))
+        self.assertAlmostEqual(output["distance_pt"].sum(), expected["distance_pt"].sum(), places=3)
+        self.assertAlmostEqual(
+            scenario.calculate_sdg(), accessibility.calculate_sdg(self.pop, expected, "pop"), places=6
+        )
+
     def test_calculate_sdg(self):
         # todo: why it is not 100%?
         self.set_up()
@@ -127,8 +763,8 @@ class PtACTest(unittest.TestCase):
             population_column="pop",
         )
         if sys.platform.startswith("win"):
-            self.assertAlmostEqual(round(result, 2), 0.96,  delta=0.01)
-            #self.assertEqual(round(result, 2), 0.96)  # 0.9561
+            self.assertAlmostEqual(round(result, 2), 0.96, delta=0.01)
+            # self.assertEqual(round(result, 2), 0.96)  # 0.9561
         elif sys.platform.startswith("linux"):
             self.assertEqual(round(result, 2), 0.96)
         elif sys.platform.startswith("macos"):
@@ -141,13 +777,33 @@ class PtACTest(unittest.TestCase):
         value = float(value["pop"].sum())
         self.assertEqual(round(value), 227)
 
+    def test_iter_raster_points(self):
+        self.set_up()
+        chunks = list(population.iter_raster_points(self.raster))
+        value = float(sum(pop.sum() for _, _, pop in chunks))
+        self.assertEqual(round(value), 227)
+        self.assertEqual(chunks[0][2].dtype, "float32")
+        # only cells within the clip area are returned
+        xmin, ymin, xmax, ymax = self.pop.total_bounds
+        clip = box(xmin - 1e-4, ymin - 1e-4, (xmin + xmax) / 2, ymax + 1e-4)
+        clipped = population.raster_to_points(self.raster, clip=clip)
+        self.assertEqual(len(clipped), len(self.pop.clip(clip)))
+
     def test_project_gdf(self):
         self.set_up()
-        value = util.project_gdf(
-            gdf=self.pop, geom_col="geometry", to_crs=None, to_latlong=False
-        ).crs
+        value = util.project_gdf(gdf=self.pop, geom_col="geometry", to_crs=None, to_latlong=False).crs
         self.assertEqual(value, "epsg:32633")
 
+    def test_utm_crs(self):
+        self.set_up()
+        self.assertEqual(util.utm_crs(self.pop).to_epsg(), 32633)
+        # layers already projected in a UTM zone are kept in it
+        projected = self.pop.to_crs(32632)
+        self.assertEqual(util.utm_crs(projected).to_epsg(), 32632)
+        self.assertIs(util.project_gdf(projected, to_crs=32632), projected)
+        # other projections are moved to the UTM zone of their bounds
+        self.assertEqual(util.utm_crs(self.pop.to_crs(3857)).to_epsg(), 32633)
+
 
 if __name__ == "__main__":
     unittest.main()